@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from . import hashing
+
+UserModel = get_user_model()
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend that checks passwords in the bounded hashing pool.
+
+    An unknown username still hashes the password in the pool, so it takes
+    as long and is refused under load like a real account, and doesn't
+    reveal that the account doesn't exist. Raises ``hashing.LoginOverloaded``
+    when the pool is full.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            hashing.check_unknown(password)
+            return None
+        if hashing.check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
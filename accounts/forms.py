@@ -1,5 +1,8 @@
 from django import forms
+from django.contrib.admin.forms import AdminAuthenticationForm
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from django.core.exceptions import ValidationError
+from .hashing import LoginOverloaded
 from .models import User
 
 
@@ -91,3 +94,22 @@ class UserLoginForm(AuthenticationForm):
             'class': 'form-check-input'
         })
     )
+
+
+class AdminLoginForm(AdminAuthenticationForm):
+    """
+    Admin login form that reports a full password hashing pool as an error
+    instead of raising. ``retry_after`` is then set for the view's 503.
+    """
+    
+    retry_after = None
+    
+    def clean(self):
+        try:
+            return super().clean()
+        except LoginOverloaded as e:
+            self.retry_after = e.retry_after
+            raise ValidationError(
+                'The server is busy signing other users in. Please try again in a moment.',
+                code='overloaded',
+            ) from e
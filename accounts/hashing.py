@@ -0,0 +1,134 @@
+"""
+Bounded password hashing.
+
+Verifying a password is deliberately expensive. A burst of logins, for
+example after sessions were purged, would otherwise put every worker thread
+on the CPU at once. Here all password checks of a process go through a small
+thread pool:
+
+    LOGIN_HASH_WORKERS   checks running at once (per process)
+    LOGIN_HASH_QUEUE     further checks allowed to wait for a worker
+    LOGIN_HASH_TIMEOUT   seconds a login waits for its result
+
+When the workers and the queue are full, ``LoginOverloaded`` is raised at
+once; the login view answers 503 with ``Retry-After``. The hashers Django
+ships (Argon2, scrypt, PBKDF2) release the GIL while hashing, so threads are
+enough to use several cores and to cap how many are used.
+
+A successful check also upgrades the stored hash when it was made by a
+hasher other than the first of ``PASSWORD_HASHERS`` or with weaker
+parameters. The new hash is computed in the pool as well.
+
+A login for an unknown username hashes the given password in the pool too
+(``check_unknown()``). It takes as long as a real check, waits in the same
+queue and is refused with ``LoginOverloaded`` in the same way, so neither
+the timing nor a 503 tells which usernames exist.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, identify_hasher, is_password_usable, make_password
+
+
+class LoginOverloaded(Exception):
+    """Too many password checks are already running or waiting"""
+
+    def __init__(self, retry_after=1):
+        super().__init__('Password hashing pool is full')
+        self.retry_after = retry_after
+
+
+def verify(password, encoded):
+    """
+    Check ``password`` against ``encoded``.
+
+    Returns (matches, new encoded password or None when no upgrade is due).
+    """
+    if encoded is None or not is_password_usable(encoded):
+        return False, None
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False, None
+    if not hasher.verify(password, encoded):
+        return False, None
+    preferred = get_hasher('default')
+    if hasher.algorithm != preferred.algorithm or preferred.must_update(encoded):
+        return True, make_password(password, hasher=preferred)
+    return True, None
+
+
+class HashingPool:
+    """A thread pool that refuses work instead of queueing without bound"""
+
+    def __init__(self, workers, queue_size):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.average = None  # seconds, exponentially weighted
+
+    def _timed(self, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.record(time.perf_counter() - started)
+
+    def record(self, seconds):
+        with self._lock:
+            self.average = seconds if self.average is None else 0.9 * self.average + 0.1 * seconds
+
+    def run(self, func, *args, timeout=None):
+        if not self.slots.acquire(blocking=False):
+            raise LoginOverloaded(retry_after=max(1, round(self.average or 1)))
+        try:
+            future = self.executor.submit(self._timed, func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        # The slot is held until the check is done, even if the caller gave up
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise LoginOverloaded()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(
+                    getattr(settings, 'LOGIN_HASH_WORKERS', 1),
+                    getattr(settings, 'LOGIN_HASH_QUEUE', 4),
+                )
+    return _pool
+
+
+def check_password(user, password):
+    """
+    Check a user's password in the pool, saving an upgraded hash on success.
+    Raises LoginOverloaded when the pool is full.
+    """
+    matches, upgraded = get_pool().run(
+        verify, password, user.password, timeout=getattr(settings, 'LOGIN_HASH_TIMEOUT', 5)
+    )
+    if upgraded:
+        user.password = upgraded
+        user.save(update_fields=['password'])
+    return matches
+
+
+def check_unknown(password):
+    """
+    Hash ``password`` in the pool as a check would, for a username that does
+    not exist. Raises LoginOverloaded when the pool is full.
+    """
+    get_pool().run(make_password, password, timeout=getattr(settings, 'LOGIN_HASH_TIMEOUT', 5))
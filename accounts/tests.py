@@ -1,3 +1,104 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from advanced_blog import ratelimit
+
+from . import hashing
+from .hashing import LoginOverloaded
+
+User = get_user_model()
+
+
+class LoginTestCase(TestCase):
+
+    password = 'pw12345!'
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', self.password, role='Author')
+        self.reader = User.objects.create_user('reader', 'reader@example.com', self.password, role='Reader')
+
+    def login(self, username, password=None):
+        return self.client.post('/accounts/login/', {'username': username, 'password': password or self.password})
+
+
+class LoginTests(LoginTestCase):
+
+    def test_login(self):
+        self.assertEqual(self.login('reader').status_code, 302)
+
+    def test_wrong_password(self):
+        response = self.login('reader', 'wrong')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_overloaded_hashing_answers_503(self):
+        with mock.patch('accounts.hashing.check_password', side_effect=LoginOverloaded(retry_after=3)):
+            response = self.login('reader')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+
+    def test_unknown_usernames_hash_in_the_pool(self):
+        with mock.patch('accounts.hashing.make_password', wraps=hashing.make_password) as make_password:
+            response = self.login('nobody')
+        self.assertEqual(response.status_code, 200)
+        make_password.assert_called_once_with(self.password)
+
+    def test_full_pool_refuses_unknown_and_real_accounts_alike(self):
+        pool = hashing.HashingPool(workers=1, queue_size=0)
+        pool.slots.acquire()
+        with mock.patch('accounts.hashing.get_pool', return_value=pool):
+            for username in ('reader', 'nobody'):
+                self.assertEqual(self.login(username).status_code, 503, username)
+        pool.slots.release()
+
+
+class AdminLoginTests(LoginTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            'admin', 'admin@example.com', self.password, role='Admin', is_staff=True, is_superuser=True
+        )
+
+    def admin_login(self):
+        return self.client.post(
+            '/admin/login/', {'username': 'admin', 'password': self.password, 'next': '/admin/'}
+        )
+
+    def test_login(self):
+        self.assertRedirects(self.admin_login(), '/admin/')
+
+    def test_overloaded_hashing_answers_503(self):
+        with mock.patch('accounts.hashing.check_password', side_effect=LoginOverloaded(retry_after=3)):
+            response = self.admin_login()
+        self.assertContains(response, 'The server is busy', status_code=503)
+        self.assertEqual(response['Retry-After'], '3')
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+
+@override_settings(RATELIMIT_POLICIES={
+    'login-ip': {'algorithm': 'token_bucket', 'rate': '100/m', 'key': 'ip'},
+    'login-username': {'algorithm': 'sliding_window', 'rate': '3/15m', 'key': 'field:username'},
+})
+class LoginRateLimitTests(LoginTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        ratelimit._limiter = None
+
+    def tearDown(self):
+        ratelimit._limiter = None
+
+    def test_guessing_one_username_is_limited(self):
+        for _ in range(3):
+            # The username is keyed case-insensitively
+            self.assertEqual(self.login('Author', 'wrong').status_code, 200)
+        response = self.login('author')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        # Other accounts are unaffected
+        self.assertEqual(self.login('reader').status_code, 302)
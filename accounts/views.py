@@ -1,11 +1,15 @@
 from django.shortcuts import render, redirect
-from django.contrib.auth import login, logout, authenticate
+from django.contrib import admin
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.exceptions import NON_FIELD_ERRORS
 from django.views.generic import CreateView, View
 from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
-from .forms import UserRegistrationForm, UserLoginForm
+from advanced_blog.ratelimit import RateLimitMixin
+from .forms import AdminLoginForm, UserRegistrationForm, UserLoginForm
+from .hashing import LoginOverloaded
 from .models import User
 
 
@@ -39,11 +43,13 @@ class RegisterView(CreateView):
         return super().form_invalid(form)
 
 
-class LoginView(View):
+class LoginView(RateLimitMixin, View):
     """User login view"""
     
     template_name = 'accounts/login.html'
     form_class = UserLoginForm
+    # Per client, and per account against attempts spread over many addresses
+    ratelimit = ('login-ip', 'login-username')
     
     def dispatch(self, request, *args, **kwargs):
         # Redirect authenticated users to home
@@ -56,31 +62,37 @@ class LoginView(View):
         return render(request, self.template_name, {'form': form})
     
     def post(self, request):
-        form = self.form_class(data=request.POST)
+        form = self.form_class(request, data=request.POST)
         
-        if form.is_valid():
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
+        # Validating the form authenticates the user; that is the only
+        # password check of the request
+        try:
+            is_valid = form.is_valid()
+        except LoginOverloaded as e:
+            messages.error(request, 'The server is busy signing other users in. Please try again in a moment.')
+            response = render(request, self.template_name, {'form': self.form_class()}, status=503)
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        
+        if is_valid:
+            user = form.get_user()
             remember_me = form.cleaned_data.get('remember_me', False)
             
-            user = authenticate(username=username, password=password)
+            login(request, user)
             
-            if user is not None:
-                login(request, user)
-                
-                # Set session expiry based on remember_me
-                if not remember_me:
-                    request.session.set_expiry(0)  # Session expires when browser closes
-                else:
-                    request.session.set_expiry(1209600)  # 2 weeks
-                
-                messages.success(request, f'Welcome back, {user.username}!')
-                
-                # Redirect to next parameter or home
-                next_url = request.GET.get('next', 'blog:home')
-                return redirect(next_url)
+            # Set session expiry based on remember_me
+            if not remember_me:
+                request.session.set_expiry(0)  # Session expires when browser closes
             else:
-                messages.error(request, 'Invalid username or password.')
+                request.session.set_expiry(1209600)  # 2 weeks
+            
+            messages.success(request, f'Welcome back, {user.username}!')
+            
+            # Redirect to next parameter or home
+            next_url = request.GET.get('next', 'blog:home')
+            return redirect(next_url)
+        elif form.has_error(NON_FIELD_ERRORS, 'invalid_login'):
+            messages.error(request, 'Invalid username or password.')
         else:
             messages.error(request, 'Please correct the errors below.')
         
@@ -102,3 +114,16 @@ class LogoutView(View):
         logout(request)
         messages.success(request, f'Goodbye, {username}! You have been logged out.')
         return redirect('blog:home')
+
+
+def admin_login(request, extra_context=None):
+    """
+    The admin site's login, answering 503 with Retry-After like LoginView
+    when the password hashing pool is full
+    """
+    response = admin.site.login(request, extra_context)
+    form = (getattr(response, 'context_data', None) or {}).get('form')
+    if isinstance(form, AdminLoginForm) and form.retry_after:
+        response.status_code = 503
+        response.headers['Retry-After'] = str(form.retry_after)
+    return response
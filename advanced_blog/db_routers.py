@@ -0,0 +1,133 @@
+"""
+Read-replica routing.
+
+When ``DATABASE_REPLICA_URLS`` configures replicas, ``ReplicaRouter`` sends
+the reads of safe (GET/HEAD/OPTIONS) requests for views marked with
+``replica_reads`` (the public post lists and details, search and the
+taxonomy pages) to a random replica. Everything else uses the primary
+(``default``): writes, every other view (edit forms, dashboards, moderation
+queues, which show what their user is about to change), and code running
+outside a request (management commands, workers, migrations). Sessions and users are always read from the primary.
+A login writes them, and the very next request reads them back, well
+within replication lag.
+
+After a user writes, ``ReplicaPinningMiddleware`` sets a short-lived cookie
+that keeps that user's next requests on the primary for
+``REPLICA_PIN_SECONDS``. This hides replication lag from the writer, so they
+see their own comment or edit straight away.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Apps whose reads always go to the primary (with the AUTH_USER_MODEL)
+PRIMARY_APPS = ('sessions', 'auth')
+
+_use_replicas = ContextVar('use_replicas', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in connections if alias != PRIMARY]
+
+
+@contextmanager
+def use_primary():
+    """Send every read inside the block to the primary"""
+    token = _use_replicas.set(False)
+    try:
+        yield
+    finally:
+        _use_replicas.reset(token)
+
+
+def replica_reads(view_func):
+    """Let the safe requests of a read-only view read from a replica"""
+    if iscoroutinefunction(view_func):
+        async def _view_wrapper(request, *args, **kwargs):
+            return await view_func(request, *args, **kwargs)
+    else:
+        def _view_wrapper(request, *args, **kwargs):
+            return view_func(request, *args, **kwargs)
+    _view_wrapper.replica_reads = True
+    return wraps(view_func)(_view_wrapper)
+
+
+class ReplicaRouter:
+    """Route reads to replicas when the current request allows it"""
+
+    def __init__(self):
+        self.replicas = replica_aliases()
+
+    def db_for_read(self, model, **hints):
+        if self.replicas and _use_replicas.get() and not self._primary_only(model):
+            return random.choice(self.replicas)
+        return PRIMARY
+
+    @staticmethod
+    def _primary_only(model):
+        return model._meta.app_label in PRIMARY_APPS or model._meta.label == settings.AUTH_USER_MODEL
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return db == PRIMARY
+
+
+class ReplicaPinningMiddleware:
+    """Allow replica reads for marked views and pin writers to the primary"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cookie_name = getattr(settings, 'REPLICA_PIN_COOKIE', 'use_primary')
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _use_replicas.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replicas.reset(token)
+        return self._pin(request, response)
+
+    async def __acall__(self, request):
+        token = _use_replicas.set(False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replicas.reset(token)
+        return self._pin(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Undone by the reset in __call__, after the response is rendered
+        if getattr(view_func, 'replica_reads', False) and self._replicas_allowed(request):
+            _use_replicas.set(True)
+
+    def _replicas_allowed(self, request):
+        return request.method in SAFE_METHODS and self.cookie_name not in request.COOKIES
+
+    def _pin(self, request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                self.cookie_name, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax'
+            )
+        return response
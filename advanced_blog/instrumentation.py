@@ -0,0 +1,141 @@
+"""
+Lightweight in-process instrumentation.
+
+Code records timings with ``record(name, seconds)``. Totals are kept per
+process and exposed to staff through ``instrumentation_view``, together with
+the database connection pool statistics. The timings recorded while handling
+a request are also sent back in a ``Server-Timing`` header when
+``SERVER_TIMING_HEADER`` is enabled.
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+
+_lock = threading.Lock()
+_metrics = {}
+_request_timings = ContextVar('request_timings', default=None)
+
+
+def record(name, seconds):
+    """Record one observation of ``name`` taking ``seconds``"""
+    with _lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            _metrics[name] = [1, seconds, seconds]
+        else:
+            metric[0] += 1
+            metric[1] += seconds
+            if seconds > metric[2]:
+                metric[2] = seconds
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+class timer:
+    """Context manager recording the duration of its block under ``name``"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.started)
+
+
+def snapshot():
+    """Return the metrics recorded by this process so far"""
+    with _lock:
+        items = [(name, list(values)) for name, values in _metrics.items()]
+    return {
+        name: {
+            'count': count,
+            'total_ms': round(total * 1000, 3),
+            'mean_ms': round(total * 1000 / count, 3),
+            'max_ms': round(maximum * 1000, 3),
+        }
+        for name, (count, total, maximum) in sorted(items)
+    }
+
+
+def reset():
+    with _lock:
+        _metrics.clear()
+
+
+def pool_stats():
+    """Return the connection pool statistics of every pooled database in this process"""
+    from django.db import connections
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
+
+
+def _server_timing(timings):
+    entries = []
+    for name, seconds in timings:
+        metric, _, desc = name.partition(':')
+        entry = metric
+        if desc:
+            entry += f';desc="{desc}"'
+        entries.append(f'{entry};dur={seconds * 1000:.1f}')
+    return ', '.join(entries)
+
+
+class ServerTimingMiddleware:
+    """Collect the timings recorded during a request into a Server-Timing header"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'SERVER_TIMING_HEADER', False)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        token = _request_timings.set([])
+        try:
+            response = self.get_response(request)
+            self._add_header(response)
+        finally:
+            _request_timings.reset(token)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        token = _request_timings.set([])
+        try:
+            response = await self.get_response(request)
+            self._add_header(response)
+        finally:
+            _request_timings.reset(token)
+        return response
+
+    def _add_header(self, response):
+        timings = _request_timings.get()
+        if timings:
+            response.headers['Server-Timing'] = _server_timing(timings)
+
+
+@staff_member_required
+def instrumentation_view(request):
+    """Return this worker's metrics and connection pool sizes as JSON (staff only)"""
+    return JsonResponse({'metrics': snapshot(), 'pools': pool_stats()})
@@ -0,0 +1,297 @@
+"""
+Rate limiting.
+
+Views opt in with ``RateLimitMixin`` and name the policies they are subject
+to. A policy in ``RATELIMIT_POLICIES`` picks an algorithm, a rate and what a
+client is keyed by:
+
+    'login': {'algorithm': 'token_bucket', 'rate': '10/m', 'burst': 5, 'key': 'ip'}
+
+Algorithms (``ALGORITHMS``, extend it to plug in another):
+
+    token_bucket     ``burst`` requests at once, then ``rate`` on average
+    sliding_window   at most ``rate`` requests in any window of that length,
+                     estimated from the current and previous fixed windows
+
+Keys: ``ip``, ``user``, ``user_or_ip`` (the user when logged in), or
+``field:<name>`` for a POST field such as the username being logged in to.
+Counters live in the ``RATELIMIT_CACHE`` cache. While that cache is
+unreachable, each process counts on its own so requests are still limited.
+A limited request gets a 429 with ``Retry-After``.
+
+The token bucket reads and writes its state in two steps, so concurrent
+requests for the same key may occasionally both take the last token. The
+sliding window counts with atomic increments.
+"""
+import logging
+import math
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60); '100/5m' -> (100, 300)"""
+    count, _, period = rate.partition('/')
+    multiplier = int(period[:-1] or 1)
+    return int(count), multiplier * PERIODS[period[-1]]
+
+
+# ---------------------------------------------------------------------------
+# Counter storage
+# ---------------------------------------------------------------------------
+
+class LocalStore:
+    """In-process counters with expiry, for when the shared cache is unavailable"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+            return entry[0] if entry else None
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            now = time.monotonic()
+            self._data[key] = (value, now + ttl)
+            # Keep the table bounded by dropping expired entries now and then
+            if len(self._data) > 10000:
+                for stale in [k for k, (_, expires) in self._data.items() if expires <= now]:
+                    del self._data[stale]
+
+    def incr(self, key, ttl):
+        with self._lock:
+            now = time.monotonic()
+            entry = self._live(key, now)
+            value = entry[0] + 1 if entry else 1
+            self._data[key] = (value, entry[1] if entry else now + ttl)
+            return value
+
+
+class CacheStore:
+    """Counters in a Django cache, falling back to a LocalStore while it fails"""
+
+    RETRY_SECONDS = 30
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+        self.local = LocalStore()
+        self._failed_at = None
+
+    def _call(self, method, *args):
+        if self._failed_at is not None and time.monotonic() - self._failed_at < self.RETRY_SECONDS:
+            return getattr(self.local, method)(*args)
+        try:
+            result = getattr(self, '_cache_' + method)(*args)
+        except Exception:
+            logger.warning('Rate limit cache unavailable, counting in-process', exc_info=True)
+            self._failed_at = time.monotonic()
+            return getattr(self.local, method)(*args)
+        self._failed_at = None
+        return result
+
+    def _cache_get(self, key):
+        return self.cache.get(key)
+
+    def _cache_set(self, key, value, ttl):
+        self.cache.set(key, value, timeout=ttl)
+
+    def _cache_incr(self, key, ttl):
+        if self.cache.add(key, 1, timeout=ttl):
+            return 1
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            self.cache.set(key, 1, timeout=ttl)
+            return 1
+
+    def get(self, key):
+        return self._call('get', key)
+
+    def set(self, key, value, ttl):
+        return self._call('set', key, value, ttl)
+
+    def incr(self, key, ttl):
+        return self._call('incr', key, ttl)
+
+
+# ---------------------------------------------------------------------------
+# Algorithms: hit() records a request and returns 0 to allow it, or the
+# number of seconds until the client may retry
+# ---------------------------------------------------------------------------
+
+class TokenBucket:
+
+    def __init__(self, rate, burst=None):
+        count, period = parse_rate(rate)
+        self.per_second = count / period
+        self.burst = burst or count
+
+    def hit(self, store, key, now):
+        state = store.get(key)
+        tokens, updated = state if state else (self.burst, now)
+        tokens = min(self.burst, tokens + (now - updated) * self.per_second)
+        ttl = math.ceil(self.burst / self.per_second) + 1
+        if tokens >= 1:
+            store.set(key, (tokens - 1, now), ttl)
+            return 0
+        store.set(key, (tokens, now), ttl)
+        return (1 - tokens) / self.per_second
+
+
+class SlidingWindow:
+
+    def __init__(self, rate, burst=None):
+        self.limit, self.period = parse_rate(rate)
+
+    def hit(self, store, key, now):
+        window, elapsed = divmod(now, self.period)
+        count = store.incr(f'{key}:{int(window)}', self.period * 2)
+        previous = store.get(f'{key}:{int(window) - 1}') or 0
+        weight = 1 - elapsed / self.period
+        if previous * weight + count <= self.limit:
+            return 0
+        if count >= self.limit or not previous:
+            return self.period - elapsed
+        # Wait until enough of the previous window has slid out
+        return (1 - (self.limit - count) / previous) * self.period - elapsed
+
+
+ALGORITHMS = {
+    'token_bucket': TokenBucket,
+    'sliding_window': SlidingWindow,
+}
+
+
+# ---------------------------------------------------------------------------
+# Policies
+# ---------------------------------------------------------------------------
+
+def client_ip(request):
+    """The client address, read from X-Forwarded-For behind RATELIMIT_PROXY_COUNT proxies"""
+    proxies = getattr(settings, 'RATELIMIT_PROXY_COUNT', 0)
+    if proxies:
+        forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def client_key(request, key):
+    # request.user is only read when the policy needs it
+    if key == 'ip':
+        return 'ip:' + client_ip(request)
+    if key in ('user', 'user_or_ip'):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        return None if key == 'user' else 'ip:' + client_ip(request)
+    if key.startswith('field:'):
+        value = request.POST.get(key[len('field:'):], '').strip().lower()
+        return f'{key}:{value}' if value else None
+    raise ValueError(f'Unknown rate limit key {key!r}')
+
+
+class Policy:
+    def __init__(self, name, algorithm='token_bucket', rate='60/m', burst=None, key='ip'):
+        self.name = name
+        self.algorithm = ALGORITHMS[algorithm](rate, burst)
+        self.key = key
+
+
+class Limiter:
+    """Applies named policies to requests"""
+
+    def __init__(self):
+        self.store = CacheStore(getattr(settings, 'RATELIMIT_CACHE', 'default'))
+        self.policies = {
+            name: Policy(name, **config)
+            for name, config in getattr(settings, 'RATELIMIT_POLICIES', {}).items()
+        }
+
+    def check(self, request, names):
+        """Record the request against each policy; returns seconds to wait, or 0 if allowed"""
+        now = time.time()
+        wait = 0
+        for name in names:
+            policy = self.policies[name]
+            client = client_key(request, policy.key)
+            if client is None:
+                continue
+            wait = max(wait, policy.algorithm.hit(self.store, f'rl:{name}:{client}', now))
+        return wait
+
+
+_limiter = None
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        _limiter = Limiter()
+    return _limiter
+
+
+def too_many_requests(wait):
+    seconds = max(1, math.ceil(wait))
+    response = HttpResponse(
+        f'Too many requests. Please try again in {seconds} second{"s" if seconds != 1 else ""}.',
+        status=429,
+        content_type='text/plain; charset=utf-8',
+    )
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+
+class RateLimitMixin:
+    """
+    Rate limit a view with the policies named in ``ratelimit``.
+
+    Only requests with a method in ``ratelimit_methods`` that pass
+    ``ratelimit_applies()`` count. Works with sync and async views.
+    """
+    ratelimit = ()
+    ratelimit_methods = ('POST',)
+
+    def ratelimit_applies(self, request):
+        return True
+
+    def _limited(self, request):
+        if not getattr(settings, 'RATELIMIT_ENABLED', True):
+            return False
+        return request.method in self.ratelimit_methods and self.ratelimit_applies(request)
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self._limited(request):
+            return super().dispatch(request, *args, **kwargs)
+        if self.view_is_async:
+            return self._adispatch(request, *args, **kwargs)
+        wait = get_limiter().check(request, self.ratelimit)
+        if wait:
+            return too_many_requests(wait)
+        return super().dispatch(request, *args, **kwargs)
+
+    async def _adispatch(self, request, *args, **kwargs):
+        wait = await sync_to_async(get_limiter().check)(request, self.ratelimit)
+        if wait:
+            return too_many_requests(wait)
+        return await super().dispatch(request, *args, **kwargs)
@@ -28,6 +28,15 @@ DEBUG = os.environ.get('DEBUG', 'True') == 'True'
 
 ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
 
+# Workers that only serve public pages can skip loading the rich text editor
+# upload views (and Pillow) by setting BLOG_EDITOR_ENABLED=False
+BLOG_EDITOR_ENABLED = os.environ.get('BLOG_EDITOR_ENABLED', 'True') == 'True'
+
+# Serve the post list, post detail, search and taxonomy pages with async views
+# (blog/async_views.py). Off by default, under ASGI too: measure with
+# bench_servers first.
+BLOG_ASYNC_VIEWS = os.environ.get('BLOG_ASYNC_VIEWS', 'False') == 'True'
+
 
 # Application definition
 
@@ -40,15 +49,20 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     # Third-party apps
     'ckeditor',
-    'ckeditor_uploader',
     # Local apps
     'blog',
     'accounts',
 ]
 
+if BLOG_EDITOR_ENABLED:
+    INSTALLED_APPS.insert(INSTALLED_APPS.index('ckeditor') + 1, 'ckeditor_uploader')
+
 MIDDLEWARE = [
+    'advanced_blog.instrumentation.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'blog.static_pages.StaticPageMiddleware',
+    'advanced_blog.db_routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -59,11 +73,20 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'advanced_blog.urls'
 
+# Production template mode always uses the cached loader and compiles every
+# template at startup, refusing to boot if one of them is broken
+TEMPLATE_MODE = os.environ.get('TEMPLATE_MODE', 'development' if DEBUG else 'production')
+TEMPLATE_PRECOMPILE = TEMPLATE_MODE == 'production'
+
+# Add per-request timings (e.g. template renders) as a Server-Timing header
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', str(DEBUG)) == 'True'
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'advanced_blog.templating.TimedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
+        'APP_DIRS': TEMPLATE_MODE != 'production',
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
@@ -74,22 +97,89 @@ TEMPLATES = [
     },
 ]
 
+if TEMPLATE_MODE == 'production':
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'advanced_blog.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite profiles, chosen with SQLITE_PROFILE. 'default' leaves Django's own
+# behaviour. 'performance' is an opt-in for serving from several workers: WAL
+# lets readers run alongside the single writer, BEGIN IMMEDIATE takes the
+# write lock up front (a deferred transaction that later upgrades fails at
+# once with "database is locked"), and the busy timeout makes writers queue
+# instead of erroring. Connections are reused so the pragmas run once.
+# Compare them with `manage.py bench_sqlite`.
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'default')
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 20000))
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': SQLITE_BUSY_TIMEOUT_MS,
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Negative values are KiB rather than pages
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 64 * 1024)),
+    'temp_store': 'MEMORY',
+}
+SQLITE_PROFILES = {
+    'default': {},
+    'performance': {
+        'CONN_MAX_AGE': int(os.environ.get('SQLITE_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
+    },
+}
+
+# PostgreSQL connection pooling (psycopg 3). Each worker process shares one
+# pool per database between its threads, instead of keeping a persistent
+# connection per thread.
+DATABASE_POOL = os.environ.get('DATABASE_POOL', 'True') == 'True'
+DATABASE_POOL_OPTIONS = {
+    'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+    'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+    # Seconds to wait for a free connection before failing the request
+    'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+    'max_idle': float(os.environ.get('DATABASE_POOL_MAX_IDLE', 300)),
+    'max_lifetime': float(os.environ.get('DATABASE_POOL_MAX_LIFETIME', 3600)),
+}
+
+
+def _with_pool(config):
+    """Switch a PostgreSQL database config from persistent connections to a pool"""
+    if DATABASE_POOL and config['ENGINE'] == 'django.db.backends.postgresql':
+        # With CONN_HEALTH_CHECKS the pool checks each connection it hands out
+        config['CONN_MAX_AGE'] = 0
+        config.setdefault('OPTIONS', {})['pool'] = dict(DATABASE_POOL_OPTIONS)
+    return config
+
+
+# Read replicas, as a comma-separated list of database URLs
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+
+if os.environ.get('DATABASE_URL') or DATABASE_REPLICA_URLS:
+    import dj_database_url
+
 # Use PostgreSQL in production, SQLite in development
 if os.environ.get('DATABASE_URL'):
     # Parse database configuration from DATABASE_URL
-    import dj_database_url
     DATABASES = {
-        'default': dj_database_url.config(
+        'default': _with_pool(dj_database_url.config(
             default=os.environ.get('DATABASE_URL'),
             conn_max_age=600,
             conn_health_checks=True,
-        )
+        ))
     }
 else:
     # Development database (SQLite)
@@ -97,9 +187,56 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            **SQLITE_PROFILES[SQLITE_PROFILE],
+        }
+    }
+
+# Reads of the public read-only pages are spread over them (see
+# advanced_blog/db_routers.py); tests mirror them to the primary. SQLite files work as stand-in replicas.
+for index, url in enumerate(DATABASE_REPLICA_URLS):
+    DATABASES[f'replica_{index + 1}'] = _with_pool(dj_database_url.parse(
+        url,
+        conn_max_age=600,
+        conn_health_checks=True,
+    ))
+    DATABASES[f'replica_{index + 1}']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['advanced_blog.db_routers.ReplicaRouter']
+
+# Requests from a user who just wrote read from the primary for this long
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+REPLICA_PIN_COOKIE = 'use_primary'
+
+
+# Cache
+# Use Redis when REDIS_URL is set so cache-backed state is shared between
+# workers; otherwise fall back to a per-process local memory cache
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         }
     }
 
+# Maximum age (seconds) of the in-process category/tag snapshot
+TAXONOMY_CACHE_TTL = int(os.environ.get('TAXONOMY_CACHE_TTL', 300))
+
+# HTTP caching of public pages: validators are refreshed at least every
+# CONTENT_GENERATION_TTL seconds; anonymous responses may be kept by browsers
+# for HTTP_CACHE_MAX_AGE and by shared caches (CDN/proxy) for
+# HTTP_CACHE_SHARED_MAX_AGE seconds
+CONTENT_GENERATION_TTL = int(os.environ.get('CONTENT_GENERATION_TTL', 60))
+HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', 0))
+HTTP_CACHE_SHARED_MAX_AGE = int(os.environ.get('HTTP_CACHE_SHARED_MAX_AGE', 60))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -145,12 +282,7 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files (User uploaded content)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
-
-# Ensure media directory exists
-os.makedirs(MEDIA_ROOT, exist_ok=True)
-os.makedirs(MEDIA_ROOT / 'post_images', exist_ok=True)
-os.makedirs(MEDIA_ROOT / 'profile_pictures', exist_ok=True)
-os.makedirs(MEDIA_ROOT / 'uploads', exist_ok=True)
+# Upload directories are created on demand by the file storage backend
 
 # CKEditor settings
 CKEDITOR_UPLOAD_PATH = 'uploads/'
@@ -199,6 +331,117 @@ LOGIN_REDIRECT_URL = 'blog:home'
 LOGOUT_REDIRECT_URL = 'blog:home'
 LOGIN_URL = 'accounts:login'
 
+# Rows per transaction for bulk admin actions (publish, approve, delete, ...)
+BLOG_BULK_CHUNK_SIZE = int(os.environ.get('BLOG_BULK_CHUNK_SIZE', 1000))
+
+# Unfiltered admin changelists on PostgreSQL switch to the planner's row
+# estimate instead of COUNT(*) once a table reaches this many rows
+ESTIMATED_COUNT_THRESHOLD = int(os.environ.get('ESTIMATED_COUNT_THRESHOLD', 50000))
+
+# Cold-start budget enforced by `manage.py profile_startup --check`
+STARTUP_BUDGET_MS = int(os.environ.get('STARTUP_BUDGET_MS', 1500))
+STARTUP_BUDGET_RSS_MB = int(os.environ.get('STARTUP_BUDGET_RSS_MB', 120))
+
+# Rate limits (see advanced_blog/ratelimit.py). Rates are "<count>/<period>"
+# with s, m, h or d periods, e.g. "10/m" or "10/15m". Behind a reverse proxy
+# or Heroku's router, set RATELIMIT_PROXY_COUNT to the number of proxies that
+# append to X-Forwarded-For so the client address is read from there.
+RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'True') == 'True'
+RATELIMIT_CACHE = os.environ.get('RATELIMIT_CACHE', 'default')
+RATELIMIT_PROXY_COUNT = int(os.environ.get('RATELIMIT_PROXY_COUNT', 0))
+RATELIMIT_POLICIES = {
+    'login-ip': {
+        'algorithm': 'token_bucket',
+        'rate': os.environ.get('RATELIMIT_LOGIN_IP', '20/m'),
+        'burst': 10,
+        'key': 'ip',
+    },
+    'login-username': {
+        'algorithm': 'sliding_window',
+        'rate': os.environ.get('RATELIMIT_LOGIN_USERNAME', '10/15m'),
+        'key': 'field:username',
+    },
+    'comment': {
+        'algorithm': 'sliding_window',
+        'rate': os.environ.get('RATELIMIT_COMMENT', '10/m'),
+        'key': 'user_or_ip',
+    },
+    'search': {
+        'algorithm': 'token_bucket',
+        'rate': os.environ.get('RATELIMIT_SEARCH', '60/m'),
+        'burst': 20,
+        'key': 'user_or_ip',
+    },
+}
+
+# Comment moderation (see blog/moderation.py). New comments scoring at least
+# MODERATION_SPAM_THRESHOLD wait in the moderation queue. With 0, every
+# comment is queued except those of admins and of authors on their own posts.
+MODERATION_SPAM_THRESHOLD = float(os.environ.get('MODERATION_SPAM_THRESHOLD', 1.0))
+MODERATION_TRUSTED_COMMENTS = int(os.environ.get('MODERATION_TRUSTED_COMMENTS', 3))
+MODERATION_DUPLICATE_DAYS = int(os.environ.get('MODERATION_DUPLICATE_DAYS', 7))
+
+# A comment repeating one its author posted on the same post within
+# DUPLICATE_COMMENT_WINDOW seconds is refused. Texts count as repeats when
+# their SimHashes differ in at most DUPLICATE_COMMENT_DISTANCE of 64 bits.
+DUPLICATE_COMMENT_WINDOW = int(os.environ.get('DUPLICATE_COMMENT_WINDOW', 600))
+DUPLICATE_COMMENT_DISTANCE = int(os.environ.get('DUPLICATE_COMMENT_DISTANCE', 8))
+
+# Scheduled posts are published by `manage.py run_scheduler`, which sleeps
+# until the next post is due but at most SCHEDULER_MAX_SLEEP seconds, so a
+# post scheduled for an earlier time while it sleeps is at most that late.
+SCHEDULER_MAX_SLEEP = float(os.environ.get('SCHEDULER_MAX_SLEEP', 60))
+
+# Post revisions are stored as compressed deltas against the previous one,
+# with the full content every REVISION_SNAPSHOT_INTERVAL revisions. Rebuilding
+# a version reads at most that many rows; fewer snapshots take less space.
+REVISION_SNAPSHOT_INTERVAL = int(os.environ.get('REVISION_SNAPSHOT_INTERVAL', 50))
+
+# Email notifications are sent by a small thread pool so requests don't wait
+# on SMTP. When NOTIFICATION_QUEUE_SIZE sends are pending, further ones run
+# inline. Set NOTIFICATION_WORKERS=0 to always send inline.
+NOTIFICATION_WORKERS = int(os.environ.get('NOTIFICATION_WORKERS', 2))
+NOTIFICATION_QUEUE_SIZE = int(os.environ.get('NOTIFICATION_QUEUE_SIZE', 100))
+
+# Syndication feeds (see blog/feeds.py): items per feed, and how long a cached
+# feed body may be reused before it is rebuilt even without a new post
+FEED_ITEMS = int(os.environ.get('FEED_ITEMS', 20))
+FEED_CACHE_TTL = int(os.environ.get('FEED_CACHE_TTL', 3600))
+
+# Sitemap shards (see blog/sitemaps.py). Build them once with build_sitemaps;
+# after that, post and taxonomy changes update the affected shards.
+SITEMAP_ROOT = os.environ.get('SITEMAP_ROOT', BASE_DIR / 'sitemaps')
+SITEMAP_SHARD_SIZE = int(os.environ.get('SITEMAP_SHARD_SIZE', 50000))
+SITEMAP_BASE_URL = os.environ.get('SITEMAP_BASE_URL', f'https://{ALLOWED_HOSTS[0]}')
+
+# Popular and trending posts (see blog/popularity.py). Views are counted
+# from 'requests' (buffered per process) or, with 'access_log', only by
+# ingest_access_log. Rankings come from compute_trending, run from cron.
+POPULARITY_SOURCE = os.environ.get('POPULARITY_SOURCE', 'requests')
+VIEW_BUFFER_SIZE = int(os.environ.get('VIEW_BUFFER_SIZE', 500))
+VIEW_BUFFER_SECONDS = int(os.environ.get('VIEW_BUFFER_SECONDS', 10))
+TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', 24))
+POPULARITY_RETENTION_DAYS = int(os.environ.get('POPULARITY_RETENTION_DAYS', 30))
+POPULARITY_TOP_N = int(os.environ.get('POPULARITY_TOP_N', 10))
+POPULARITY_CACHE_TTL = int(os.environ.get('POPULARITY_CACHE_TTL', 3600))
+
+# Author analytics (see blog/analytics.py): raw events are kept this many
+# days after rollup_analytics has aggregated them into daily stats
+ANALYTICS_RAW_RETENTION_DAYS = int(os.environ.get('ANALYTICS_RAW_RETENTION_DAYS', 7))
+
+# Related posts (see blog/related.py). Post changes are queued, and
+# `rebuild_related --pending` (cron) updates the affected lists, building the
+# index first if needed. RELATED_TEXT_WEIGHT weighs text similarity against
+# tag/category overlap (0..1).
+RELATED_POSTS_COUNT = int(os.environ.get('RELATED_POSTS_COUNT', 5))
+RELATED_TEXT_WEIGHT = float(os.environ.get('RELATED_TEXT_WEIGHT', 0.6))
+RELATED_MAX_FEATURES = int(os.environ.get('RELATED_MAX_FEATURES', 4096))
+
+# Pre-rendered pages for anonymous visitors (see blog/static_pages.py)
+STATIC_PAGES_ENABLED = os.environ.get('STATIC_PAGES_ENABLED', 'False') == 'True'
+STATIC_PAGES_ROOT = os.environ.get('STATIC_PAGES_ROOT', BASE_DIR / 'static_pages')
+STATIC_PAGES_HOST = os.environ.get('STATIC_PAGES_HOST', ALLOWED_HOSTS[0])
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -206,3 +449,24 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
+
+# Passwords are checked in a small per-process thread pool (see
+# accounts/hashing.py). LOGIN_HASH_QUEUE more checks may wait for it; beyond
+# that, logins get a 503 instead of piling onto the CPUs.
+AUTHENTICATION_BACKENDS = ['accounts.backends.PooledModelBackend']
+LOGIN_HASH_WORKERS = int(os.environ.get('LOGIN_HASH_WORKERS', 1))
+LOGIN_HASH_QUEUE = int(os.environ.get('LOGIN_HASH_QUEUE', 4))
+LOGIN_HASH_TIMEOUT = float(os.environ.get('LOGIN_HASH_TIMEOUT', 5))
+
+# New passwords are hashed with PASSWORD_HASHER (argon2, scrypt or pbkdf2).
+# Passwords hashed with one of the others still work and are re-hashed with
+# it at the next login.
+_PASSWORD_HASHERS = {
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'argon2')
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
@@ -0,0 +1,75 @@
+"""
+Production template support.
+
+``TimedDjangoTemplates`` is the regular Django template backend with render
+timing: every top-level template render is recorded in the instrumentation
+under ``template:<name>``. ``precompile_templates()`` compiles every project
+template into the cached loader and refuses to boot if any of them is broken.
+"""
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from . import instrumentation
+
+
+class TimedTemplate(Template):
+    """Backend template wrapper that records how long each render takes"""
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            instrumentation.record(
+                f"template:{self.template.origin.template_name or '<string>'}",
+                time.perf_counter() - started,
+            )
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Django template backend returning TimedTemplate instances"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def iter_template_names():
+    """Yield the name of every template under the project templates directories"""
+    for engine in settings.TEMPLATES:
+        for directory in map(Path, engine.get('DIRS', [])):
+            for path in sorted(directory.rglob('*.html')):
+                yield path.relative_to(directory).as_posix()
+
+
+def precompile_templates():
+    """
+    Compile every project template into the template loader cache.
+
+    Returns a mapping of template name to compile time in milliseconds and
+    raises ImproperlyConfigured listing every template that failed to compile.
+    """
+    from django.template import engines
+    engine = engines['django']
+    timings, failures = {}, []
+    for name in iter_template_names():
+        started = time.perf_counter()
+        try:
+            engine.get_template(name)
+        except (TemplateSyntaxError, TemplateDoesNotExist) as e:
+            failures.append(f'{name}: {e}')
+            continue
+        timings[name] = (time.perf_counter() - started) * 1000
+    if failures:
+        raise ImproperlyConfigured('Templates failed to compile:\n' + '\n'.join(failures))
+    return timings
@@ -19,13 +19,23 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from accounts.views import admin_login
+
+from .instrumentation import instrumentation_view
+
 urlpatterns = [
+    path('_instrumentation/', instrumentation_view, name='instrumentation'),
+    # Ahead of admin.site.urls, which has the same path
+    path('admin/login/', admin_login, name='admin_login'),
     path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls')),
-    path('ckeditor/', include('ckeditor_uploader.urls')),
     path('', include('blog.urls')),
 ]
 
+# The editor upload views are only mounted on workers that serve the editor
+if settings.BLOG_EDITOR_ENABLED:
+    urlpatterns.insert(4, path('ckeditor/', include('ckeditor_uploader.urls')))
+
 # Serve media files in development
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
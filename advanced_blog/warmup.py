@@ -0,0 +1,55 @@
+"""
+Process warmup for preforking servers.
+
+``warm_up()`` fills the per-process caches that Django otherwise builds lazily
+on the first request: the URL resolver, compiled templates and the content
+type cache. Calling it in the gunicorn master before workers are forked means
+every worker starts with these structures already built and shares their
+memory pages copy-on-write.
+"""
+import time
+
+
+def warm_url_resolver():
+    """Import every URLconf module and build the reverse lookup tables"""
+    from django.urls import get_resolver
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+    for namespace, (prefix, sub_resolver) in resolver.namespace_dict.items():
+        sub_resolver.reverse_dict
+
+
+def warm_templates():
+    """Compile every project template into the template loader cache"""
+    from .templating import precompile_templates
+    precompile_templates()
+
+
+def warm_content_types():
+    """Load a ContentType for every installed model into the in-process cache"""
+    from django.apps import apps
+    from django.contrib.contenttypes.models import ContentType
+    from django.db import DatabaseError, connections
+    try:
+        ContentType.objects.get_for_models(*apps.get_models())
+    except DatabaseError:
+        # The database may not be migrated yet (e.g. during the release phase)
+        pass
+    finally:
+        # Never hand an open connection (or a pool and its threads) over to
+        # forked workers
+        connections.close_all()
+        for connection in connections.all():
+            if getattr(connection, 'pool', None) is not None:
+                connection.close_pool()
+
+
+def warm_up():
+    """Run every warmup step and return the time spent in each, in milliseconds"""
+    timings = {}
+    for step in (warm_url_resolver, warm_templates, warm_content_types):
+        started = time.perf_counter()
+        step()
+        timings[step.__name__] = (time.perf_counter() - started) * 1000
+    return timings
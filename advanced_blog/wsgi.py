@@ -9,8 +9,18 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'advanced_blog.settings')
 
 application = get_wsgi_application()
+
+# Count post views in memory and write them from a background thread
+from blog import buffers  # noqa: E402
+buffers.start()
+
+# Fail the boot if a template doesn't compile, and start with a warm cache
+if settings.TEMPLATE_PRECOMPILE:
+    from advanced_blog.templating import precompile_templates
+    precompile_templates()
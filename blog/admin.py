@@ -1,41 +1,93 @@
 from django.contrib import admin
+from django.db.models import Count
+from . import bulk
 from .models import Category, Tag, Post, Comment
+from .paginators import EstimatedCountPaginator
+
+
+class InputFilter(admin.SimpleListFilter):
+    """
+    List filter rendered as a text box instead of one link per value.
+    
+    Used for relations with too many rows to list every option in the sidebar.
+    """
+    
+    template = 'admin/input_filter.html'
+    placeholder = ''
+    
+    def lookups(self, request, model_admin):
+        # Needed for the filter to be displayed; the input replaces the choices
+        return ((),)
+    
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        return {}
+    
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        # Other active filters are carried over as hidden inputs
+        all_choice['query_parts'] = [
+            (key, value)
+            for key, values in changelist.get_filters_params().items()
+            for value in values
+            if key != self.parameter_name
+        ]
+        yield all_choice
+
+
+class PostInputFilter(InputFilter):
+    """Filter comments by post id or title"""
+    
+    title = 'post'
+    parameter_name = 'post'
+    placeholder = 'Post ID or title'
+    
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        if value.isdigit():
+            return queryset.filter(post_id=value)
+        return queryset.filter(post__title__icontains=value)
+
+
+class AuthorInputFilter(InputFilter):
+    """Filter posts by author username"""
+    
+    title = 'author'
+    parameter_name = 'author'
+    placeholder = 'Username'
+    
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        return queryset.filter(author__username__iexact=value)
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     """Category admin configuration"""
     
-    list_display = ['name', 'slug', 'get_post_count', 'created_at', 'updated_at']
+    list_display = ['name', 'slug', 'post_count', 'created_at', 'updated_at']
     list_filter = ['created_at', 'updated_at']
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
     date_hierarchy = 'created_at'
-    readonly_fields = ['created_at', 'updated_at']
-    
-    def get_post_count(self, obj):
-        """Return the number of posts in this category"""
-        return obj.posts.count()
-    get_post_count.short_description = 'Posts'
-    get_post_count.admin_order_field = 'posts__count'
+    readonly_fields = ['post_count', 'created_at', 'updated_at']
+    show_full_result_count = False
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     """Tag admin configuration"""
     
-    list_display = ['name', 'slug', 'get_post_count', 'created_at']
+    list_display = ['name', 'slug', 'post_count', 'created_at']
     list_filter = ['created_at']
     search_fields = ['name']
     prepopulated_fields = {'slug': ('name',)}
     date_hierarchy = 'created_at'
-    readonly_fields = ['created_at']
-    
-    def get_post_count(self, obj):
-        """Return the number of posts with this tag"""
-        return obj.posts.count()
-    get_post_count.short_description = 'Posts'
-    get_post_count.admin_order_field = 'posts__count'
+    readonly_fields = ['post_count', 'created_at']
+    show_full_result_count = False
 
 
 @admin.register(Post)
@@ -43,20 +95,21 @@ class PostAdmin(admin.ModelAdmin):
     """Post admin configuration"""
     
     list_display = ['title', 'author', 'category', 'status', 'get_comment_count', 'views_count', 'created_at', 'published_at']
-    list_filter = ['status', 'category', 'tags', 'created_at', 'published_at', 'author']
+    list_filter = ['status', 'category', 'tags', 'created_at', 'published_at', AuthorInputFilter]
     search_fields = ['title', 'content', 'excerpt', 'author__username', 'author__email']
-    prepopulated_fields = {'slug': ('title',)}
     date_hierarchy = 'created_at'
     filter_horizontal = ['tags']
     readonly_fields = ['views_count', 'created_at', 'updated_at', 'slug']
     list_per_page = 25
     list_editable = ['status']
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
     
     actions = ['publish_posts', 'draft_posts', 'archive_posts']
     
     fieldsets = (
         ('Basic Information', {
-            'fields': ('title', 'slug', 'author', 'category', 'status')
+            'fields': ('title', 'slug', 'author', 'category', 'status', 'publish_at')
         }),
         ('Content', {
             'fields': ('content', 'excerpt', 'featured_image')
@@ -73,52 +126,59 @@ class PostAdmin(admin.ModelAdmin):
     
     def get_comment_count(self, obj):
         """Return the number of comments on this post"""
-        return obj.comments.count()
+        return obj.comment_count
     get_comment_count.short_description = 'Comments'
-    get_comment_count.admin_order_field = 'comments__count'
+    get_comment_count.admin_order_field = 'comment_count'
+    
+    def _set_status(self, request, queryset, status):
+        """Change status in set-based chunks, reporting progress for large selections"""
+        chunks = []
+        updated = bulk.set_post_status(queryset, status, progress=lambda done, total: chunks.append(done))
+        if len(chunks) > 1:
+            self.message_user(request, f'Processed {chunks[-1]} post(s) in {len(chunks)} batches.')
+        return updated
     
     def publish_posts(self, request, queryset):
         """Publish selected posts"""
-        from django.utils import timezone
-        updated = 0
-        for post in queryset:
-            if post.status != 'published':
-                post.status = 'published'
-                if not post.published_at:
-                    post.published_at = timezone.now()
-                post.save()
-                updated += 1
+        updated = self._set_status(request, queryset, 'published')
         self.message_user(request, f'{updated} post(s) published.')
     publish_posts.short_description = 'Publish selected posts'
     
     def draft_posts(self, request, queryset):
         """Set selected posts to draft"""
-        updated = queryset.update(status='draft')
+        updated = self._set_status(request, queryset, 'draft')
         self.message_user(request, f'{updated} post(s) set to draft.')
     draft_posts.short_description = 'Set to draft'
     
     def archive_posts(self, request, queryset):
         """Archive selected posts"""
-        updated = queryset.update(status='archived')
+        updated = self._set_status(request, queryset, 'archived')
         self.message_user(request, f'{updated} post(s) archived.')
     archive_posts.short_description = 'Archive selected posts'
     
+    def save_model(self, request, obj, form, change):
+        # Credited with the revision this save records
+        obj._edited_by = request.user
+        super().save_model(request, obj, form, change)
+    
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related('author', 'category').prefetch_related('tags')
+        return qs.select_related('author', 'category').annotate(comment_count=Count('comments'))
 
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     """Comment admin configuration"""
     
-    list_display = ['get_comment_preview', 'author', 'post', 'is_approved', 'is_reply', 'created_at']
-    list_filter = ['is_approved', 'created_at', 'post']
+    list_display = ['get_comment_preview', 'author', 'post', 'is_approved', 'spam_score', 'is_reply', 'created_at']
+    list_filter = ['is_approved', 'created_at', PostInputFilter]
     search_fields = ['content', 'author__username', 'author__email', 'post__title']
     date_hierarchy = 'created_at'
-    readonly_fields = ['created_at', 'updated_at', 'post', 'author', 'parent']
+    readonly_fields = ['created_at', 'updated_at', 'post', 'author', 'parent', 'spam_score', 'spam_reasons']
     list_per_page = 50
     list_editable = ['is_approved']
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
     
     actions = ['approve_comments', 'unapprove_comments', 'delete_selected_comments']
     
@@ -126,6 +186,9 @@ class CommentAdmin(admin.ModelAdmin):
         ('Comment Information', {
             'fields': ('post', 'author', 'parent', 'content', 'is_approved')
         }),
+        ('Moderation', {
+            'fields': ('spam_score', 'spam_reasons'),
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -139,20 +202,19 @@ class CommentAdmin(admin.ModelAdmin):
     
     def approve_comments(self, request, queryset):
         """Approve selected comments"""
-        updated = queryset.update(is_approved=True)
+        updated = bulk.set_comment_approval(queryset, True)
         self.message_user(request, f'{updated} comment(s) approved.')
     approve_comments.short_description = 'Approve selected comments'
     
     def unapprove_comments(self, request, queryset):
         """Unapprove selected comments"""
-        updated = queryset.update(is_approved=False)
+        updated = bulk.set_comment_approval(queryset, False)
         self.message_user(request, f'{updated} comment(s) unapproved.')
     unapprove_comments.short_description = 'Unapprove selected comments'
     
     def delete_selected_comments(self, request, queryset):
-        """Delete selected comments"""
-        count = queryset.count()
-        queryset.delete()
+        """Delete selected comments and their replies"""
+        count = bulk.delete_comments(queryset)
         self.message_user(request, f'{count} comment(s) deleted.')
     delete_selected_comments.short_description = 'Delete selected comments'
     
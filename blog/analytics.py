@@ -0,0 +1,122 @@
+"""
+Per-day analytics for authors.
+
+Post views and new comments are appended to ``AnalyticsEvent`` as raw rows.
+Views are buffered per process (see ``blog.buffers``) and written with one
+bulk insert. Raw events are never
+read by pages: ``rollup()`` (``manage.py rollup_analytics``, run from cron)
+aggregates them into one ``PostDailyStats`` row per post and day, which the
+author dashboard reads. Each run re-aggregates the days since the last run's
+final day, so late events are still counted. It then deletes raw events
+older than ``ANALYTICS_RAW_RETENTION_DAYS`` that have been rolled up, so the
+raw table stays bounded.
+"""
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import buffers
+from .models import AnalyticsEvent, PostDailyStats
+
+
+class EventBuffer(buffers.WriteBuffer):
+    """Collects view events and appends them with one bulk insert"""
+
+    description = 'analytics events'
+
+    def empty(self):
+        return []
+
+    def add(self, events, post_id):
+        events.append(AnalyticsEvent(kind='view', post_id=post_id, occurred_at=timezone.now()))
+
+    def write(self, events):
+        AnalyticsEvent.objects.bulk_create(events, batch_size=1000)
+
+
+buffer = EventBuffer()
+
+
+def record_view(post_id):
+    buffer.record(post_id)
+
+
+async def arecord_view(post_id):
+    await buffer.arecord(post_id)
+
+
+def record_comment(post_id):
+    """Comments are rare; they are written straight away"""
+    AnalyticsEvent.objects.create(kind='comment', post_id=post_id, occurred_at=timezone.now())
+
+
+def rollup(now=None):
+    """Aggregate raw events into PostDailyStats and prune old raw events; returns (rows, pruned)"""
+    now = now or timezone.now()
+    latest = PostDailyStats.objects.aggregate(latest=Max('date'))['latest']
+    events = AnalyticsEvent.objects.all()
+    start = None
+    if latest is not None:
+        # The last day rolled up may have been incomplete, and buffers may
+        # have flushed late: redo it and the day before
+        start = timezone.make_aware(datetime.combine(latest - timedelta(days=1), dt_time.min))
+        events = events.filter(occurred_at__gte=start)
+
+    rows = events.annotate(day=TruncDate('occurred_at')).values('post_id', 'day').annotate(
+        views=Count('pk', filter=Q(kind='view')),
+        comments=Count('pk', filter=Q(kind='comment')),
+    ).order_by()
+    stats = [
+        PostDailyStats(post_id=row['post_id'], date=row['day'], views=row['views'], comments=row['comments'])
+        for row in rows.iterator(chunk_size=5000)
+    ]
+    PostDailyStats.objects.bulk_create(
+        stats,
+        update_conflicts=True,
+        unique_fields=['post', 'date'],
+        update_fields=['views', 'comments'],
+        batch_size=1000,
+    )
+
+    cutoff = now - timedelta(days=getattr(settings, 'ANALYTICS_RAW_RETENTION_DAYS', 7))
+    if start is not None:
+        # Never drop events this run didn't roll up
+        cutoff = min(cutoff, start)
+    pruned, _ = AnalyticsEvent.objects.filter(occurred_at__lt=cutoff).delete()
+    return len(stats), pruned
+
+
+def daily_totals(posts, days):
+    """
+    Views and comments per day over the last ``days`` days for ``posts``.
+
+    Returns a list of {'date', 'views', 'comments'}, oldest first, with
+    zeros for days without activity.
+    """
+    today = timezone.localdate()
+    since = today - timedelta(days=days - 1)
+    rows = PostDailyStats.objects.filter(post__in=posts, date__gte=since).values('date').annotate(
+        total_views=Sum('views'), total_comments=Sum('comments'),
+    ).order_by()
+    by_date = {row['date']: row for row in rows}
+    series = []
+    for offset in range(days):
+        date = since + timedelta(days=offset)
+        row = by_date.get(date, {})
+        series.append({
+            'date': date,
+            'views': row.get('total_views', 0),
+            'comments': row.get('total_comments', 0),
+        })
+    return series
+
+
+def post_totals(posts, days):
+    """Views and comments per post over the last ``days`` days, busiest first"""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return PostDailyStats.objects.filter(post__in=posts, date__gte=since).values(
+        'post__title', 'post__slug',
+    ).annotate(views=Sum('views'), comments=Sum('comments')).order_by('-views', '-comments', 'post__title')
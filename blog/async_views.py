@@ -0,0 +1,251 @@
+"""
+Async versions of the read-heavy public views.
+
+When ``BLOG_ASYNC_VIEWS`` is on (it is off by default, under ASGI too), the
+URLconf serves the post list, post detail, search, taxonomy and author pages
+with these classes instead of their sync counterparts in ``blog.views``. They
+have the same names and reuse the sync views' querysets. Every query is awaited
+through Django's async ORM (``aget``, ``acount``, ``aupdate``, async
+iteration), so a worker keeps serving other requests while it waits on the
+database.
+
+The template engine is sync-only. Pages render in a thread with
+``sync_to_async`` once their querysets have been evaluated.
+"""
+from asgiref.sync import sync_to_async
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Count
+from django.http import Http404
+from django.shortcuts import render
+
+from . import authors, caching, taxonomy, views
+from .caching import AsyncConditionalGetMixin
+from .forms import CommentForm, PostSearchForm
+from .models import Category, Post, Tag
+
+arender = sync_to_async(render)
+get_snapshot = sync_to_async(taxonomy.get_snapshot)
+current_taxonomy_generation = sync_to_async(taxonomy.current_generation)
+
+
+async def apaginate(request, queryset, per_page, fallback=False):
+    """
+    Async ``Paginator.page()`` for the ``page`` query parameter.
+
+    An invalid page number raises Http404 like ``ListView`` does. With
+    ``fallback`` it shows the first or last page instead, like the category
+    and tag pages.
+    """
+    paginator = Paginator(queryset, per_page)
+    paginator.count = await queryset.acount()
+    try:
+        number = paginator.validate_number(request.GET.get('page') or 1)
+    except PageNotAnInteger:
+        if not fallback:
+            raise Http404('Invalid page.')
+        number = 1
+    except EmptyPage:
+        if not fallback:
+            raise Http404('Invalid page.')
+        number = paginator.num_pages
+    bottom = (number - 1) * per_page
+    objects = [obj async for obj in queryset[bottom:bottom + per_page]]
+    return Page(objects, number, paginator)
+
+
+def page_context(page):
+    return {
+        'paginator': page.paginator,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
+        'object_list': page.object_list,
+    }
+
+
+class PostListView(AsyncConditionalGetMixin, views.PostListView):
+    """Async list of published posts"""
+
+    async def render_page(self, request, *args, **kwargs):
+        page = await apaginate(request, self.get_queryset(), self.paginate_by)
+        snapshot = await get_snapshot()
+        context = {
+            **page_context(page),
+            'view': self,
+            'posts': page.object_list,
+            'categories': snapshot.categories,
+            'tags': snapshot.tags,
+        }
+        return await arender(request, self.template_name, context)
+
+
+class PostDetailView(AsyncConditionalGetMixin, views.PostDetailView):
+    """Async post page"""
+
+    async def aget_object(self):
+        # Fetched once per request: the validators and the page both need it
+        if getattr(self, '_post', None) is None:
+            try:
+                self._post = await self.get_queryset().aget(slug=self.kwargs[self.slug_url_kwarg])
+            except Post.DoesNotExist:
+                raise Http404('No post found matching the query')
+            # Count the visit (also for 304 responses, but not when pre-rendering)
+            if not getattr(self.request, 'is_prerender', False):
+                await self._post.aincrement_views()
+        return self._post
+
+    async def aget_validators(self):
+        post = await self.aget_object()
+        return await caching.apost_validators(post, await current_taxonomy_generation())
+
+    async def render_page(self, request, *args, **kwargs):
+        post = await self.aget_object()
+        comments = post.comments.filter(
+            is_approved=True,
+            parent__isnull=True
+        ).select_related('author').prefetch_related('replies')
+        # Evaluate the queryset here so the template reads its result cache
+        [comment async for comment in comments]
+        related_posts = [related async for related in post.related_posts()]
+
+        user = request.user
+        context = {
+            'view': self,
+            'object': post,
+            'post': post,
+            'comments': comments,
+            'comment_form': CommentForm(),
+            'related_posts': related_posts,
+            'can_edit': user.is_authenticated and (
+                post.author_id == user.pk or user.is_admin() or user.is_superuser
+            ),
+        }
+        return await arender(request, self.template_name, context)
+
+
+class PostSearchView(AsyncConditionalGetMixin, views.PostSearchView):
+    """Async search results"""
+
+    async def render_page(self, request, *args, **kwargs):
+        page = await apaginate(request, self.get_queryset(), self.paginate_by)
+        context = {
+            **page_context(page),
+            'view': self,
+            'posts': page.object_list,
+            # The form's choices come from the taxonomy snapshot
+            'search_form': await sync_to_async(PostSearchForm)(request.GET),
+            'query': request.GET.get('query', ''),
+            'total_results': page.paginator.count,
+        }
+        return await arender(request, self.template_name, context)
+
+
+class CategoryDetailView(AsyncConditionalGetMixin, views.CategoryDetailView):
+    """Async list of the published posts in a category"""
+
+    async def render_page(self, request, *args, **kwargs):
+        try:
+            category = await Category.objects.aget(slug=self.kwargs[self.slug_url_kwarg])
+        except Category.DoesNotExist:
+            raise Http404('No category found matching the query')
+        posts = Post.objects.filter(
+            category=category,
+            status='published'
+        ).select_related('author').prefetch_related('tags').annotate(
+            comment_count=Count('comments')
+        ).order_by('-published_at')
+        page = await apaginate(request, posts, 10, fallback=True)
+        context = {
+            'view': self,
+            'object': category,
+            'category': category,
+            'posts': page,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+        }
+        return await arender(request, self.template_name, context)
+
+
+class TagDetailView(AsyncConditionalGetMixin, views.TagDetailView):
+    """Async list of the published posts with a tag"""
+
+    async def render_page(self, request, *args, **kwargs):
+        try:
+            tag = await Tag.objects.aget(slug=self.kwargs[self.slug_url_kwarg])
+        except Tag.DoesNotExist:
+            raise Http404('No tag found matching the query')
+        posts = Post.objects.filter(
+            tags=tag,
+            status='published'
+        ).select_related('author', 'category').prefetch_related('tags').annotate(
+            comment_count=Count('comments')
+        ).order_by('-published_at')
+        page = await apaginate(request, posts, 10, fallback=True)
+        context = {
+            'view': self,
+            'object': tag,
+            'tag': tag,
+            'posts': page,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+        }
+        return await arender(request, self.template_name, context)
+
+
+class CategoryListView(AsyncConditionalGetMixin, views.CategoryListView):
+    """Async list of all categories"""
+
+    async def render_page(self, request, *args, **kwargs):
+        snapshot = await get_snapshot()
+        context = {
+            'view': self,
+            'object_list': snapshot.categories,
+            'categories': snapshot.categories,
+            'is_paginated': False,
+        }
+        return await arender(request, self.template_name, context)
+
+
+class TagListView(AsyncConditionalGetMixin, views.TagListView):
+    """Async list of all tags"""
+
+    async def render_page(self, request, *args, **kwargs):
+        snapshot = await get_snapshot()
+        context = {
+            'view': self,
+            'object_list': snapshot.tags,
+            'tags': snapshot.tags,
+            'is_paginated': False,
+        }
+        return await arender(request, self.template_name, context)
+
+
+class AuthorProfileView(AsyncConditionalGetMixin, views.AuthorProfileView):
+    """Async author page"""
+
+    async def aget_object(self):
+        if getattr(self, '_author', None) is None:
+            try:
+                self._author = await self.get_queryset().aget(username=self.kwargs[self.slug_url_kwarg])
+            except views.User.DoesNotExist:
+                raise Http404('No user found matching the query')
+        return self._author
+
+    async def aget_validators(self):
+        author = await self.aget_object()
+        return caching.author_validators(author, authors.get_stats(author))
+
+    async def render_page(self, request, *args, **kwargs):
+        author = await self.aget_object()
+        try:
+            page = await self.get_paginator(author).apage(request.GET.get('after'))
+        except InvalidPage:
+            raise Http404('Invalid page.')
+        context = {
+            'view': self,
+            'object': author,
+            'author': author,
+            'stats': authors.get_stats(author),
+            'posts': page,
+            'page_obj': page,
+        }
+        return await arender(request, self.template_name, context)
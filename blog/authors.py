@@ -0,0 +1,218 @@
+"""
+Author statistics.
+
+An author's page shows how many posts they have published and how often
+those were viewed and commented on. Instead of aggregating over ``Post`` and
+``Comment`` on every visit, the totals are kept in one ``AuthorStats`` row per
+author. Like the taxonomy counters, they are kept current with ``F()``
+deltas, applied in the transaction that makes the change:
+
+    post saved or deleted             ``post_saved()`` / ``post_deleted()``
+                                      (see blog.signals)
+    comment saved or deleted          ``comment_approval_changed()``
+    bulk status and approval changes  ``posts_status_changed()`` /
+                                      ``comments_approval_changed()``
+                                      (see blog.bulk)
+    post views                        buffered per process (see
+                                      blog.buffers), then one delta per author
+
+Each change costs one UPDATE per affected author and no aggregate. An author
+without a row yet gets one computed from scratch after the commit. ``refresh()`` with no
+arguments rebuilds every row (``manage.py recount_author_stats``), e.g. after
+rows were changed behind the ORM's back.
+"""
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import buffers
+from .models import AuthorStats, Comment, Post
+
+STAT_FIELDS = ['post_count', 'published_count', 'total_views', 'total_comments', 'updated_at']
+
+
+def _refresh_chunk(author_ids):
+    posts = Post.objects.filter(author_id__in=author_ids).values('author_id').annotate(
+        post_count=Count('pk'),
+        published_count=Count('pk', filter=Q(status='published')),
+        total_views=Sum('views_count'),
+    ).order_by()
+    by_author = {row['author_id']: row for row in posts}
+    comments = dict(
+        Comment.objects.filter(
+            post__author_id__in=author_ids, post__status='published', is_approved=True
+        ).values('post__author_id').annotate(total=Count('pk')).values_list('post__author_id', 'total').order_by()
+    )
+    now = timezone.now()
+    rows = []
+    for author_id in author_ids:
+        row = by_author.get(author_id, {})
+        rows.append(AuthorStats(
+            author_id=author_id,
+            post_count=row.get('post_count', 0),
+            published_count=row.get('published_count', 0),
+            total_views=row.get('total_views') or 0,
+            total_comments=comments.get(author_id, 0),
+            updated_at=now,
+        ))
+    AuthorStats.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['author'],
+        update_fields=STAT_FIELDS,
+    )
+    return len(rows)
+
+
+def refresh(author_ids=None, chunk_size=1000):
+    """
+    Recompute the stats of the given authors, or of every user who has
+    written a post. Returns the number of rows written.
+    """
+    User = get_user_model()
+    if author_ids is None:
+        users = User.objects.filter(posts__isnull=False).distinct()
+    else:
+        # Authors deleted in the meantime are skipped
+        users = User.objects.filter(pk__in={pk for pk in author_ids if pk is not None})
+    ids = sorted(users.values_list('pk', flat=True))
+    written = 0
+    for start in range(0, len(ids), chunk_size):
+        written += _refresh_chunk(ids[start:start + chunk_size])
+    return written
+
+
+def adjust(deltas):
+    """
+    Apply ``{author_id: {field: delta}}`` to the authors' stats with one
+    UPDATE per author. Authors without a row are recomputed once the
+    transaction commits, when their user may turn out to have been deleted.
+    """
+    now = timezone.now()
+    missing = []
+    for author_id, changes in deltas.items():
+        changes = {field: delta for field, delta in changes.items() if delta}
+        if author_id is None or not changes:
+            continue
+        updated = AuthorStats.objects.filter(author_id=author_id).update(
+            updated_at=now,
+            **{field: Greatest(F(field) + delta, Value(0)) for field, delta in changes.items()},
+        )
+        if not updated:
+            missing.append(author_id)
+    if missing:
+        transaction.on_commit(lambda: refresh(missing))
+
+
+def _add_post(deltas, author_id, sign, published, views, comments):
+    changes = deltas.setdefault(author_id, Counter())
+    changes['post_count'] += sign
+    changes['published_count'] += sign * published
+    changes['total_views'] += sign * views
+    # Comments only count on published posts
+    changes['total_comments'] += sign * published * comments
+
+
+def post_saved(post, previous=None):
+    """
+    Move a saved post's share of the stats from ``previous``, its
+    ``(author_id, status, views_count)`` before the save (None for a new
+    post), to its current author and status.
+    """
+    published = post.status == 'published'
+    was_published = previous is not None and previous[1] == 'published'
+    moved = previous is not None and previous[0] != post.author_id
+    # Unless the comments move or change visibility, both sides cancel out
+    comments = 0
+    if (published or was_published) and (moved or published != was_published):
+        comments = post.comments.filter(is_approved=True).count()
+    deltas = {}
+    if previous is not None:
+        _add_post(deltas, previous[0], -1, was_published, previous[2], comments)
+    _add_post(deltas, post.author_id, 1, published, post.views_count, comments)
+    adjust(deltas)
+
+
+def post_deleted(stored):
+    """
+    Remove a deleted post, given as its stored ``(author_id, status,
+    views_count)``, from its author's stats. Its comments are deleted first
+    and leave with their own signals.
+    """
+    deltas = {}
+    _add_post(deltas, stored[0], -1, stored[1] == 'published', stored[2], 0)
+    adjust(deltas)
+
+
+def comment_approval_changed(post_id, delta):
+    """Count ``delta`` approved comments more on a post, if it is published"""
+    author_id = Post.objects.filter(pk=post_id, status='published').values_list('author_id', flat=True).first()
+    if author_id is not None:
+        adjust({author_id: {'total_comments': delta}})
+
+
+def posts_status_changed(post_ids, sign):
+    """The given posts were just published (``sign=1``) or unpublished (``sign=-1``)"""
+    deltas = {}
+    posts = Post.objects.filter(pk__in=post_ids).values('author_id').annotate(total=Count('pk')).order_by()
+    for author_id, total in posts.values_list('author_id', 'total'):
+        deltas.setdefault(author_id, Counter())['published_count'] += sign * total
+    comments = Comment.objects.filter(post_id__in=post_ids, is_approved=True).values('post__author_id').annotate(
+        total=Count('pk')
+    ).order_by()
+    for author_id, total in comments.values_list('post__author_id', 'total'):
+        deltas.setdefault(author_id, Counter())['total_comments'] += sign * total
+    adjust(deltas)
+
+
+def comments_approval_changed(comment_ids, sign):
+    """The given comments were just approved (``sign=1``) or unapproved (``sign=-1``)"""
+    counts = Comment.objects.filter(pk__in=comment_ids, post__status='published').values('post__author_id').annotate(
+        total=Count('pk')
+    ).order_by()
+    adjust({
+        author_id: {'total_comments': sign * total}
+        for author_id, total in counts.values_list('post__author_id', 'total')
+    })
+
+
+def get_stats(author):
+    """The author's stats, or zeros when none have been computed yet"""
+    try:
+        return author.author_stats
+    except AuthorStats.DoesNotExist:
+        return AuthorStats(author=author)
+
+
+# ---------------------------------------------------------------------------
+# Per-process view buffer
+# ---------------------------------------------------------------------------
+
+class ViewBuffer(buffers.WriteBuffer):
+    """Counts views per author and adds them to the stats in batches"""
+
+    description = 'author views'
+
+    def empty(self):
+        return Counter()
+
+    def add(self, views, author_id):
+        views[author_id] += 1
+
+    def write(self, views):
+        adjust({author_id: {'total_views': count} for author_id, count in views.items()})
+
+
+buffer = ViewBuffer()
+
+
+def record_view(author_id):
+    buffer.record(author_id)
+
+
+async def arecord_view(author_id):
+    await buffer.arecord(author_id)
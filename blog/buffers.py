@@ -0,0 +1,142 @@
+"""
+Per-process write buffers.
+
+Every post view is counted by ``blog.popularity``, ``blog.analytics`` and
+``blog.authors``. Rather than writing on each view, they keep the views in a
+``WriteBuffer`` subclass, which says how records are collected (``empty()``
+and ``add()``) and how a batch of them is written (``write()``).
+
+Buffering only happens in serving processes: ``advanced_blog/wsgi.py`` and
+``asgi.py`` call ``start()``. There a request only adds to the buffer. A
+background thread writes a buffer once it holds ``VIEW_BUFFER_SIZE`` records,
+and writes whatever is pending every ``VIEW_BUFFER_SECONDS`` seconds and when
+the process exits.
+
+Everywhere else (tests, management commands, shells) each record is written
+straight away, so nothing is left in memory when the process ends and no
+thread writes behind the caller's back.
+"""
+import atexit
+import logging
+import os
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+_buffers = []
+_serving = False
+_lock = threading.Lock()
+_wake = threading.Event()
+_flusher = None
+_flusher_pid = None
+
+
+class WriteBuffer:
+    """Records collected in memory and written in batches"""
+
+    description = 'records'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = self.empty()
+        self._pending = 0
+        _buffers.append(self)
+
+    def empty(self):
+        """A new, empty collection of records"""
+        raise NotImplementedError
+
+    def add(self, records, record):
+        """Add one record to a collection"""
+        raise NotImplementedError
+
+    def write(self, records):
+        """Write a collection of records to the database"""
+        raise NotImplementedError
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def record(self, record):
+        if not _serving:
+            self._write_one(record)
+            return
+        with self._lock:
+            self.add(self._records, record)
+            self._pending += 1
+            full = self._pending >= getattr(settings, 'VIEW_BUFFER_SIZE', 500)
+        _start_flusher()
+        if full:
+            _wake.set()
+
+    async def arecord(self, record):
+        if not _serving:
+            await sync_to_async(self._write_one)(record)
+            return
+        # Only touches memory
+        self.record(record)
+
+    def flush(self):
+        """Write everything recorded so far"""
+        with self._lock:
+            records, self._records = self._records, self.empty()
+            self._pending = 0
+        if records:
+            self.write(records)
+
+    def _write_one(self, record):
+        records = self.empty()
+        self.add(records, record)
+        self.write(records)
+
+
+def start():
+    """Buffer records in this process; called by the WSGI and ASGI entry points"""
+    global _serving
+    with _lock:
+        if not _serving:
+            _serving = True
+            atexit.register(flush_all)
+
+
+def flush_all():
+    for buffer in _buffers:
+        try:
+            buffer.flush()
+        except DatabaseError:
+            logger.exception('Could not write buffered %s', buffer.description)
+
+
+def _start_flusher():
+    """Start the flush thread on first use, and again in a forked worker"""
+    global _flusher, _flusher_pid
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _lock:
+        if _flusher_pid != pid:
+            _flusher = threading.Thread(target=_run_flusher, name='write-buffers', daemon=True)
+            _flusher.start()
+            _flusher_pid = pid
+
+
+def _run_flusher():
+    while True:
+        full = _wake.wait(timeout=getattr(settings, 'VIEW_BUFFER_SECONDS', 10))
+        _wake.clear()
+        size = getattr(settings, 'VIEW_BUFFER_SIZE', 500)
+        for buffer in _buffers:
+            # Woken up: the full buffers; timed out: anything pending
+            if buffer.pending >= (size if full else 1):
+                try:
+                    buffer.flush()
+                except Exception:
+                    logger.exception('Could not write buffered %s', buffer.description)
+        # This thread's own connections
+        connections.close_all()
+
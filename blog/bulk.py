@@ -0,0 +1,132 @@
+"""
+Set-based bulk operations on posts and comments.
+
+Each operation works through the selection in chunks of ``BLOG_BULK_CHUNK_SIZE``
+rows. Every status or approval chunk is a single UPDATE in its own
+transaction, followed by a set-based recount of the affected taxonomy
+counters and the matching author stats deltas. One batched domain event is
+emitted at the end instead of per-row model signals. Comments are deleted
+with Django's ``delete()``, so their post_delete receivers run; the events
+those emit are merged into one. An optional ``progress(done, total)``
+callback is called after each chunk.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import authors, events, taxonomy
+from .models import Comment, Post
+
+logger = logging.getLogger(__name__)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _chunk_size(chunk_size):
+    return chunk_size or getattr(settings, 'BLOG_BULK_CHUNK_SIZE', 1000)
+
+
+def set_post_status(queryset, status, chunk_size=None, progress=None, published_at=None):
+    """
+    Move every post in ``queryset`` to ``status`` and return how many changed.
+
+    Publishing sets ``published_at`` only where it is still empty, unless a
+    ``published_at`` expression is given.
+    """
+    pks = list(queryset.exclude(status=status).values_list('pk', flat=True))
+    total, done, count, changed = len(pks), 0, 0, []
+    for chunk in _chunks(pks, _chunk_size(chunk_size)):
+        now = timezone.now()
+        values = {'status': status, 'updated_at': now}
+        if status == 'published':
+            values['published_at'] = (
+                Coalesce('published_at', Value(now)) if published_at is None else published_at
+            )
+        with transaction.atomic():
+            # Rows changed or deleted since the selection don't count. The
+            # rows read are locked, so they are the ones the UPDATE changes
+            rows = list(
+                Post.objects.filter(pk__in=chunk).exclude(status=status)
+                .select_for_update().values_list('pk', 'status')
+            )
+            ids = [pk for pk, _ in rows]
+            count += Post.objects.filter(pk__in=ids).update(**values)
+            if status == 'published':
+                authors.posts_status_changed(ids, 1)
+            else:
+                authors.posts_status_changed([pk for pk, old in rows if old == 'published'], -1)
+            category_ids = set(
+                Post.objects.filter(pk__in=ids).values_list('category_id', flat=True)
+            )
+            tag_ids = set(
+                Post.tags.through.objects.filter(post_id__in=ids).values_list('tag_id', flat=True)
+            )
+            taxonomy.recount(category_ids=category_ids - {None}, tag_ids=tag_ids)
+        changed.extend(ids)
+        done += len(chunk)
+        logger.info('Set %d/%d post(s) to %s', done, total, status)
+        if progress:
+            progress(done, total)
+
+    if changed:
+        transaction.on_commit(taxonomy.invalidate)
+        if status == 'published':
+            events.emit(events.posts_published, Post, changed)
+        events.emit(events.posts_changed, Post, changed)
+    return count
+
+
+def set_comment_approval(queryset, is_approved, chunk_size=None, progress=None):
+    """Approve or unapprove every comment in ``queryset`` and return how many changed"""
+    pks = list(queryset.exclude(is_approved=is_approved).values_list('pk', flat=True))
+    total, done, changed, post_ids = len(pks), 0, 0, set()
+    for chunk in _chunks(pks, _chunk_size(chunk_size)):
+        with transaction.atomic():
+            # Rows changed or deleted since the selection don't count
+            rows = list(
+                Comment.objects.filter(pk__in=chunk).exclude(is_approved=is_approved)
+                .select_for_update().values_list('pk', 'post_id')
+            )
+            ids = [pk for pk, _ in rows]
+            post_ids.update(post_id for _, post_id in rows)
+            changed += Comment.objects.filter(pk__in=ids).update(is_approved=is_approved, updated_at=timezone.now())
+            authors.comments_approval_changed(ids, 1 if is_approved else -1)
+        done += len(chunk)
+        logger.info('%s %d/%d comment(s)', 'Approved' if is_approved else 'Unapproved', done, total)
+        if progress:
+            progress(done, total)
+
+    events.emit(events.comments_changed, Comment, post_ids)
+    return changed
+
+
+def delete_comments(queryset, chunk_size=None, progress=None):
+    """
+    Delete every comment in ``queryset`` together with all replies below it.
+
+    Returns the number of comments deleted, replies included.
+    """
+    pks = set(queryset.values_list('pk', flat=True))
+    # Walk the reply tree level by level with one query per depth
+    frontier = pks
+    while frontier:
+        frontier = set(Comment.objects.filter(parent_id__in=frontier).values_list('pk', flat=True)) - pks
+        pks |= frontier
+
+    ordered, done, deleted = sorted(pks), 0, 0
+    with transaction.atomic(), events.collect():
+        for chunk in _chunks(ordered, _chunk_size(chunk_size)):
+            # Replies in a later chunk may already be gone with their parent
+            deleted += Comment.objects.filter(pk__in=chunk).delete()[1].get(Comment._meta.label, 0)
+            done += len(chunk)
+            logger.info('Deleted %d/%d comment(s)', done, len(ordered))
+            if progress:
+                progress(done, len(ordered))
+    return deleted
@@ -0,0 +1,217 @@
+"""
+HTTP caching for blog pages.
+
+Pages are validated against cheap "generation" numbers instead of being
+rendered to compare. A generation is a nanosecond timestamp kept in the
+configured cache and replaced whenever the data it covers changes:
+
+    content     bumped by posts_changed/comments_changed events
+    taxonomy    bumped when categories, tags or their counts change
+    related     bumped when precomputed related-posts lists change
+
+Generations expire after a TTL so that workers using a process-local cache
+still converge on fresh pages. ``ConditionalGetMixin`` turns the validators
+into ETag/Last-Modified headers, answers matching conditional requests with
+304 and sets Cache-Control for anonymous vs authenticated visitors.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+CONTENT_GENERATION_KEY = 'blog:content:generation'
+RELATED_GENERATION_KEY = 'blog:related:generation'
+
+
+def current_generation(key, ttl):
+    """Return the generation stored under ``key``, starting a new one if missing"""
+    return cache.get_or_set(key, time.time_ns, timeout=ttl)
+
+
+def bump_generation(key, ttl):
+    """Start a new generation under ``key`` and return it"""
+    generation = time.time_ns()
+    cache.set(key, generation, timeout=ttl)
+    return generation
+
+
+def content_generation():
+    return current_generation(CONTENT_GENERATION_KEY, getattr(settings, 'CONTENT_GENERATION_TTL', 60))
+
+
+def bump_content_generation(**kwargs):
+    """Signal receiver for blog events that change what pages display"""
+    bump_generation(CONTENT_GENERATION_KEY, getattr(settings, 'CONTENT_GENERATION_TTL', 60))
+
+
+def related_generation():
+    return current_generation(RELATED_GENERATION_KEY, getattr(settings, 'CONTENT_GENERATION_TTL', 60))
+
+
+def bump_related_generation():
+    bump_generation(RELATED_GENERATION_KEY, getattr(settings, 'CONTENT_GENERATION_TTL', 60))
+
+
+def generation_datetime(generation):
+    return datetime.fromtimestamp(generation / 1e9, tz=dt_timezone.utc)
+
+
+def make_etag(*parts):
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _approved_comments(post):
+    return post.comments.filter(is_approved=True)
+
+
+def post_validators(post, taxonomy_generation):
+    """
+    Return (etag, last_modified) for a post page.
+
+    Covers the post itself, its approved comments, the taxonomy it shows and
+    its related posts.
+    """
+    comments = _approved_comments(post).aggregate(latest=Max('updated_at'), total=Count('pk'))
+    return _post_validators(post, comments, taxonomy_generation, related_generation())
+
+
+async def apost_validators(post, taxonomy_generation):
+    """Async version of ``post_validators``"""
+    comments = await _approved_comments(post).aaggregate(latest=Max('updated_at'), total=Count('pk'))
+    return _post_validators(post, comments, taxonomy_generation, await sync_to_async(related_generation)())
+
+
+def _post_validators(post, comments, taxonomy_generation, related):
+    last_modified = max(
+        value for value in (
+            post.updated_at,
+            comments['latest'],
+            generation_datetime(taxonomy_generation),
+            generation_datetime(related),
+        ) if value is not None
+    )
+    etag = make_etag(
+        'post', post.pk, post.updated_at.isoformat(), comments['latest'], comments['total'],
+        taxonomy_generation, related,
+    )
+    return etag, last_modified
+
+
+def listing_validators(taxonomy_generation):
+    """Return (etag, last_modified) for pages that list posts or taxonomy"""
+    generation = content_generation()
+    etag = make_etag('listing', generation, taxonomy_generation)
+    return etag, generation_datetime(max(generation, taxonomy_generation))
+
+
+def author_validators(author, stats):
+    """
+    Return (etag, last_modified) for an author's page.
+
+    Covers the author's profile, their stats and the posts listed.
+    """
+    generation = content_generation()
+    etag = make_etag(
+        'author', author.pk, author.get_full_name(), author.bio, author.role,
+        stats.updated_at.isoformat() if stats.updated_at else None, generation,
+    )
+    last_modified = max(
+        value for value in (stats.updated_at, generation_datetime(generation)) if value is not None
+    )
+    return etag, last_modified
+
+
+class ConditionalGetMixin:
+    """
+    Add validators and Cache-Control to a view's GET responses.
+
+    Subclasses implement ``get_validators()`` returning ``(etag, last_modified)``.
+    Authenticated users get their own private ETags (pages differ per user);
+    anonymous responses are public so a reverse proxy or CDN can share them.
+    Requests with pending flash messages are never cached.
+    """
+
+    def get_validators(self):
+        raise NotImplementedError('ConditionalGetMixin requires get_validators()')
+
+    def get(self, request, *args, **kwargs):
+        if len(get_messages(request)):
+            response = super().get(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_store=True)
+            return response
+
+        etag, last_modified = self.get_validators()
+        etag, response = self.check_conditions(request, etag, last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        self.add_validators(request, response, etag, last_modified)
+        return response
+
+    def check_conditions(self, request, etag, last_modified):
+        """Return the final ETag and a 304/412 response if the request's conditions match"""
+        if request.user.is_authenticated:
+            etag = make_etag(etag, 'user', request.user.pk)
+        etag = quote_etag(etag)
+        return etag, get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified.timestamp())
+        )
+
+    def add_validators(self, request, response, etag, last_modified):
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+        self.patch_cache_headers(request, response)
+
+    def patch_cache_headers(self, request, response):
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=getattr(settings, 'HTTP_CACHE_MAX_AGE', 0),
+                s_maxage=getattr(settings, 'HTTP_CACHE_SHARED_MAX_AGE', 60),
+            )
+        patch_vary_headers(response, ['Cookie'])
+
+
+class AsyncConditionalGetMixin(ConditionalGetMixin):
+    """
+    ``ConditionalGetMixin`` for async views.
+
+    Subclasses implement ``async render_page()`` instead of relying on the
+    view's ``get()``, and may override ``aget_validators()``; by default the
+    sync ``get_validators()`` runs in a thread.
+    """
+
+    async def aget_validators(self):
+        return await sync_to_async(self.get_validators)()
+
+    async def render_page(self, request, *args, **kwargs):
+        raise NotImplementedError('AsyncConditionalGetMixin requires render_page()')
+
+    async def get(self, request, *args, **kwargs):
+        # The lazy request.user can't query from async code, so resolve it now
+        request.user = await request.auser()
+        # Message storage may read the session from the database
+        if await sync_to_async(_has_messages)(request):
+            response = await self.render_page(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_store=True)
+            return response
+
+        etag, last_modified = await self.aget_validators()
+        etag, response = self.check_conditions(request, etag, last_modified)
+        if response is None:
+            response = await self.render_page(request, *args, **kwargs)
+        self.add_validators(request, response, etag, last_modified)
+        return response
+
+
+def _has_messages(request):
+    return bool(len(get_messages(request)))
@@ -0,0 +1,150 @@
+"""
+Duplicate comment detection.
+
+Every comment carries two fingerprints of its normalized text (see
+``blog.moderation.normalize``): ``content_hash`` for exact repeats and a
+64-bit SimHash for near repeats. Two texts that differ by a few words have
+SimHashes differing in only a few bits.
+
+``is_duplicate()`` runs before a comment is saved. The comment is refused
+when the same author has commented on the same post within
+``DUPLICATE_COMMENT_WINDOW`` seconds with text whose SimHash is at most
+``DUPLICATE_COMMENT_DISTANCE`` bits away. That lookup reads the author's
+few recent comments on the post through the (author, post, created_at)
+index. A cache key per (author, post, text) is claimed as well, so two
+identical submissions racing each other (a double click) can't both get
+through.
+
+``clusters()`` finds the same groups among existing comments, for
+``manage.py find_duplicate_comments``.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Comment
+from .moderation import content_hash, normalize
+from .paginators import KeysetPaginator
+
+BITS = 64
+MASK = (1 << BITS) - 1
+SHINGLE = 3
+
+
+def _features(text):
+    words = normalize(text).split()
+    if len(words) < SHINGLE:
+        return [' '.join(words)] if words else []
+    return [' '.join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)]
+
+
+def simhash(text):
+    """64-bit SimHash of the text's word 3-grams, as a signed integer for the database"""
+    counts = [0] * BITS
+    for feature in _features(text):
+        value = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'big')
+        for bit in range(BITS):
+            counts[bit] += 1 if value >> bit & 1 else -1
+    value = sum(1 << bit for bit in range(BITS) if counts[bit] > 0)
+    return value - (1 << BITS) if value >> (BITS - 1) else value
+
+
+def distance(a, b):
+    """Number of differing bits between two SimHashes"""
+    return ((a ^ b) & MASK).bit_count()
+
+
+def fingerprint(comment):
+    """Set the comment's fingerprints, unless they already match its text"""
+    digest = content_hash(comment.content)
+    if digest != comment.content_hash or comment.simhash is None:
+        comment.content_hash = digest
+        comment.simhash = simhash(comment.content)
+
+
+def _window():
+    return getattr(settings, 'DUPLICATE_COMMENT_WINDOW', 600)
+
+
+def _near(a, b, max_distance):
+    if a.content_hash == b.content_hash:
+        return True
+    return a.simhash is not None and b.simhash is not None and distance(a.simhash, b.simhash) <= max_distance
+
+
+def is_duplicate(comment):
+    """
+    Whether an unsaved comment repeats one its author just posted on the same
+    post. Sets the comment's fingerprints.
+    """
+    fingerprint(comment)
+    window = _window()
+    recent = Comment.objects.filter(
+        author_id=comment.author_id,
+        post_id=comment.post_id,
+        created_at__gte=timezone.now() - timedelta(seconds=window),
+    ).only('content_hash', 'simhash')
+    max_distance = getattr(settings, 'DUPLICATE_COMMENT_DISTANCE', 8)
+    if any(_near(comment, other, max_distance) for other in recent):
+        return True
+    # Not saved yet: a concurrent identical submission may be right behind
+    key = f'blog:comment:{comment.author_id}:{comment.post_id}:{comment.content_hash}'
+    return not cache.add(key, 1, timeout=window)
+
+
+def fill_fingerprints(chunk_size=1000, progress=None):
+    """Compute the SimHash of comments saved without one; returns how many"""
+    done, last = 0, 0
+    while True:
+        chunk = list(
+            Comment.objects.filter(pk__gt=last, simhash__isnull=True).order_by('pk').only(
+                'content', 'content_hash', 'simhash'
+            )[:chunk_size]
+        )
+        if not chunk:
+            return done
+        for comment in chunk:
+            fingerprint(comment)
+        Comment.objects.bulk_update(chunk, ['content_hash', 'simhash'])
+        done += len(chunk)
+        last = chunk[-1].pk
+        if progress:
+            progress(done)
+
+
+def clusters(window=None, max_distance=None, chunk_size=1000):
+    """
+    Yield lists of duplicate comments, oldest first.
+
+    Comments are read in chunks ordered by author, post and time, and each
+    is compared with that author's earlier comments on the post still
+    inside the window.
+    """
+    window = timedelta(seconds=_window() if window is None else window)
+    if max_distance is None:
+        max_distance = getattr(settings, 'DUPLICATE_COMMENT_DISTANCE', 8)
+    paginator = KeysetPaginator(
+        Comment.objects.only('author_id', 'post_id', 'created_at', 'content_hash', 'simhash'),
+        chunk_size,
+        ordering=('author_id', 'post_id', 'created_at', 'pk'),
+    )
+    group, recent, found = None, [], {}
+    cursor = None
+    while True:
+        page = paginator.page(cursor)
+        for comment in page:
+            if (comment.author_id, comment.post_id) != group:
+                yield from (cluster for cluster in found.values() if len(cluster) > 1)
+                group, recent, found = (comment.author_id, comment.post_id), [], {}
+            recent = [other for other in recent if comment.created_at - other.created_at <= window]
+            original = next((other for other in recent if _near(comment, other, max_distance)), None)
+            comment.cluster = original.cluster if original else comment.pk
+            found.setdefault(comment.cluster, []).append(comment)
+            recent.append(comment)
+        if not page.has_next():
+            break
+        cursor = page.next_cursor
+    yield from (cluster for cluster in found.values() if len(cluster) > 1)
@@ -0,0 +1,53 @@
+"""
+Blog domain events.
+
+Model signals fire once per saved instance. These events fire once per
+logical change and carry the ids of every affected post, so a bulk operation
+touching thousands of rows emits a single event. They are sent only after the
+surrounding transaction commits.
+
+    posts_published   posts that just became published
+    posts_changed     posts whose public content, status or taxonomy changed
+    comments_changed  posts whose set of visible comments changed
+
+Receivers take ``sender`` and ``post_ids`` keyword arguments.
+
+Inside ``collect()``, the events emitted by model signals are merged and
+emitted once when the block ends. Bulk operations that go through Django's
+``delete()`` use it, so every receiver still runs without one event per row.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.dispatch import Signal
+
+posts_published = Signal()
+posts_changed = Signal()
+comments_changed = Signal()
+
+_collected = ContextVar('collected_events', default=None)
+
+
+@contextmanager
+def collect():
+    """Merge the events emitted inside the block into one per signal and sender"""
+    collected = {}
+    token = _collected.set(collected)
+    try:
+        yield
+    finally:
+        _collected.reset(token)
+    for (signal, sender), post_ids in collected.items():
+        emit(signal, sender, post_ids)
+
+
+def emit(signal, sender, post_ids):
+    """Send ``signal`` with the given post ids once the transaction commits"""
+    collected = _collected.get()
+    if collected is not None:
+        collected.setdefault((signal, sender), set()).update(post_ids)
+        return
+    post_ids = sorted(set(post_ids))
+    if post_ids:
+        transaction.on_commit(lambda: signal.send(sender=sender, post_ids=post_ids))
@@ -0,0 +1,275 @@
+"""
+RSS 2.0, Atom 1.0 and JSON Feed 1.1 syndication.
+
+Feeds exist for the whole site and per category, tag and author. They are
+built from a lean listing query: no content column beyond a short prefix for
+the summary, no comments and no tags. The latest ``FEED_ITEMS`` posts of a
+feed are rendered once and the body is cached under a feed generation that
+the ``posts_changed`` event bumps. A feed is therefore regenerated only after a
+post is published, edited or withdrawn. Responses carry ETag/Last-Modified
+from that generation, so pollers mostly get 304s.
+
+The full-archive feed (``/feeds/<format>/archive/``) can be arbitrarily
+large. It is never cached: it is streamed item by item from a server-side
+iterator, under WSGI and ASGI alike (see ``blog.streaming``).
+"""
+import io
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.functions import Substr
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.html import strip_tags
+from django.utils.http import http_date, quote_etag
+from django.utils.text import Truncator
+from django.utils.xmlutils import SimplerXMLGenerator
+
+from . import caching, taxonomy
+from .streaming import streaming_response
+from .models import Category, Post, Tag
+
+User = get_user_model()
+
+GENERATION_KEY = 'blog:feeds:generation'
+SITE_TITLE = 'Advanced Blog'
+SUMMARY_CHARS = 1000
+SUMMARY_WORDS = 60
+
+CONTENT_TYPES = {
+    'rss': 'application/rss+xml; charset=utf-8',
+    'atom': 'application/atom+xml; charset=utf-8',
+    'json': 'application/feed+json; charset=utf-8',
+}
+
+
+class FeedFormatConverter:
+    """URL converter for the feed format segment"""
+    regex = 'rss|atom|json'
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
+
+
+def _cache_ttl():
+    return getattr(settings, 'FEED_CACHE_TTL', 3600)
+
+
+def current_generation():
+    return caching.current_generation(GENERATION_KEY, _cache_ttl())
+
+
+def invalidate(**kwargs):
+    """Signal receiver: published posts changed, so every cached feed is stale"""
+    caching.bump_generation(GENERATION_KEY, _cache_ttl())
+
+
+def feed_posts():
+    """The lean queryset feeds are built from: published posts, newest first"""
+    return Post.objects.filter(status='published').select_related('author', 'category').only(
+        'title', 'slug', 'excerpt', 'published_at', 'updated_at',
+        'author__username', 'author__first_name', 'author__last_name',
+        'category__name', 'category__slug',
+    ).annotate(content_head=Substr('content', 1, SUMMARY_CHARS)).order_by('-published_at', '-pk')
+
+
+def _summary(post):
+    if post.excerpt:
+        return post.excerpt
+    return Truncator(strip_tags(post.content_head)).words(SUMMARY_WORDS)
+
+
+class Channel:
+    """What a feed covers: its title, link and posts"""
+
+    def __init__(self, request, title, link, description, posts):
+        self.request = request
+        self.title = title
+        self.link = request.build_absolute_uri(link)
+        self.description = description
+        self.posts = posts
+        self.updated = None
+
+    def item(self, post):
+        author = post.author
+        return {
+            'title': post.title,
+            'link': self.request.build_absolute_uri(post.get_absolute_url()),
+            'description': _summary(post),
+            'author_name': author.get_full_name() or author.username,
+            'pubdate': post.published_at,
+            'updateddate': post.updated_at,
+            'unique_id': self.request.build_absolute_uri(post.get_absolute_url()),
+            'categories': [post.category.name] if post.category else [],
+        }
+
+
+def _channel(request, scope, slug):
+    posts = feed_posts()
+    if scope in ('site', 'archive'):
+        return Channel(request, SITE_TITLE, '/', 'Latest posts', posts)
+    if scope == 'category':
+        category = get_object_or_404(Category, slug=slug)
+        return Channel(
+            request, f'{SITE_TITLE}: {category.name}', category.get_absolute_url(),
+            category.description or f'Posts in {category.name}', posts.filter(category=category),
+        )
+    if scope == 'tag':
+        tag = get_object_or_404(Tag, slug=slug)
+        return Channel(
+            request, f'{SITE_TITLE}: #{tag.name}', tag.get_absolute_url(),
+            f'Posts tagged {tag.name}', posts.filter(tags=tag),
+        )
+    if scope == 'author':
+        author = get_object_or_404(User, username=slug)
+        name = author.get_full_name() or author.username
+        return Channel(
+            request, f'{SITE_TITLE}: {name}', '/', f'Posts by {name}', posts.filter(author=author),
+        )
+    raise Http404('Unknown feed')
+
+
+# ---------------------------------------------------------------------------
+# Incremental renderers: each yields the feed as a series of byte chunks
+# ---------------------------------------------------------------------------
+
+def _xml_chunks(feed_class, root, item_element, channel, posts):
+    """Write a feedgenerator feed one item at a time"""
+    feed = feed_class(
+        title=channel.title, link=channel.link, description=channel.description,
+        feed_url=channel.request.build_absolute_uri(), language=settings.LANGUAGE_CODE,
+    )
+    # Items are added one at a time, so the feed can't work out its own date
+    feed.latest_post_date = lambda: channel.updated
+    buffer = io.StringIO()
+    handler = SimplerXMLGenerator(buffer, 'utf-8', short_empty_elements=True)
+
+    def flush():
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    handler.startDocument()
+    if root == 'rss':
+        handler.startElement('rss', feed.rss_attributes())
+        handler.startElement('channel', feed.root_attributes())
+    else:
+        handler.startElement(root, feed.root_attributes())
+    feed.add_root_elements(handler)
+    yield flush()
+
+    for post in posts:
+        feed.items = []
+        feed.add_item(**channel.item(post))
+        item = feed.items[0]
+        handler.startElement(item_element, feed.item_attributes(item))
+        feed.add_item_elements(handler, item)
+        handler.endElement(item_element)
+        yield flush()
+
+    if root == 'rss':
+        feed.endChannelElement(handler)
+    handler.endElement(root)
+    yield flush()
+
+
+def _json_chunks(channel, posts):
+    head = {
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': channel.title,
+        'home_page_url': channel.link,
+        'feed_url': channel.request.build_absolute_uri(),
+        'description': channel.description,
+        'language': settings.LANGUAGE_CODE,
+    }
+    # Everything but the closing "}" of the head object, then the items array
+    yield (json.dumps(head)[:-1] + ', "items": [').encode()
+    separator = ''
+    for post in posts:
+        item = channel.item(post)
+        entry = {
+            'id': item['unique_id'],
+            'url': item['link'],
+            'title': item['title'],
+            'summary': item['description'],
+            'date_published': item['pubdate'].isoformat() if item['pubdate'] else None,
+            'date_modified': item['updateddate'].isoformat(),
+            'authors': [{'name': item['author_name']}],
+            'tags': item['categories'],
+        }
+        yield (separator + json.dumps(entry)).encode()
+        separator = ', '
+    yield b']}'
+
+
+def render_chunks(fmt, channel, posts):
+    if fmt == 'rss':
+        return _xml_chunks(Rss201rev2Feed, 'rss', 'item', channel, posts)
+    if fmt == 'atom':
+        return _xml_chunks(Atom1Feed, 'feed', 'entry', channel, posts)
+    return _json_chunks(channel, posts)
+
+
+# ---------------------------------------------------------------------------
+# Views
+# ---------------------------------------------------------------------------
+
+def _validators(fmt, scope, slug):
+    generation = current_generation()
+    taxonomy_generation = taxonomy.current_generation()
+    etag = quote_etag(caching.make_etag('feed', generation, taxonomy_generation, fmt, scope, slug))
+    last_modified = caching.generation_datetime(max(generation, taxonomy_generation))
+    return generation, taxonomy_generation, etag, last_modified
+
+
+def _finish(response, etag, last_modified):
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=getattr(settings, 'HTTP_CACHE_MAX_AGE', 0),
+        s_maxage=getattr(settings, 'HTTP_CACHE_SHARED_MAX_AGE', 60),
+    )
+    return response
+
+
+def feed_view(request, fmt, scope='site', slug=None):
+    """A feed of the latest ``FEED_ITEMS`` posts, served from the feed cache"""
+    # Looks the category, tag or author up first: an unknown one is a 404, never a 304
+    channel = _channel(request, scope, slug)
+    generation, taxonomy_generation, etag, last_modified = _validators(fmt, scope, slug)
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+    if response is not None:
+        return _finish(response, etag, last_modified)
+
+    key = f'blog:feed:{generation}:{taxonomy_generation}:{request.get_host()}:{fmt}:{scope}:{slug}'
+    body = cache.get(key)
+    if body is None:
+        channel.updated = last_modified
+        posts = channel.posts[:getattr(settings, 'FEED_ITEMS', 20)]
+        body = b''.join(render_chunks(fmt, channel, posts))
+        cache.set(key, body, timeout=_cache_ttl())
+    return _finish(HttpResponse(body, content_type=CONTENT_TYPES[fmt]), etag, last_modified)
+
+
+def archive_feed_view(request, fmt):
+    """Every published post, streamed from a server-side cursor"""
+    generation, taxonomy_generation, etag, last_modified = _validators(fmt, 'archive', None)
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+    if response is not None:
+        return _finish(response, etag, last_modified)
+
+    channel = _channel(request, 'archive', None)
+    channel.updated = last_modified
+    posts = channel.posts.iterator(chunk_size=500)
+    response = streaming_response(request, render_chunks(fmt, channel, posts), content_type=CONTENT_TYPES[fmt])
+    return _finish(response, etag, last_modified)
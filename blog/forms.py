@@ -1,5 +1,7 @@
 from django import forms
-from .models import Post, Comment, Category, Tag
+from django.utils import timezone
+from . import taxonomy
+from .models import Post, Comment
 from ckeditor.widgets import CKEditorWidget
 
 
@@ -10,7 +12,7 @@ class PostForm(forms.ModelForm):
     
     class Meta:
         model = Post
-        fields = ['title', 'content', 'excerpt', 'category', 'tags', 'status', 'featured_image']
+        fields = ['title', 'content', 'excerpt', 'category', 'tags', 'status', 'publish_at', 'featured_image']
         widgets = {
             'title': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -28,6 +30,10 @@ class PostForm(forms.ModelForm):
             'status': forms.Select(attrs={
                 'class': 'form-control'
             }),
+            'publish_at': forms.DateTimeInput(attrs={
+                'class': 'form-control',
+                'type': 'datetime-local'
+            }, format='%Y-%m-%dT%H:%M'),
             'featured_image': forms.FileInput(attrs={
                 'class': 'form-control'
             }),
@@ -36,6 +42,7 @@ class PostForm(forms.ModelForm):
             'title': 'Enter a descriptive title for your post',
             'excerpt': 'This will be shown in post listings',
             'tags': 'Select one or more tags',
+            'publish_at': 'Required for scheduled posts',
         }
     
     def __init__(self, *args, **kwargs):
@@ -49,8 +56,22 @@ class PostForm(forms.ModelForm):
         if self.user and not (self.user.is_admin() or self.user.is_superuser):
             self.fields['status'].choices = [
                 ('draft', 'Draft'),
+                ('scheduled', 'Scheduled'),
                 ('published', 'Published'),
             ]
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        status = cleaned_data.get('status')
+        publish_at = cleaned_data.get('publish_at')
+        
+        if status == 'scheduled':
+            if not publish_at:
+                self.add_error('publish_at', 'Choose when the post should be published.')
+            elif publish_at <= timezone.now():
+                self.add_error('publish_at', 'The publication time must be in the future.')
+        
+        return cleaned_data
 
 
 class CommentForm(forms.ModelForm):
@@ -83,18 +104,19 @@ class PostSearchForm(forms.Form):
         }),
         label='Search'
     )
-    category = forms.ModelChoiceField(
-        queryset=Category.objects.all(),
+    # Choices come from the shared taxonomy snapshot instead of a query per form
+    category = forms.TypedChoiceField(
+        coerce=int,
         required=False,
-        empty_label='All Categories',
+        empty_value=None,
         widget=forms.Select(attrs={
             'class': 'form-control'
         })
     )
-    tag = forms.ModelChoiceField(
-        queryset=Tag.objects.all(),
+    tag = forms.TypedChoiceField(
+        coerce=int,
         required=False,
-        empty_label='All Tags',
+        empty_value=None,
         widget=forms.Select(attrs={
             'class': 'form-control'
         })
@@ -106,6 +128,12 @@ class PostSearchForm(forms.Form):
             'class': 'form-control'
         })
     )
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        snapshot = taxonomy.get_snapshot()
+        self.fields['category'].choices = [('', 'All Categories')] + snapshot.category_choices()
+        self.fields['tag'].choices = [('', 'All Tags')] + snapshot.tag_choices()
 
 
 class CommentModerationForm(forms.ModelForm):
@@ -0,0 +1,94 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from accounts import hashing
+from accounts.backends import PooledModelBackend
+
+USERNAME = 'bench-login-user'
+PASSWORD = 'bench-login-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure login throughput, latency and refusals under concurrent password checks, '
+        'with the bounded hashing pool and with unbounded in-thread hashing, and compare '
+        'the time taken to reject unknown and known usernames'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+        parser.add_argument('--logins', type=int, default=4, help='Logins per client')
+        parser.add_argument('--samples', type=int, default=20, help='Rejections timed per case')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(username=USERNAME)
+        user.set_password(PASSWORD)
+        user.save()
+        try:
+            self.stdout.write(
+                f'Hasher: {settings.PASSWORD_HASHERS[0].rsplit(".", 1)[-1]}, pool: '
+                f'{settings.LOGIN_HASH_WORKERS} worker(s) + {settings.LOGIN_HASH_QUEUE} queued\n'
+            )
+            self.rejections(options['samples'])
+            self.stdout.write('')
+            self.stdout.write(
+                f'{"backend":<10} {"clients":>7} {"logins/s":>9} {"ok":>6} {"503":>6} '
+                f'{"p50 ms":>8} {"p99 ms":>8}'
+            )
+            for concurrency in options['concurrency']:
+                for name, backend in (('pooled', PooledModelBackend()), ('unbounded', ModelBackend())):
+                    self.burst(name, backend, concurrency, options['logins'])
+        finally:
+            User.objects.filter(username=USERNAME).delete()
+
+    def rejections(self, samples):
+        backend = PooledModelBackend()
+        for label, username in (('known user, wrong password', USERNAME), ('unknown user', 'no-such-user-x')):
+            timings = []
+            for _ in range(samples):
+                started = time.perf_counter()
+                backend.authenticate(None, username=username, password='wrong')
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f'{label:<28} mean {statistics.mean(timings):7.1f} ms, stdev {statistics.pstdev(timings):5.1f} ms'
+            )
+
+    def burst(self, name, backend, concurrency, logins):
+        lock = threading.Lock()
+        latencies, refused = [], 0
+
+        def client():
+            nonlocal refused
+            try:
+                for _ in range(logins):
+                    started = time.perf_counter()
+                    try:
+                        backend.authenticate(None, username=USERNAME, password=PASSWORD)
+                    except hashing.LoginOverloaded:
+                        with lock:
+                            refused += 1
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for _ in range(concurrency):
+                pool.submit(client)
+        duration = time.perf_counter() - started
+        ordered = sorted(latencies) or [0]
+        self.stdout.write(
+            f'{name:<10} {concurrency:>7} {len(latencies) / duration:>9.1f} {len(latencies):>6} {refused:>6} '
+            f'{ordered[len(ordered) // 2] * 1000:>8.1f} {ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)] * 1000:>8.1f}'
+        )
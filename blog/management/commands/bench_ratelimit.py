@@ -0,0 +1,59 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from advanced_blog import ratelimit
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the per-request overhead of the rate limiter for each algorithm, '
+        'with counters in the configured cache and in-process'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='Checks per run')
+        parser.add_argument(
+            '--clients', type=int, default=1000,
+            help='Distinct client addresses the requests are spread over'
+        )
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        requests = []
+        for index in range(options['clients']):
+            request = factory.get('/search/?query=django', REMOTE_ADDR=f'10.{index // 65536}.{index // 256 % 256}.{index % 256}')
+            request.user = AnonymousUser()
+            requests.append(request)
+
+        cache_alias = getattr(settings, 'RATELIMIT_CACHE', 'default')
+        backend = settings.CACHES[cache_alias]['BACKEND'].rsplit('.', 1)[-1]
+        stores = [
+            (f'cache ({backend})', ratelimit.CacheStore(cache_alias)),
+            ('in-process', ratelimit.LocalStore()),
+        ]
+        self.stdout.write(
+            f'{options["requests"]} checks over {options["clients"]} clients\n'
+        )
+        self.stdout.write(f'{"algorithm":<16} {"store":<24} {"mean µs":>9} {"p99 µs":>9} {"limited":>8}')
+        for algorithm in ratelimit.ALGORITHMS:
+            for store_name, store in stores:
+                limiter = ratelimit.Limiter()
+                limiter.store = store
+                # A generous policy, so the run measures bookkeeping rather than refusals
+                limiter.policies = {'bench': ratelimit.Policy('bench', algorithm, '100000/m', key='ip')}
+                timings, limited = [], 0
+                for index in range(options['requests']):
+                    request = requests[index % len(requests)]
+                    started = time.perf_counter()
+                    limited += bool(limiter.check(request, ('bench',)))
+                    timings.append(time.perf_counter() - started)
+                timings.sort()
+                self.stdout.write(
+                    f'{algorithm:<16} {store_name:<24} {statistics.mean(timings) * 1e6:>9.1f} '
+                    f'{timings[int(len(timings) * 0.99)] * 1e6:>9.1f} {limited:>8}'
+                )
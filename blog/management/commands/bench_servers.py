@@ -0,0 +1,83 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILES = {
+    # Bare gunicorn: no preload, warmup or gc.freeze() in the master
+    'baseline': {'GUNICORN_ASGI': 'False', 'GUNICORN_PRELOAD': 'False'},
+    'wsgi': {'GUNICORN_ASGI': 'False'},
+    # The async views are opt-in; this profile measures them
+    'asgi': {'GUNICORN_ASGI': 'True', 'BLOG_ASYNC_VIEWS': 'True'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Start gunicorn with the baseline (no preload), WSGI (gthread) and ASGI (uvicorn) '
+        'profiles in turn and load test each at the given concurrency levels'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', choices=sorted(PROFILES), help='Profiles to run (default: all)')
+        parser.add_argument('--workers', type=int, default=2, help='Worker processes per server')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--path', action='append', dest='paths', help='Path to request (repeatable). Default: /')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per concurrency level')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 200])
+        parser.add_argument('--startup-timeout', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else '127.0.0.1'
+        for name in options['profile'] or list(PROFILES):
+            self.stdout.write(self.style.MIGRATE_HEADING(f'== {name} =='))
+            server = self.start(name, options)
+            try:
+                self.wait_until_ready(server, options)
+                call_command(
+                    'loadtest', f'http://127.0.0.1:{options["port"]}',
+                    *[arg for path in (options['paths'] or ['/']) for arg in ('--path', path)],
+                    '--requests', str(options['requests']),
+                    '--concurrency', *[str(level) for level in options['concurrency']],
+                    '--header', f'Host: {host}',
+                    stdout=self.stdout,
+                )
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=30)
+            self.stdout.write('')
+
+    def start(self, name, options):
+        env = {
+            **os.environ,
+            **PROFILES[name],
+            'PORT': str(options['port']),
+            'WEB_CONCURRENCY': str(options['workers']),
+        }
+        return subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+             '--bind', f'127.0.0.1:{options["port"]}', '--access-logfile', '/dev/null'],
+            cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    def wait_until_ready(self, server, options):
+        deadline = time.monotonic() + options['startup_timeout']
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn exited with status {server.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', options['port']), timeout=1).close()
+            except OSError:
+                time.sleep(0.2)
+                continue
+            # Give every worker time to finish booting
+            time.sleep(1)
+            return
+        raise CommandError('gunicorn did not start in time')
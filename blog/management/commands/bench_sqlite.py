@@ -0,0 +1,141 @@
+import copy
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, close_old_connections, connections, transaction
+from django.db.models import F
+
+from blog.models import Category, Comment, Post, Tag
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the SQLITE_PROFILES under concurrent page views, each reading a post '
+        'and its comments through the ORM and counting the view, with some posting a comment'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent threads (like gunicorn threads)')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run')
+        parser.add_argument('--posts', type=int, default=1000, help='Posts in the benchmark database')
+        parser.add_argument(
+            '--comment-every', type=int, default=10,
+            help='Every Nth page view also posts a comment, in a transaction that reads the post first'
+        )
+        parser.add_argument(
+            '--profile', action='append', dest='profiles',
+            help='Profile to run (repeatable; default: every profile in SQLITE_PROFILES)'
+        )
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'] or list(settings.SQLITE_PROFILES)
+        unknown = set(profiles) - set(settings.SQLITE_PROFILES)
+        if unknown:
+            raise CommandError(f'Unknown SQLite profile(s): {", ".join(sorted(unknown))}')
+        self.stdout.write(
+            f'{options["workers"]} workers, {options["seconds"]:.0f}s per run, '
+            f'a comment on every {options["comment_every"]} view(s)\n'
+        )
+        self.stdout.write(f'{"profile":<12} {"views/s":>10} {"comments/s":>11} {"locked":>8} {"locked %":>9}')
+        for name in profiles:
+            with tempfile.TemporaryDirectory() as directory:
+                alias = f'bench_{name}'
+                self.add_database(alias, os.path.join(directory, 'bench.sqlite3'), settings.SQLITE_PROFILES[name])
+                try:
+                    self.create_database(alias, options['posts'])
+                    views, comments, locked = self.run(alias, options)
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+            seconds = options['seconds']
+            attempts = views + locked
+            self.stdout.write(
+                f'{name:<12} {views / seconds:>10.0f} {comments / seconds:>11.0f} {locked:>8} '
+                f'{100 * locked / attempts if attempts else 0:>8.1f}%'
+            )
+
+    def add_database(self, alias, path, profile):
+        """Configure ``alias`` as ``DATABASES['default']`` would be with this profile"""
+        config = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, **copy.deepcopy(profile)}
+        # Fills in the defaults Django gives every configured database
+        connections.settings[alias] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS], alias: config,
+        })[alias]
+
+    def create_database(self, alias, posts):
+        with connections[alias].schema_editor() as editor:
+            for model in (get_user_model(), Category, Tag, Post, Comment):
+                editor.create_model(model)
+        # bulk_create, so the blog's signals don't write to the real database
+        author = get_user_model()(username='bench', email='bench@example.com')
+        author.set_unusable_password()
+        get_user_model().objects.using(alias).bulk_create([author])
+        author = get_user_model().objects.using(alias).get()
+        category = Category.objects.using(alias).bulk_create([Category(name='Bench', slug='bench')])[0]
+        Post.objects.using(alias).bulk_create(
+            (
+                Post(
+                    pk=pk, title=f'Post {pk}', slug=f'post-{pk}', content='<p>' + 'x' * 2000 + '</p>',
+                    author=author, category=category, status='published',
+                )
+                for pk in range(1, posts + 1)
+            ),
+            batch_size=500,
+        )
+        connections[alias].close()
+
+    def run(self, alias, options):
+        deadline = time.monotonic() + options['seconds']
+        lock = threading.Lock()
+        totals = {'views': 0, 'comments': 0, 'locked': 0}
+        author_id = get_user_model().objects.using(alias).values_list('pk', flat=True).get()
+        connections[alias].close()
+
+        def view(pk, comment):
+            post = Post.objects.using(alias).select_related('author', 'category').get(slug=f'post-{pk}')
+            list(Comment.objects.using(alias).filter(post=post, is_approved=True).order_by('created_at'))
+            # Post.increment_views
+            Post.objects.using(alias).filter(pk=post.pk).update(views_count=F('views_count') + 1)
+            if comment:
+                with transaction.atomic(using=alias):
+                    post = Post.objects.using(alias).get(pk=post.pk)
+                    Comment.objects.using(alias).bulk_create([
+                        Comment(post=post, author_id=author_id, content='Benchmark comment')
+                    ])
+
+        def worker(seed):
+            views = comments = locked = 0
+            pk = seed
+            while time.monotonic() < deadline:
+                pk = pk * 7919 % options['posts'] + 1
+                comment = (views + locked) % options['comment_every'] == 0
+                # What Django does around each request: connections past
+                # CONN_MAX_AGE (0 by default) are closed and reopened
+                close_old_connections()
+                try:
+                    view(pk, comment)
+                    views += 1
+                    comments += comment
+                except OperationalError as e:
+                    if 'locked' not in str(e) and 'busy' not in str(e):
+                        raise
+                    locked += 1
+                finally:
+                    close_old_connections()
+            connections[alias].close()
+            with lock:
+                totals['views'] += views
+                totals['comments'] += comments
+                totals['locked'] += locked
+
+        threads = [threading.Thread(target=worker, args=(seed + 1,)) for seed in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return totals['views'], totals['comments'], totals['locked']
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from blog import sitemaps
+
+
+class Command(BaseCommand):
+    help = 'Regenerate every sitemap shard and the sitemap index in SITEMAP_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending', action='store_true',
+            help='Only regenerate the shards changed since the last run (for cron)'
+        )
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            names = sitemaps.refresh()
+            if names is None:
+                self.stdout.write('Another process is updating the sitemap')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Regenerated {len(names)} shard(s)'))
+            return
+
+        def progress(section, shard, count):
+            self.stdout.write(f'{section}-{shard}: {count} URL(s)')
+
+        with sitemaps.lock() as locked:
+            if not locked:
+                self.stdout.write('Another process is updating the sitemap')
+                return
+            total = sitemaps.build(progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total} URL(s) to {sitemaps.root()}'))
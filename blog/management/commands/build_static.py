@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import static_pages
+
+
+class Command(BaseCommand):
+    help = (
+        'Pre-render public post, listing and taxonomy pages to STATIC_PAGES_ROOT; '
+        'with --pending, only re-render the pages affected by queued changes (for cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-pages', action='store_true', help='Print every page as it is rendered')
+        parser.add_argument(
+            '--pending', action='store_true',
+            help='Re-render the pages affected by queued post, comment, category and tag changes'
+        )
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            started = time.perf_counter()
+            processed = static_pages.process_pending()
+            self.stdout.write(self.style.SUCCESS(
+                f'Processed {processed} queued change(s) in {time.perf_counter() - started:.2f}s'
+            ))
+            return
+        progress = self.stdout.write if options['verbose_pages'] else None
+        count = static_pages.build_site(progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {count} page(s) into {static_pages.root()}'
+        ))
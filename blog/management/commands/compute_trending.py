@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import popularity
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute trending scores and day/week/month view totals from the hourly view buckets, '
+        'and prune buckets older than POPULARITY_RETENTION_DAYS'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = popularity.compute()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ranked {total} post(s) in {time.perf_counter() - started:.2f}s'
+        ))
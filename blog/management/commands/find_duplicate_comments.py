@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import bulk, duplicates
+from blog.models import Comment
+
+
+class Command(BaseCommand):
+    help = (
+        'Fingerprint comments saved without one, then list clusters of repeated comments '
+        '(same author and post, within the duplicate window); --delete keeps the oldest of each'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, help='Seconds between repeats (default DUPLICATE_COMMENT_WINDOW)')
+        parser.add_argument('--distance', type=int, help='Max differing SimHash bits (default DUPLICATE_COMMENT_DISTANCE)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--delete', action='store_true', help='Delete all but the oldest comment of each cluster')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        filled = duplicates.fill_fingerprints(
+            options['chunk_size'],
+            progress=lambda done: self.stdout.write(f'Fingerprinted {done} comment(s)'),
+        )
+
+        found = repeats = 0
+        extra_ids = []
+        for cluster in duplicates.clusters(options['window'], options['distance'], options['chunk_size']):
+            found += 1
+            repeats += len(cluster) - 1
+            extra_ids.extend(comment.pk for comment in cluster[1:])
+            self.stdout.write(
+                f'Post #{cluster[0].post_id}, user #{cluster[0].author_id}: keeps #{cluster[0].pk}, '
+                f'repeats {", ".join(f"#{comment.pk}" for comment in cluster[1:])}'
+            )
+
+        deleted = 0
+        if options['delete'] and extra_ids:
+            deleted = bulk.delete_comments(Comment.objects.filter(pk__in=extra_ids), options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Fingerprinted {filled} comment(s); found {found} cluster(s) with {repeats} repeat(s)'
+            f'{f", deleted {deleted} comment(s)" if options["delete"] else ""} '
+            f'in {time.perf_counter() - started:.2f}s'
+        ))
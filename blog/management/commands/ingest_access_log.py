@@ -0,0 +1,108 @@
+import json
+import os
+import re
+import sys
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import Resolver404, resolve
+
+from blog import popularity
+from blog.models import Post
+
+# Common/combined log format, as written by gunicorn and nginx:
+# 1.2.3.4 - - [19/Oct/2026:07:31:02 +0000] "GET /posts/hello/ HTTP/1.1" 200 5120 "-" "Mozilla/5.0"
+LINE_RE = re.compile(
+    r'\[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<path>\S+)[^"]*" (?P<status>\d{3}) '
+)
+COUNTED_STATUSES = {'200', '304'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Count post page views from a web server access log (common/combined format) into the '
+        'hourly view buckets. Counts every GET answered with 200 or 304, including pages served '
+        'from pre-rendered files or revalidated by a CDN.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('logfile', help="Access log to read, or '-' for standard input")
+        parser.add_argument(
+            '--state-file',
+            help='Remember how far the log was read, so that the next run (e.g. from cron) '
+                 'only reads new lines. Restarts from the top when the log was rotated.'
+        )
+        parser.add_argument('--batch', type=int, default=50000, help='Lines per database write')
+
+    def handle(self, *args, **options):
+        state_file = Path(options['state_file']) if options['state_file'] else None
+        if options['logfile'] == '-':
+            if state_file:
+                raise CommandError('--state-file needs a log file, not standard input')
+            self.ingest(sys.stdin.buffer, options['batch'])
+            return
+
+        try:
+            handle = open(options['logfile'], 'rb')
+        except OSError as e:
+            raise CommandError(f'Cannot read {options["logfile"]}: {e}')
+        with handle:
+            stat = os.fstat(handle.fileno())
+            if state_file and state_file.exists():
+                state = json.loads(state_file.read_text())
+                if state.get('inode') == stat.st_ino and state.get('offset', 0) <= stat.st_size:
+                    handle.seek(state['offset'])
+            self.ingest(handle, options['batch'])
+            if state_file:
+                state_file.write_text(json.dumps({'inode': stat.st_ino, 'offset': handle.tell()}))
+
+    def ingest(self, handle, batch):
+        counts, slugs = Counter(), {}
+        lines = views = 0
+        # Read by lines rather than iterating, so that tell() stays usable
+        while line := handle.readline():
+            if not line.endswith(b'\n') and handle.seekable():
+                # A line still being written; pick it up next time
+                handle.seek(-len(line), os.SEEK_CUR)
+                break
+            lines += 1
+            match = LINE_RE.search(line.decode('utf-8', 'replace'))
+            if not match or match['method'] != 'GET' or match['status'] not in COUNTED_STATUSES:
+                continue
+            slug = self.post_slug(match['path'], slugs)
+            if slug is None:
+                continue
+            try:
+                moment = datetime.strptime(match['time'], '%d/%b/%Y:%H:%M:%S %z')
+            except ValueError:
+                continue
+            counts[slug, popularity.hour_of(moment)] += 1
+            views += 1
+            if lines % batch == 0:
+                self.write(counts)
+                counts = Counter()
+        self.write(counts)
+        self.stdout.write(self.style.SUCCESS(f'Read {lines} line(s), counted {views} post view(s)'))
+
+    def post_slug(self, path, slugs):
+        """The post slug a request path shows, or None; results are memoised in ``slugs``"""
+        path = path.split('?', 1)[0]
+        if path not in slugs:
+            try:
+                match = resolve(path)
+            except Resolver404:
+                match = None
+            slugs[path] = match.kwargs['slug'] if match and match.view_name == 'blog:post_detail' else None
+        return slugs[path]
+
+    def write(self, counts):
+        if not counts:
+            return
+        ids = dict(Post.objects.filter(slug__in={slug for slug, _ in counts}).values_list('slug', 'pk'))
+        by_post = Counter()
+        for (slug, hour), views in counts.items():
+            if slug in ids:
+                by_post[ids[slug], hour] += views
+        popularity.add_views(by_post)
@@ -0,0 +1,143 @@
+import http.client
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class ConnectionWatcher:
+    """Sample the number of server connections to the database in the background"""
+
+    QUERY = 'SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()'
+
+    def __init__(self, interval=0.5):
+        if connection.vendor != 'postgresql':
+            raise CommandError('--watch-connections requires a PostgreSQL DATABASE_URL')
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        from django.db import connection as thread_connection
+        try:
+            while not self._stop.is_set():
+                with thread_connection.cursor() as cursor:
+                    cursor.execute(self.QUERY)
+                    self.samples.append(cursor.fetchone()[0])
+                self._stop.wait(self.interval)
+        finally:
+            thread_connection.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+class Command(BaseCommand):
+    help = 'Load test a running server and report throughput and latency percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help='Server to test, e.g. http://127.0.0.1:8000')
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Path to request (repeatable, requests are spread round-robin). Default: /'
+        )
+        parser.add_argument('--requests', type=int, default=1000, help='Total number of requests per run')
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[10],
+            help='Number of concurrent clients; several values run one test per level, e.g. 10 20 40'
+        )
+        parser.add_argument('--header', action='append', default=[], help='Extra header, e.g. "Cookie: a=b"')
+        parser.add_argument(
+            '--watch-connections', action='store_true',
+            help="Sample the database's connection count during each run (PostgreSQL only)"
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['base_url'])
+        if url.scheme not in ('http', 'https'):
+            raise CommandError('base_url must start with http:// or https://')
+        paths = options['paths'] or ['/']
+        headers = dict(h.split(':', 1) for h in options['header'])
+        headers = {k.strip(): v.strip() for k, v in headers.items()}
+
+        levels = options['concurrency']
+        for index, concurrency in enumerate(levels):
+            if len(levels) > 1:
+                if index:
+                    self.stdout.write('')
+                self.stdout.write(f'Concurrency:  {concurrency}')
+            if options['watch_connections']:
+                with ConnectionWatcher() as watcher:
+                    self.run(url, paths, headers, options['requests'], concurrency)
+                if watcher.samples:
+                    self.stdout.write(
+                        f'DB connections: min {min(watcher.samples)}, max {max(watcher.samples)}, '
+                        f'last {watcher.samples[-1]} (includes this command\'s own)'
+                    )
+            else:
+                self.run(url, paths, headers, options['requests'], concurrency)
+
+    def run(self, url, paths, headers, total, concurrency):
+        concurrency = max(concurrency, 1)
+        counter = iter(range(total))
+        lock = threading.Lock()
+        latencies, statuses, errors = [], {}, []
+
+        def client():
+            # One keep-alive connection per simulated client
+            conn_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+            conn = conn_class(url.hostname, url.port, timeout=30)
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    break
+                path = paths[index % len(paths)]
+                started = time.perf_counter()
+                try:
+                    conn.request('GET', path, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    status = response.status
+                except (OSError, http.client.HTTPException) as e:
+                    conn.close()
+                    with lock:
+                        errors.append(str(e))
+                    continue
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] = statuses.get(status, 0) + 1
+            conn.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for _ in range(concurrency):
+                pool.submit(client)
+        duration = time.perf_counter() - started
+
+        if not latencies:
+            raise CommandError(f'No successful requests ({len(errors)} errors)')
+
+        ordered = sorted(latencies)
+
+        def percentile(p):
+            return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)] * 1000
+
+        self.stdout.write(f'Requests:     {len(latencies)} ok, {len(errors)} failed in {duration:.2f}s')
+        self.stdout.write(f'Throughput:   {len(latencies) / duration:.1f} req/s')
+        self.stdout.write(
+            f'Latency (ms): mean {statistics.mean(ordered) * 1000:.1f}, p50 {percentile(50):.1f}, '
+            f'p95 {percentile(95):.1f}, p99 {percentile(99):.1f}, max {ordered[-1] * 1000:.1f}'
+        )
+        self.stdout.write('Status codes: ' + ', '.join(f'{code}: {count}' for code, count in sorted(statuses.items())))
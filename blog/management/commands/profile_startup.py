@@ -0,0 +1,132 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Executed in a fresh interpreter so every measurement is a true cold start
+BOOT_SCRIPT = """
+import json, os, sys, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'advanced_blog.settings')
+from advanced_blog.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+boot_ms = (time.perf_counter() - start) * 1000
+try:
+    # On Linux ru_maxrss keeps the parent's peak across exec; VmHWM doesn't
+    with open('/proc/self/status') as status:
+        rss_kb = next(int(line.split()[1]) for line in status if line.startswith('VmHWM:'))
+except (OSError, StopIteration):
+    try:
+        import resource
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            rss_kb //= 1024
+    except ImportError:
+        rss_kb = 0
+print(json.dumps({'boot_ms': boot_ms, 'rss_mb': rss_kb / 1024}))
+"""
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = 'Profile worker cold start: import time per app, boot time and peak memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Number of cold starts to measure')
+        parser.add_argument('--top', type=int, default=15, help='Number of apps/modules to list')
+        parser.add_argument('--modules', action='store_true', help='List individual modules instead of apps')
+        parser.add_argument('--check', action='store_true', help='Fail if the startup budget is exceeded')
+        parser.add_argument('--max-boot-ms', type=float, default=None, help='Override STARTUP_BUDGET_MS')
+        parser.add_argument('--max-rss-mb', type=float, default=None, help='Override STARTUP_BUDGET_RSS_MB')
+
+    def handle(self, *args, **options):
+        runs = max(options['runs'], 1)
+        boot_times, rss_values, wall_times = [], [], []
+        self_times = defaultdict(list)
+
+        for _ in range(runs):
+            result, imports, wall_ms = self._cold_start()
+            boot_times.append(result['boot_ms'])
+            rss_values.append(result['rss_mb'])
+            wall_times.append(wall_ms)
+            totals = defaultdict(int)
+            for module, self_us in imports:
+                key = module if options['modules'] else self._group(module)
+                totals[key] += self_us
+            for key, self_us in totals.items():
+                self_times[key].append(self_us)
+
+        ranked = sorted(
+            ((key, statistics.median(values)) for key, values in self_times.items()),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        label = 'Module' if options['modules'] else 'App'
+        self.stdout.write(f'{label:<45} {"self ms":>10}')
+        for key, self_us in ranked[:options['top']]:
+            self.stdout.write(f'{key:<45} {self_us / 1000:>10.1f}')
+
+        boot_ms = statistics.median(boot_times)
+        rss_mb = max(rss_values)
+        self.stdout.write('')
+        self.stdout.write(f'Interpreter + boot (median of {runs}): {statistics.median(wall_times):.0f} ms')
+        self.stdout.write(f'Django boot (median of {runs}): {boot_ms:.0f} ms')
+        self.stdout.write(f'Peak RSS: {rss_mb:.1f} MB')
+
+        if options['check']:
+            max_boot_ms = options['max_boot_ms'] or settings.STARTUP_BUDGET_MS
+            max_rss_mb = options['max_rss_mb'] or settings.STARTUP_BUDGET_RSS_MB
+            failures = []
+            if boot_ms > max_boot_ms:
+                failures.append(f'boot time {boot_ms:.0f} ms exceeds budget of {max_boot_ms:.0f} ms')
+            if rss_mb > max_rss_mb:
+                failures.append(f'peak RSS {rss_mb:.1f} MB exceeds budget of {max_rss_mb:.0f} MB')
+            if failures:
+                raise CommandError('Startup budget exceeded: ' + '; '.join(failures))
+            self.stdout.write(self.style.SUCCESS('Startup is within budget.'))
+
+    def _cold_start(self):
+        """Boot the project in a child interpreter with -X importtime enabled"""
+        env = os.environ.copy()
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'advanced_blog.settings')
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        wall_ms = (time.perf_counter() - started) * 1000
+        if proc.returncode != 0:
+            raise CommandError(f'Cold start failed:\n{proc.stderr[-2000:]}')
+
+        imports = []
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                imports.append((match.group(4), int(match.group(1))))
+        return json.loads(proc.stdout.strip().splitlines()[-1]), imports, wall_ms
+
+    def _group(self, module):
+        """Attribute a module to its installed app, falling back to its top-level package"""
+        best = None
+        for app in settings.INSTALLED_APPS:
+            if module == app or module.startswith(app + '.'):
+                if best is None or len(app) > len(best):
+                    best = app
+        if best:
+            return best
+        if module.startswith('advanced_blog'):
+            return 'advanced_blog'
+        return module.split('.')[0]
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import related
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the related-posts index and recompute the related posts of every published post; '
+        'with --pending, only apply the queued post changes (for cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending', action='store_true',
+            help='Recompute the lists affected by queued post changes (builds the index if it was never built)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['pending']:
+            processed = related.process_pending()
+            self.stdout.write(self.style.SUCCESS(
+                f'Processed {processed} changed post(s) in {time.perf_counter() - started:.2f}s'
+            ))
+            return
+
+        def progress(done, total):
+            self.stdout.write(f'{done}/{total} post(s)')
+
+        total = related.rebuild(progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed related posts for {total} post(s) in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import authors
+
+
+class Command(BaseCommand):
+    help = 'Recompute the post, view and comment totals shown on author pages'
+
+    def handle(self, *args, **kwargs):
+        started = time.perf_counter()
+        rows = authors.refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed stats for {rows} author(s) in {time.perf_counter() - started:.2f}s'
+        ))
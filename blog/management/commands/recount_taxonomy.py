@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from blog import taxonomy
+
+
+class Command(BaseCommand):
+    help = 'Recompute the published post counts stored on categories and tags'
+
+    def handle(self, *args, **kwargs):
+        taxonomy.recount()
+        taxonomy.invalidate()
+        self.stdout.write(self.style.SUCCESS('Category and tag post counts recomputed.'))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import analytics
+
+
+class Command(BaseCommand):
+    help = (
+        'Aggregate raw analytics events into per-post daily stats, then delete raw events '
+        'older than ANALYTICS_RAW_RETENTION_DAYS'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows, pruned = analytics.rollup()
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {rows} daily stat row(s), pruned {pruned} raw event(s) '
+            f'in {time.perf_counter() - started:.2f}s'
+        ))
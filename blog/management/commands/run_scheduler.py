@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from blog import scheduler
+
+
+class Command(BaseCommand):
+    help = (
+        'Publish scheduled posts when they are due. Runs until stopped, sleeping until the '
+        'next post is due; with --once, publishes the posts due now and exits (for cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Publish due posts once and exit')
+        parser.add_argument(
+            '--max-sleep', type=float, default=None,
+            help='Longest sleep in seconds between runs (default: SCHEDULER_MAX_SLEEP)'
+        )
+
+    def handle(self, *args, **options):
+        max_sleep = options['max_sleep'] or getattr(settings, 'SCHEDULER_MAX_SLEEP', 60)
+        try:
+            while True:
+                # Long-running: don't hold on to a connection the server has dropped
+                close_old_connections()
+                started = time.perf_counter()
+                published = scheduler.publish_due()
+                if published or options['once']:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Published {published} scheduled post(s) in {time.perf_counter() - started:.2f}s'
+                    ))
+                if options['once']:
+                    return
+                time.sleep(scheduler.sleep_seconds(max_sleep=max_sleep))
+        except KeyboardInterrupt:
+            self.stdout.write('Scheduler stopped')
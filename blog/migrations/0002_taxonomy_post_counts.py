@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_published_posts(apps, schema_editor):
+    Category = apps.get_model('blog', 'Category')
+    Tag = apps.get_model('blog', 'Tag')
+    Post = apps.get_model('blog', 'Post')
+    PostTags = Post.tags.through
+    
+    category_counts = Post.objects.filter(
+        category=OuterRef('pk'), status='published'
+    ).values('category').annotate(total=Count('pk')).values('total')
+    Category.objects.update(post_count=Coalesce(Subquery(category_counts), 0))
+    
+    tag_counts = PostTags.objects.filter(
+        tag=OuterRef('pk'), post__status='published'
+    ).values('tag').annotate(total=Count('pk')).values('total')
+    Tag.objects.update(post_count=Coalesce(Subquery(tag_counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of published posts (maintained automatically)'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of published posts (maintained automatically)'),
+        ),
+        migrations.RunPython(count_published_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_taxonomy_post_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(help_text='Position in the list, 0 is most similar')),
+                ('score', models.FloatField(help_text='Combined text and taxonomy similarity')),
+                ('post', models.ForeignKey(help_text='Post the list belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='blog.post')),
+                ('related', models.ForeignKey(help_text='Similar post', on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='blog.post')),
+            ],
+            options={
+                'verbose_name': 'Related Post',
+                'verbose_name_plural': 'Related Posts',
+                'ordering': ['post', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('post', 'rank'), name='blog_relatedpost_post_rank')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_related_posts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostPopularity',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='blog.post')),
+                ('trending_score', models.FloatField(default=0, help_text='Views with exponential time decay')),
+                ('views_day', models.PositiveIntegerField(default=0, help_text='Views in the last 24 hours')),
+                ('views_week', models.PositiveIntegerField(default=0, help_text='Views in the last 7 days')),
+                ('views_month', models.PositiveIntegerField(default=0, help_text='Views in the last 30 days')),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Post Popularity',
+                'verbose_name_plural': 'Post Popularity',
+                'indexes': [models.Index(fields=['-trending_score'], name='blog_postpo_trendin_2ca221_idx'), models.Index(fields=['-views_day'], name='blog_postpo_views_d_9829f3_idx'), models.Index(fields=['-views_week'], name='blog_postpo_views_w_8359c4_idx'), models.Index(fields=['-views_month'], name='blog_postpo_views_m_c0d07e_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PostViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Start of the hour, UTC')),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('post', models.ForeignKey(help_text='Viewed post', on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='blog.post')),
+            ],
+            options={
+                'verbose_name': 'Post View Bucket',
+                'verbose_name_plural': 'Post View Buckets',
+                'indexes': [models.Index(fields=['hour'], name='blog_postvi_hour_2cb678_idx')],
+                'constraints': [models.UniqueConstraint(fields=('post', 'hour'), name='blog_postviewbucket_post_hour')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_post_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('view', 'View'), ('comment', 'Comment')], max_length=10)),
+                ('occurred_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analytics_events', to='blog.post')),
+            ],
+            options={
+                'verbose_name': 'Analytics Event',
+                'verbose_name_plural': 'Analytics Events',
+                'indexes': [models.Index(fields=['occurred_at'], name='blog_analyt_occurre_a30674_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PostDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('comments', models.PositiveIntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='blog.post')),
+            ],
+            options={
+                'verbose_name': 'Post Daily Stats',
+                'verbose_name_plural': 'Post Daily Stats',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('post', 'date'), name='blog_postdailystats_post_date')],
+            },
+        ),
+    ]
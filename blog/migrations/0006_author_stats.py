@@ -0,0 +1,68 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+
+def compute_author_stats(apps, schema_editor):
+    AuthorStats = apps.get_model('blog', 'AuthorStats')
+    Post = apps.get_model('blog', 'Post')
+    Comment = apps.get_model('blog', 'Comment')
+    
+    comments = dict(
+        Comment.objects.filter(post__status='published', is_approved=True).values('post__author_id').annotate(
+            total=Count('pk')
+        ).values_list('post__author_id', 'total').order_by()
+    )
+    posts = Post.objects.values('author_id').annotate(
+        post_count=Count('pk'),
+        published_count=Count('pk', filter=Q(status='published')),
+        total_views=Sum('views_count'),
+    ).order_by()
+    now = timezone.now()
+    AuthorStats.objects.bulk_create([
+        AuthorStats(
+            author_id=row['author_id'],
+            post_count=row['post_count'],
+            published_count=row['published_count'],
+            total_views=row['total_views'] or 0,
+            total_comments=comments.get(row['author_id'], 0),
+            updated_at=now,
+        )
+        for row in posts
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('blog', '0005_analytics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='author_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('post_count', models.PositiveIntegerField(default=0, help_text='Posts in any status')),
+                ('published_count', models.PositiveIntegerField(default=0, help_text='Published posts')),
+                ('total_views', models.PositiveBigIntegerField(default=0, help_text='Views of all their posts')),
+                ('total_comments', models.PositiveIntegerField(default=0, help_text='Approved comments on their published posts')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Author Stats',
+                'verbose_name_plural': 'Author Stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'status', '-published_at'], name='blog_post_author__de8050_idx'),
+        ),
+        migrations.RunPython(compute_author_stats, migrations.RunPython.noop),
+    ]
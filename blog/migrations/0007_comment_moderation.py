@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def hash_comments(apps, schema_editor):
+    from blog.moderation import content_hash
+    
+    Comment = apps.get_model('blog', 'Comment')
+    batch = []
+    for comment in Comment.objects.only('pk', 'content').iterator(chunk_size=1000):
+        comment.content_hash = content_hash(comment.content)
+        batch.append(comment)
+        if len(batch) == 1000:
+            Comment.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    Comment.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_author_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='Hash of the normalized text, to spot repeated comments', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='spam_reasons',
+            field=models.CharField(blank=True, help_text='What the spam score is made of', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='spam_score',
+            field=models.FloatField(default=0, help_text='Spam likelihood computed when the comment was posted (see blog.moderation)'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['is_approved', '-spam_score'], name='blog_commen_is_appr_15a1dd_idx'),
+        ),
+        migrations.RunPython(hash_comments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_comment_moderation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='simhash',
+            field=models.BigIntegerField(blank=True, help_text='SimHash of the normalized text, to spot near-repeats (see blog.duplicates)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['author', 'post', '-created_at'], name='blog_commen_author__8fd7a2_idx'),
+        ),
+    ]
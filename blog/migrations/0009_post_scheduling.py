@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_comment_simhash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='publish_at',
+            field=models.DateTimeField(blank=True, help_text='When a scheduled post goes live', null=True),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('scheduled', 'Scheduled'), ('published', 'Published'), ('archived', 'Archived')], default='draft', help_text='Post publication status', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('status', 'scheduled')), fields=['publish_at'], name='blog_post_scheduled_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:22
+
+import hashlib
+import zlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def snapshot_posts(apps, schema_editor):
+    # Inlined from blog.revisions (compress and digest) so the migration keeps
+    # working whatever later happens to that module
+    Post = apps.get_model('blog', 'Post')
+    PostRevision = apps.get_model('blog', 'PostRevision')
+    batch = []
+    for post in Post.objects.only('pk', 'author_id', 'title', 'content').iterator(chunk_size=500):
+        content = post.content or ''
+        batch.append(PostRevision(
+            post_id=post.pk,
+            number=1,
+            editor_id=post.author_id,
+            title=post.title,
+            is_snapshot=True,
+            data=zlib.compress(content.encode(), 9),
+            content_hash=hashlib.blake2b(content.encode(), digest_size=16).hexdigest(),
+            content_length=len(content),
+        ))
+        if len(batch) == 500:
+            PostRevision.objects.bulk_create(batch)
+            batch = []
+    PostRevision.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_post_scheduling'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(help_text='1 for the first version of the post')),
+                ('title', models.CharField(max_length=200)),
+                ('is_snapshot', models.BooleanField(default=False, help_text='Full content rather than a delta')),
+                ('data', models.BinaryField(help_text='Compressed content or delta')),
+                ('content_hash', models.CharField(help_text='Hash of the full content', max_length=32)),
+                ('content_length', models.PositiveIntegerField(default=0, help_text='Length of the full content')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('editor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='post_revisions', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='blog.post')),
+            ],
+            options={
+                'verbose_name': 'Post Revision',
+                'verbose_name_plural': 'Post Revisions',
+                'ordering': ['-number'],
+                'constraints': [models.UniqueConstraint(fields=('post', 'number'), name='blog_postrevision_post_number')],
+            },
+        ),
+        migrations.RunPython(snapshot_posts, migrations.RunPython.noop),
+    ]
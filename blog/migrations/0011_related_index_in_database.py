@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_post_revisions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vocabulary', models.TextField(blank=True, help_text='Terms, one per line')),
+                ('idf', models.BinaryField(default=b'', help_text='float32 inverse document frequency per term')),
+                ('built_at', models.DateTimeField(blank=True, help_text='Last full rebuild; empty before the first', null=True)),
+            ],
+            options={
+                'verbose_name': 'Related Posts Index',
+                'verbose_name_plural': 'Related Posts Index',
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_id', models.BigIntegerField()),
+                ('queued_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Related Posts Update',
+                'verbose_name_plural': 'Related Posts Updates',
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedVector',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='related_vector', serialize=False, to='blog.post')),
+                ('terms', models.BinaryField(help_text='int32 vocabulary columns of the heaviest terms')),
+                ('weights', models.BinaryField(help_text='float32 weights of those terms')),
+            ],
+            options={
+                'verbose_name': 'Related Posts Vector',
+                'verbose_name_plural': 'Related Posts Vectors',
+            },
+        ),
+    ]
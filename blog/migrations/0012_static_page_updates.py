@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_related_index_in_database'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaticPageUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('post', 'Post'), ('comments', 'Post comments'), ('related', 'Related posts'), ('category', 'Category'), ('tag', 'Tag')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('queued_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Static Page Update',
+                'verbose_name_plural': 'Static Page Updates',
+            },
+        ),
+    ]
@@ -1,16 +1,37 @@
 from django.db import models
+from django.db.models import F
 from django.conf import settings
 from django.utils.text import slugify
 from django.urls import reverse
 from ckeditor.fields import RichTextField
 
 
+def _save_kwargs_without_counters(instance, kwargs):
+    """
+    Exclude maintained counters from plain saves of existing rows.
+    
+    Counters such as ``post_count`` are updated with atomic UPDATE statements
+    by signal handlers; saving a stale in-memory copy must not overwrite them.
+    """
+    if not instance._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+        kwargs['update_fields'] = [
+            field.name for field in instance._meta.concrete_fields
+            if not field.primary_key and field.name != 'post_count'
+        ]
+    return kwargs
+
+
 class Category(models.Model):
     """Category model for organizing blog posts"""
     
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True, blank=True)
     description = models.TextField(blank=True, null=True)
+    post_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text='Number of published posts (maintained automatically)'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -25,7 +46,7 @@ class Category(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        super().save(*args, **_save_kwargs_without_counters(self, kwargs))
     
     def get_absolute_url(self):
         return reverse('blog:category_detail', kwargs={'slug': self.slug})
@@ -36,6 +57,11 @@ class Tag(models.Model):
     
     name = models.CharField(max_length=50, unique=True)
     slug = models.SlugField(max_length=50, unique=True, blank=True)
+    post_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text='Number of published posts (maintained automatically)'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -49,7 +75,7 @@ class Tag(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        super().save(*args, **_save_kwargs_without_counters(self, kwargs))
     
     def get_absolute_url(self):
         return reverse('blog:tag_detail', kwargs={'slug': self.slug})
@@ -60,6 +86,7 @@ class Post(models.Model):
     
     STATUS_CHOICES = [
         ('draft', 'Draft'),
+        ('scheduled', 'Scheduled'),
         ('published', 'Published'),
         ('archived', 'Archived'),
     ]
@@ -109,6 +136,11 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     published_at = models.DateTimeField(blank=True, null=True)
+    publish_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text='When a scheduled post goes live'
+    )
     
     class Meta:
         verbose_name = 'Post'
@@ -118,6 +150,14 @@ class Post(models.Model):
             models.Index(fields=['-created_at']),
             models.Index(fields=['status']),
             models.Index(fields=['slug']),
+            # Author pages page through an author's published posts by date
+            models.Index(fields=['author', 'status', '-published_at']),
+            # The scheduler only ever looks for the next due scheduled post
+            models.Index(
+                fields=['publish_at'],
+                condition=models.Q(status='scheduled'),
+                name='blog_post_scheduled_idx',
+            ),
         ]
     
     def __str__(self):
@@ -147,8 +187,28 @@ class Post(models.Model):
         return self.status == 'published'
     
     def increment_views(self):
+        # Atomic in the database, so concurrent visits are never lost
+        Post.objects.filter(pk=self.pk).update(views_count=F('views_count') + 1)
+        self.views_count += 1
+        from . import analytics, authors, popularity
+        popularity.record_view(self.pk)
+        analytics.record_view(self.pk)
+        authors.record_view(self.author_id)
+
+    async def aincrement_views(self):
+        await Post.objects.filter(pk=self.pk).aupdate(views_count=F('views_count') + 1)
         self.views_count += 1
-        self.save(update_fields=['views_count'])
+        from . import analytics, authors, popularity
+        await popularity.arecord_view(self.pk)
+        await analytics.arecord_view(self.pk)
+        await authors.arecord_view(self.author_id)
+
+    def related_posts(self):
+        """Precomputed similar posts (see blog.related), most similar first"""
+        return Post.objects.filter(
+            similar_to__post=self,
+            status='published'
+        ).only('title', 'slug', 'published_at').order_by('similar_to__rank')
 
 
 class Comment(models.Model):
@@ -179,6 +239,22 @@ class Comment(models.Model):
         default=True,
         help_text='Whether the comment is approved for display'
     )
+    spam_score = models.FloatField(
+        default=0,
+        help_text='Spam likelihood computed when the comment was posted (see blog.moderation)'
+    )
+    spam_reasons = models.CharField(max_length=200, blank=True, help_text='What the spam score is made of')
+    content_hash = models.CharField(
+        max_length=32,
+        blank=True,
+        db_index=True,
+        help_text='Hash of the normalized text, to spot repeated comments'
+    )
+    simhash = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text='SimHash of the normalized text, to spot near-repeats (see blog.duplicates)'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -189,10 +265,307 @@ class Comment(models.Model):
         indexes = [
             models.Index(fields=['-created_at']),
             models.Index(fields=['post', 'is_approved']),
+            # The moderation queue lists unapproved comments, most suspicious first
+            models.Index(fields=['is_approved', '-spam_score']),
+            # An author's recent comments on a post, checked for duplicates
+            models.Index(fields=['author', 'post', '-created_at']),
         ]
     
     def __str__(self):
-        return f"Comment by {self.author.username} on {self.post.title}"
+        # Only use related objects that are already loaded; never query for them
+        cache = self._state.fields_cache
+        author = cache['author'].username if 'author' in cache else f'user #{self.author_id}'
+        post = cache['post'].title if 'post' in cache else f'post #{self.post_id}'
+        return f"Comment by {author} on {post}"
+    
+    def save(self, *args, **kwargs):
+        # Kept current however the comment is saved, for duplicate detection
+        from .duplicates import fingerprint
+        fingerprint(self)
+        super().save(*args, **kwargs)
     
     def is_reply(self):
         return self.parent is not None
+
+
+class RelatedPost(models.Model):
+    """One entry of a post's precomputed related-posts list"""
+    
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='related_entries',
+        help_text='Post the list belongs to'
+    )
+    related = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        help_text='Similar post'
+    )
+    rank = models.PositiveSmallIntegerField(help_text='Position in the list, 0 is most similar')
+    score = models.FloatField(help_text='Combined text and taxonomy similarity')
+    
+    class Meta:
+        verbose_name = 'Related Post'
+        verbose_name_plural = 'Related Posts'
+        ordering = ['post', 'rank']
+        constraints = [
+            # Also the index post pages read their list through
+            models.UniqueConstraint(fields=['post', 'rank'], name='blog_relatedpost_post_rank'),
+        ]
+    
+    def __str__(self):
+        return f"Post #{self.post_id} -> post #{self.related_id} ({self.score:.3f})"
+
+
+class RelatedIndex(models.Model):
+    """
+    The vocabulary of the related-posts index (see blog.related). A single
+    row, which writers lock to take turns
+    """
+
+    vocabulary = models.TextField(blank=True, help_text='Terms, one per line')
+    idf = models.BinaryField(default=b'', help_text='float32 inverse document frequency per term')
+    built_at = models.DateTimeField(null=True, blank=True, help_text='Last full rebuild; empty before the first')
+
+    class Meta:
+        verbose_name = 'Related Posts Index'
+        verbose_name_plural = 'Related Posts Index'
+
+    def __str__(self):
+        return f"Related posts index built {self.built_at or 'never'}"
+
+
+class RelatedVector(models.Model):
+    """A published post's TF-IDF vector in the related-posts index"""
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='related_vector'
+    )
+    terms = models.BinaryField(help_text='int32 vocabulary columns of the heaviest terms')
+    weights = models.BinaryField(help_text='float32 weights of those terms')
+
+    class Meta:
+        verbose_name = 'Related Posts Vector'
+        verbose_name_plural = 'Related Posts Vectors'
+
+    def __str__(self):
+        return f"Vector of post #{self.post_id}"
+
+
+class RelatedUpdate(models.Model):
+    """
+    A post change waiting for its related lists to be recomputed. Not a
+    foreign key: deleted posts stay queued until they are processed
+    """
+
+    post_id = models.BigIntegerField()
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Related Posts Update'
+        verbose_name_plural = 'Related Posts Updates'
+
+    def __str__(self):
+        return f"Related posts update for post #{self.post_id}"
+
+
+class StaticPageUpdate(models.Model):
+    """
+    A change waiting for its pre-rendered pages to be re-rendered (see
+    blog.static_pages). Not a foreign key: deleted objects stay queued until
+    they are processed
+    """
+
+    KIND_CHOICES = [
+        ('post', 'Post'),
+        ('comments', 'Post comments'),
+        ('related', 'Related posts'),
+        ('category', 'Category'),
+        ('tag', 'Tag'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Static Page Update'
+        verbose_name_plural = 'Static Page Updates'
+
+    def __str__(self):
+        return f"Static page update for {self.kind} #{self.object_id}"
+
+
+class PostViewBucket(models.Model):
+    """Views of a post during one hour (see blog.popularity)"""
+    
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='view_buckets',
+        help_text='Viewed post'
+    )
+    hour = models.DateTimeField(help_text='Start of the hour, UTC')
+    views = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Post View Bucket'
+        verbose_name_plural = 'Post View Buckets'
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'hour'], name='blog_postviewbucket_post_hour'),
+        ]
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+    
+    def __str__(self):
+        return f"Post #{self.post_id} at {self.hour:%Y-%m-%d %H:00}: {self.views} views"
+
+
+class PostPopularity(models.Model):
+    """Rankings computed from the view buckets by `manage.py compute_trending`"""
+    
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popularity'
+    )
+    trending_score = models.FloatField(default=0, help_text='Views with exponential time decay')
+    views_day = models.PositiveIntegerField(default=0, help_text='Views in the last 24 hours')
+    views_week = models.PositiveIntegerField(default=0, help_text='Views in the last 7 days')
+    views_month = models.PositiveIntegerField(default=0, help_text='Views in the last 30 days')
+    computed_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Post Popularity'
+        verbose_name_plural = 'Post Popularity'
+        indexes = [
+            models.Index(fields=['-trending_score']),
+            models.Index(fields=['-views_day']),
+            models.Index(fields=['-views_week']),
+            models.Index(fields=['-views_month']),
+        ]
+    
+    def __str__(self):
+        return f"Post #{self.post_id}: {self.trending_score:.1f}"
+
+
+class AnalyticsEvent(models.Model):
+    """Raw, append-only analytics event; rolled up into PostDailyStats (see blog.analytics)"""
+    
+    KIND_CHOICES = [
+        ('view', 'View'),
+        ('comment', 'Comment'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='analytics_events'
+    )
+    occurred_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Analytics Event'
+        verbose_name_plural = 'Analytics Events'
+        indexes = [
+            models.Index(fields=['occurred_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} of post #{self.post_id} at {self.occurred_at:%Y-%m-%d %H:%M}"
+
+
+class PostDailyStats(models.Model):
+    """Views and comments of a post on one day, rolled up from AnalyticsEvent"""
+    
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='daily_stats'
+    )
+    date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Post Daily Stats'
+        verbose_name_plural = 'Post Daily Stats'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'date'], name='blog_postdailystats_post_date'),
+        ]
+    
+    def __str__(self):
+        return f"Post #{self.post_id} on {self.date}: {self.views} views, {self.comments} comments"
+
+
+class AuthorStats(models.Model):
+    """Totals shown on an author's page, maintained by blog.authors"""
+    
+    author = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='author_stats'
+    )
+    post_count = models.PositiveIntegerField(default=0, help_text='Posts in any status')
+    published_count = models.PositiveIntegerField(default=0, help_text='Published posts')
+    total_views = models.PositiveBigIntegerField(default=0, help_text='Views of all their posts')
+    total_comments = models.PositiveIntegerField(
+        default=0,
+        help_text='Approved comments on their published posts'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Author Stats'
+        verbose_name_plural = 'Author Stats'
+    
+    def __str__(self):
+        return f"User #{self.author_id}: {self.published_count} published posts, {self.total_views} views"
+
+
+class PostRevision(models.Model):
+    """
+    One saved version of a post's title and content, stored by blog.revisions
+    as a zlib-compressed snapshot or as a delta against the previous revision
+    """
+    
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='revisions'
+    )
+    number = models.PositiveIntegerField(help_text='1 for the first version of the post')
+    editor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='post_revisions'
+    )
+    title = models.CharField(max_length=200)
+    is_snapshot = models.BooleanField(default=False, help_text='Full content rather than a delta')
+    data = models.BinaryField(help_text='Compressed content or delta')
+    content_hash = models.CharField(max_length=32, help_text='Hash of the full content')
+    content_length = models.PositiveIntegerField(default=0, help_text='Length of the full content')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Post Revision'
+        verbose_name_plural = 'Post Revisions'
+        ordering = ['-number']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'number'], name='blog_postrevision_post_number'),
+        ]
+    
+    def __str__(self):
+        return f"Post #{self.post_id} revision {self.number}"
@@ -0,0 +1,141 @@
+"""
+Comment moderation.
+
+New comments are scored when they are posted, from local signals only (no
+outside service):
+
+    links          each link in the text
+    repeated text  other comments with the same normalized text in the last
+                   MODERATION_DUPLICATE_DAYS days (``content_hash``)
+    user history   no approved comments yet, comments still waiting in the
+                   queue, an account younger than a day; a commenter with
+                   MODERATION_TRUSTED_COMMENTS approved comments gets a bonus
+
+A comment scoring MODERATION_SPAM_THRESHOLD or more is saved unapproved and
+lands in the moderation queue; the rest are published straight away.
+Admins and post authors commenting on their own posts are not scored. The
+queue is worked through in batches: ``moderate()`` approves or rejects
+(deletes) any number of comments with the set-based operations of
+``blog.bulk``.
+"""
+import hashlib
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from . import bulk
+from .models import Comment
+
+LINK_RE = re.compile(r'https?://|\bwww\.|<a\s', re.IGNORECASE)
+WORD_RE = re.compile(r'[\W_]+')
+
+# Score contributions; the default threshold is 1.0
+LINK_WEIGHT = 0.5
+DUPLICATE_WEIGHT = 0.5
+MAX_DUPLICATES = 4
+FIRST_COMMENT_WEIGHT = 0.3
+PENDING_WEIGHT = 0.3
+MAX_PENDING = 3
+NEW_ACCOUNT_WEIGHT = 0.3
+TRUSTED_BONUS = 0.5
+
+# Texts shorter than this ("Thanks!") are legitimately repeated
+MIN_DUPLICATE_LENGTH = 20
+
+ACTIONS = ('approve', 'reject')
+
+
+def normalize(text):
+    """Lowercase words of the text without markup or punctuation"""
+    return WORD_RE.sub(' ', strip_tags(text).lower()).strip()
+
+
+def content_hash(text):
+    return hashlib.blake2b(normalize(text).encode(), digest_size=16).hexdigest()
+
+
+def score(comment):
+    """
+    Score an unsaved comment whose ``content_hash`` is set.
+
+    Returns (score, list of reasons).
+    """
+    total, reasons = 0.0, []
+
+    links = len(LINK_RE.findall(comment.content))
+    if links:
+        total += LINK_WEIGHT * links
+        reasons.append(f'{links} link{"s" if links != 1 else ""}')
+
+    if len(normalize(comment.content)) >= MIN_DUPLICATE_LENGTH:
+        since = timezone.now() - timedelta(days=getattr(settings, 'MODERATION_DUPLICATE_DAYS', 7))
+        duplicates = len(Comment.objects.filter(
+            content_hash=comment.content_hash, created_at__gte=since
+        ).values_list('pk', flat=True)[:MAX_DUPLICATES])
+        if duplicates:
+            total += DUPLICATE_WEIGHT * duplicates
+            reasons.append(f'repeated text ({duplicates}{"+" if duplicates == MAX_DUPLICATES else ""})')
+
+    user = comment.author
+    history = Comment.objects.filter(author=user).aggregate(
+        approved=Count('pk', filter=Q(is_approved=True)),
+        pending=Count('pk', filter=Q(is_approved=False)),
+    )
+    if history['approved'] >= getattr(settings, 'MODERATION_TRUSTED_COMMENTS', 3):
+        total -= TRUSTED_BONUS
+        reasons.append('trusted commenter')
+    elif not history['approved']:
+        total += FIRST_COMMENT_WEIGHT
+        reasons.append('no approved comments')
+    if history['pending']:
+        total += PENDING_WEIGHT * min(history['pending'], MAX_PENDING)
+        reasons.append(f'{history["pending"]} pending')
+    if timezone.now() - user.date_joined < timedelta(days=1):
+        total += NEW_ACCOUNT_WEIGHT
+        reasons.append('new account')
+
+    return max(total, 0.0), reasons
+
+
+def screen(comment):
+    """
+    Score a new comment and decide whether it needs moderation.
+
+    Sets ``content_hash``, ``spam_score``, ``spam_reasons`` and
+    ``is_approved`` on the unsaved comment; returns ``is_approved``.
+    """
+    comment.content_hash = content_hash(comment.content)
+    user = comment.author
+    if user.is_admin() or user.is_superuser or comment.post.author_id == user.pk:
+        comment.spam_score, comment.spam_reasons = 0.0, ''
+        comment.is_approved = True
+        return True
+    comment.spam_score, reasons = score(comment)
+    comment.spam_reasons = ', '.join(reasons)[:200]
+    comment.is_approved = comment.spam_score < getattr(settings, 'MODERATION_SPAM_THRESHOLD', 1.0)
+    return comment.is_approved
+
+
+def queue():
+    """Comments waiting for moderation, most suspicious first"""
+    return Comment.objects.filter(is_approved=False).select_related('author', 'post').order_by(
+        '-spam_score', '-created_at'
+    )
+
+
+def moderate(action, comment_ids):
+    """
+    Approve, or reject and delete, the given queued comments. Rejecting also
+    deletes their replies. Returns how many comments were affected.
+    """
+    if action not in ACTIONS:
+        raise ValueError(f'Unknown moderation action {action!r}')
+    # Only queued comments: another moderator may have acted on some meanwhile
+    comments = Comment.objects.filter(pk__in=comment_ids, is_approved=False)
+    if action == 'approve':
+        return bulk.set_comment_approval(comments, True)
+    return bulk.delete_comments(comments)
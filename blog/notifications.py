@@ -0,0 +1,244 @@
+"""
+Email notifications for blog events.
+
+This module is imported lazily from ``blog.signals`` so that the mail stack
+(``django.core.mail`` and the ``email`` package) is only loaded by processes
+that actually send a notification.
+
+``enqueue()`` hands a notification to a bounded pool of
+``NOTIFICATION_WORKERS`` threads, so neither sync nor async requests wait on
+the mail server.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.contrib.auth import get_user_model
+from django.db import connections
+
+from .models import Post
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+
+
+def _pool():
+    """Create the executor on first use, so it is never started before a fork"""
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _slots = threading.BoundedSemaphore(settings.NOTIFICATION_QUEUE_SIZE)
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.NOTIFICATION_WORKERS, thread_name_prefix='notifications'
+            )
+    return _executor, _slots
+
+
+def _run(func, args, slots):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Notification %s failed', func.__name__)
+    finally:
+        # The worker thread's own database connections
+        connections.close_all()
+        slots.release()
+
+
+def enqueue(func, *args):
+    """
+    Send a notification with ``func(*args)`` without blocking the caller.
+
+    If the queue is full, or notifications are configured to run inline
+    (``NOTIFICATION_WORKERS = 0``), the notification is sent right away instead.
+    """
+    if settings.NOTIFICATION_WORKERS <= 0:
+        func(*args)
+        return
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        logger.warning('Notification queue full, sending %s inline', func.__name__)
+        func(*args)
+        return
+    executor.submit(_run, func, args, slots)
+
+
+def _from_email():
+    return settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@blog.com'
+
+
+def notify_post_published(post):
+    """Notify admins (excluding the author) that a post has been published"""
+    admin_users = User.objects.filter(role='Admin').exclude(id=post.author.id)
+    
+    subject = f'New Post Published: {post.title}'
+    message = f"""
+Hello,
+
+A new blog post has been published:
+
+Title: {post.title}
+Author: {post.author.get_full_name() or post.author.username}
+Category: {post.category.name if post.category else 'Uncategorized'}
+Published At: {post.published_at.strftime('%Y-%m-%d %H:%M:%S')}
+
+Excerpt:
+{post.excerpt or 'No excerpt available'}
+
+You can view the post at: {post.get_absolute_url()}
+
+Best regards,
+Blog System
+"""
+    
+    # Collect recipient emails
+    recipient_emails = [user.email for user in admin_users if user.email]
+    
+    # Send email notification (only if there are recipients and email is configured)
+    if recipient_emails:
+        try:
+            # In production, configure EMAIL_BACKEND, EMAIL_HOST, etc. in settings.py
+            # For development, this will use console backend if configured
+            send_mail(
+                subject=subject,
+                message=message,
+                from_email=_from_email(),
+                recipient_list=recipient_emails,
+                fail_silently=True,  # Don't raise exception if email fails
+            )
+            print(f"✅ Notification sent for published post: {post.title}")
+        except Exception as e:
+            print(f"⚠️ Failed to send email notification: {str(e)}")
+    
+    # Log to console for development
+    print(f"📧 Post Published: '{post.title}' by {post.author.username}")
+
+
+def notify_posts_published(post_ids):
+    """Notify admins about newly published posts, as one digest for a batch"""
+    posts = list(
+        Post.objects.filter(pk__in=post_ids, status='published')
+        .select_related('author', 'category').order_by('published_at')
+    )
+    if len(posts) == 1:
+        notify_post_published(posts[0])
+        return
+    if not posts:
+        return
+    
+    author_ids = {post.author_id for post in posts}
+    admin_users = User.objects.filter(role='Admin')
+    # Authors don't need to be told about a batch made only of their own posts
+    if len(author_ids) == 1:
+        admin_users = admin_users.exclude(id__in=author_ids)
+    recipient_emails = [user.email for user in admin_users if user.email]
+    
+    lines = '\n'.join(
+        f"- {post.title} by {post.author.get_full_name() or post.author.username}: {post.get_absolute_url()}"
+        for post in posts
+    )
+    subject = f'{len(posts)} New Posts Published'
+    message = f"""
+Hello,
+
+The following blog posts have been published:
+
+{lines}
+
+Best regards,
+Blog System
+"""
+    
+    if recipient_emails:
+        try:
+            send_mail(
+                subject=subject,
+                message=message,
+                from_email=_from_email(),
+                recipient_list=recipient_emails,
+                fail_silently=True,
+            )
+            print(f"✅ Notification sent for {len(posts)} published posts")
+        except Exception as e:
+            print(f"⚠️ Failed to send email notification: {str(e)}")
+    
+    print(f"📧 {len(posts)} Posts Published")
+
+
+def notify_new_comment(comment):
+    """Notify the post author and, for replies, the parent comment author"""
+    post_author = comment.post.author
+    
+    # Don't notify if author is commenting on their own post
+    if post_author.id == comment.author.id:
+        return
+    
+    subject = f'New Comment on Your Post: {comment.post.title}'
+    message = f"""
+Hello {post_author.get_full_name() or post_author.username},
+
+A new comment has been added to your post "{comment.post.title}":
+
+Commented by: {comment.author.get_full_name() or comment.author.username}
+Comment: {comment.content[:200]}{'...' if len(comment.content) > 200 else ''}
+
+You can view the comment at: {comment.post.get_absolute_url()}
+
+Best regards,
+Blog System
+"""
+    
+    # Send email notification
+    if post_author.email:
+        try:
+            send_mail(
+                subject=subject,
+                message=message,
+                from_email=_from_email(),
+                recipient_list=[post_author.email],
+                fail_silently=True,
+            )
+            print(f"✅ Comment notification sent to {post_author.username}")
+        except Exception as e:
+            print(f"⚠️ Failed to send comment notification: {str(e)}")
+    
+    # If it's a reply, notify the parent comment author
+    if comment.parent and comment.parent.author.id != comment.author.id:
+        parent_author = comment.parent.author
+        
+        subject = f'New Reply to Your Comment on: {comment.post.title}'
+        message = f"""
+Hello {parent_author.get_full_name() or parent_author.username},
+
+Someone replied to your comment on "{comment.post.title}":
+
+Reply by: {comment.author.get_full_name() or comment.author.username}
+Reply: {comment.content[:200]}{'...' if len(comment.content) > 200 else ''}
+
+Original comment: {comment.parent.content[:100]}{'...' if len(comment.parent.content) > 100 else ''}
+
+You can view the reply at: {comment.post.get_absolute_url()}
+
+Best regards,
+Blog System
+"""
+        
+        if parent_author.email:
+            try:
+                send_mail(
+                    subject=subject,
+                    message=message,
+                    from_email=_from_email(),
+                    recipient_list=[parent_author.email],
+                    fail_silently=True,
+                )
+                print(f"✅ Reply notification sent to {parent_author.username}")
+            except Exception as e:
+                print(f"⚠️ Failed to send reply notification: {str(e)}")
@@ -0,0 +1,138 @@
+"""
+Paginators for large tables.
+"""
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids COUNT(*) over large unfiltered PostgreSQL tables.
+    
+    For an unfiltered queryset on PostgreSQL, the planner's row estimate
+    (``pg_class.reltuples``) is used once it reaches
+    ``ESTIMATED_COUNT_THRESHOLD``. Filtered querysets, other databases and
+    small tables get an exact count.
+    """
+    
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = self._estimated_count(queryset)
+            if estimate is not None and estimate >= getattr(settings, 'ESTIMATED_COUNT_THRESHOLD', 50000):
+                return estimate
+        return super().count
+    
+    def _estimated_count(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # reltuples is -1 for tables that have never been analyzed
+        return row[0] if row and row[0] >= 0 else None
+
+
+class KeysetPage:
+    """One page of a KeysetPaginator"""
+    
+    def __init__(self, object_list, cursor, next_cursor):
+        self.object_list = object_list
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+    
+    def __iter__(self):
+        return iter(self.object_list)
+    
+    def __len__(self):
+        return len(self.object_list)
+    
+    def has_next(self):
+        return self.next_cursor is not None
+    
+    def is_first(self):
+        return self.cursor is None
+
+
+class KeysetPaginator:
+    """
+    Paginator that seeks to the next page instead of counting and offsetting.
+    
+    Pages are addressed by an opaque cursor holding the ordering values of the
+    previous page's last row, so reaching page 1000 costs the same index range
+    scan as page 1, and rows added meanwhile don't shift later pages. There
+    are no page numbers or total count; only "next" and "back to the start".
+    The ordering fields must be non-null and end with a unique field.
+    """
+    
+    def __init__(self, queryset, per_page, ordering=('-published_at', '-pk')):
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = per_page
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+    
+    def _field(self, name):
+        meta = self.queryset.model._meta
+        return meta.pk if name == 'pk' else meta.get_field(name)
+    
+    def encode(self, obj):
+        values = []
+        for name, _ in self.fields:
+            value = getattr(obj, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return urlsafe_base64_encode(json.dumps(values, separators=(',', ':')).encode())
+    
+    def decode(self, cursor):
+        try:
+            values = json.loads(urlsafe_base64_decode(cursor))
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise ValueError(cursor)
+            return [
+                self._field(name).to_python(value)
+                for (name, _), value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            raise InvalidPage('Invalid cursor.')
+    
+    def _after(self, values):
+        # (a, b) after (x, y)  <=>  a after x, or a = x and b after y
+        condition = Q()
+        for index, ((name, descending), value) in enumerate(zip(self.fields, values)):
+            step = Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+            for (earlier, _), earlier_value in zip(self.fields[:index], values):
+                step &= Q(**{earlier: earlier_value})
+            condition |= step
+        return condition
+    
+    def _queryset(self, cursor):
+        queryset = self.queryset
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode(cursor)))
+        # One extra row tells whether there is a next page
+        return queryset[:self.per_page + 1]
+    
+    def _page(self, cursor, rows):
+        objects = rows[:self.per_page]
+        next_cursor = self.encode(objects[-1]) if len(rows) > self.per_page else None
+        return KeysetPage(objects, cursor or None, next_cursor)
+    
+    def page(self, cursor=None):
+        """The page after ``cursor``, or the first page; raises InvalidPage for a bad cursor"""
+        return self._page(cursor, list(self._queryset(cursor)))
+    
+    async def apage(self, cursor=None):
+        """Async version of ``page()``"""
+        return self._page(cursor, [obj async for obj in self._queryset(cursor)])
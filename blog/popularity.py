@@ -0,0 +1,215 @@
+"""
+Popular and trending posts.
+
+Views are counted per post and per hour in ``PostViewBucket``. They come
+from one of two sources (``POPULARITY_SOURCE``):
+
+    requests     post page views handled by Django, buffered in each process
+                 (see ``blog.buffers``)
+    access_log   ``manage.py ingest_access_log`` reads the web server's log,
+                 which also sees pre-rendered pages, CDN revalidations and 304s
+
+``compute()`` (``manage.py compute_trending``, run from cron) turns the
+buckets into ``PostPopularity`` rows: a trending score, where each view's
+weight halves every ``TRENDING_HALF_LIFE_HOURS``, and plain view totals for
+the last day, week and month. It also prunes buckets past
+``POPULARITY_RETENTION_DAYS`` and starts a new ranking generation.
+
+``top_posts()`` serves the top ``POPULARITY_TOP_N`` lists, site-wide or per
+category or tag, from the cache until the next ``compute()``. Sidebar
+widgets fetch them as JSON from ``/popular/<ranking>/``.
+"""
+from collections import Counter
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import buffers, caching
+from .models import Post, PostPopularity, PostViewBucket
+
+GENERATION_KEY = 'blog:popularity:generation'
+
+RANKINGS = {
+    'trending': 'trending_score',
+    'day': 'views_day',
+    'week': 'views_week',
+    'month': 'views_month',
+}
+
+
+class RankingConverter:
+    """URL converter for the ranking segment"""
+    regex = 'trending|day|week|month'
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
+
+
+def hour_of(moment):
+    """The UTC hour a moment falls in"""
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def add_views(counts):
+    """Add {(post id, hour): views} to the buckets"""
+    for (post_id, hour), views in counts.items():
+        bucket = PostViewBucket.objects.filter(post_id=post_id, hour=hour)
+        if bucket.update(views=F('views') + views):
+            continue
+        try:
+            with transaction.atomic():
+                PostViewBucket.objects.create(post_id=post_id, hour=hour, views=views)
+        except IntegrityError:
+            # Another process created the bucket first
+            bucket.update(views=F('views') + views)
+
+
+# ---------------------------------------------------------------------------
+# Per-process view buffer
+# ---------------------------------------------------------------------------
+
+class ViewBuffer(buffers.WriteBuffer):
+    """Counts post views per hour and adds them to the buckets in batches"""
+
+    description = 'post views'
+
+    def empty(self):
+        return Counter()
+
+    def add(self, counts, post_id):
+        counts[post_id, hour_of(timezone.now())] += 1
+
+    def write(self, counts):
+        add_views(counts)
+
+
+buffer = ViewBuffer()
+
+
+def _counts_requests():
+    return getattr(settings, 'POPULARITY_SOURCE', 'requests') == 'requests'
+
+
+def record_view(post_id):
+    if _counts_requests():
+        buffer.record(post_id)
+
+
+async def arecord_view(post_id):
+    if _counts_requests():
+        await buffer.arecord(post_id)
+
+
+# ---------------------------------------------------------------------------
+# Rankings
+# ---------------------------------------------------------------------------
+
+def _ttl():
+    # A ranking generation outlives the interval between compute_trending runs
+    return getattr(settings, 'POPULARITY_CACHE_TTL', 3600)
+
+
+def current_generation():
+    return caching.current_generation(GENERATION_KEY, _ttl())
+
+
+def compute(now=None):
+    """Recompute every PostPopularity row from the buckets; returns the number of posts ranked"""
+    now = now or timezone.now()
+    current_hour = hour_of(now)
+    half_life = getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24)
+    retention = timedelta(days=getattr(settings, 'POPULARITY_RETENTION_DAYS', 30))
+    periods = {'views_day': timedelta(days=1), 'views_week': timedelta(days=7), 'views_month': timedelta(days=30)}
+
+    rankings = {}
+    buckets = PostViewBucket.objects.filter(hour__gt=now - retention).values_list('post_id', 'hour', 'views')
+    for post_id, hour, views in buckets.iterator(chunk_size=5000):
+        row = rankings.setdefault(post_id, dict.fromkeys(['trending_score', *periods], 0))
+        age_hours = (current_hour - hour_of(hour)).total_seconds() / 3600
+        row['trending_score'] += views * 0.5 ** (max(age_hours, 0) / half_life)
+        for field, period in periods.items():
+            if hour > current_hour - period:
+                row[field] += views
+
+    with transaction.atomic():
+        PostPopularity.objects.all().delete()
+        PostPopularity.objects.bulk_create(
+            [PostPopularity(post_id=post_id, computed_at=now, **row) for post_id, row in rankings.items()],
+            batch_size=1000,
+        )
+        PostViewBucket.objects.filter(hour__lte=now - retention).delete()
+    caching.bump_generation(GENERATION_KEY, _ttl())
+    return len(rankings)
+
+
+def top_posts(ranking, scope='site', slug=None):
+    """
+    The top ``POPULARITY_TOP_N`` published posts for a ranking, as dicts.
+
+    ``scope`` is 'site', 'category' or 'tag'; the latter two take a slug.
+    """
+    field = RANKINGS[ranking]
+    key = f'blog:popular:{current_generation()}:{ranking}:{scope}:{slug}'
+    posts = cache.get(key)
+    if posts is None:
+        queryset = Post.objects.filter(status='published', **{f'popularity__{field}__gt': 0})
+        if scope == 'category':
+            queryset = queryset.filter(category__slug=slug)
+        elif scope == 'tag':
+            queryset = queryset.filter(tags__slug=slug)
+        rows = queryset.order_by(f'-popularity__{field}', '-pk').values(
+            'title', 'slug', 'published_at', 'popularity__views_week', f'popularity__{field}',
+        )[:getattr(settings, 'POPULARITY_TOP_N', 10)]
+        posts = [
+            {
+                'title': row['title'],
+                'slug': row['slug'],
+                'published_at': row['published_at'],
+                'score': row[f'popularity__{field}'],
+                'views_week': row['popularity__views_week'],
+            }
+            for row in rows
+        ]
+        cache.set(key, posts, timeout=_ttl())
+    return posts
+
+
+def popular_view(request, ranking, scope='site', slug=None):
+    """JSON top-N list for sidebar widgets; ``?limit=`` returns fewer posts"""
+    generation = current_generation()
+    etag = quote_etag(caching.make_etag('popular', generation, ranking, scope, slug, request.GET.get('limit')))
+    last_modified = caching.generation_datetime(generation)
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+    if response is None:
+        posts = top_posts(ranking, scope, slug)
+        try:
+            posts = posts[:max(int(request.GET['limit']), 0)]
+        except (KeyError, ValueError):
+            pass
+        response = JsonResponse({
+            'ranking': ranking,
+            'posts': [
+                {**post, 'url': reverse('blog:post_detail', kwargs={'slug': post['slug']})}
+                for post in posts
+            ],
+        })
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=getattr(settings, 'HTTP_CACHE_MAX_AGE', 0),
+        s_maxage=getattr(settings, 'HTTP_CACHE_SHARED_MAX_AGE', 60),
+    )
+    return response
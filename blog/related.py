@@ -0,0 +1,392 @@
+"""
+Related posts.
+
+Every published post gets its ``RELATED_POSTS_COUNT`` most similar published
+posts, precomputed into the ``RelatedPost`` table, so a post page reads them
+with one indexed query. Similarity mixes two signals:
+
+    text       TF-IDF cosine over the post's title and stripped content
+    taxonomy   Jaccard overlap of the post's tags and category
+
+weighted ``RELATED_TEXT_WEIGHT`` to ``1 - RELATED_TEXT_WEIGHT``. Both are
+computed with NumPy for a whole block of posts against every other post.
+
+The index lives in the database, so every web process and worker shares it.
+``RelatedIndex`` holds the vocabulary. ``RelatedVector`` holds each post's
+``TERMS_PER_POST`` heaviest terms as (term, weight) arrays. ``rebuild()``
+derives a new vocabulary and recomputes every list. ``update_posts()``
+vectorizes only the changed posts against the stored vocabulary. It
+recomputes their lists, and revisits the other posts whose lists held them
+or should now. Words that are not in the vocabulary yet count once the index
+is rebuilt. Both lock the ``RelatedIndex`` row, so concurrent writers take
+turns instead of overwriting each other's vectors.
+
+Post changes are not processed in the request that makes them. The blog
+signals only queue the post ids as ``RelatedUpdate`` rows. ``process_pending()`` (``rebuild_related
+--pending``, run from cron or a worker) applies the queue in one pass and
+builds the index first if it has never been built.
+"""
+import math
+import re
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from . import caching
+from .models import Post, RelatedIndex, RelatedPost, RelatedUpdate, RelatedVector, StaticPageUpdate
+
+TERMS_PER_POST = 64
+# Upper bound on the floats in one block's scratch arrays (about 32 MB)
+BLOCK_BUDGET = 8_000_000
+TOKEN_RE = re.compile(r'[a-z][a-z0-9]{2,}')
+STOP_WORDS = frozenset('''
+    about above after again against all also and any are because been before being below between both
+    but can could did does doing down during each few for from further had has have having her here
+    hers herself him himself his how into its itself just more most nor not now off once only other our
+    ours ourselves out over own same she should some such than that the their theirs them themselves
+    then there these they this those through too under until very was were what when where which while
+    who whom why will with would you your yours yourself yourselves
+'''.split())
+
+
+def post_count():
+    return getattr(settings, 'RELATED_POSTS_COUNT', 5)
+
+
+def tokens(title, content):
+    text = f'{title} {strip_tags(content)}'.lower()
+    return [word for word in TOKEN_RE.findall(text) if word not in STOP_WORDS]
+
+
+def _documents(queryset):
+    """Token lists keyed by post id, read without loading whole model instances"""
+    rows = queryset.values_list('pk', 'title', 'content').iterator(chunk_size=500)
+    return {pk: tokens(title, content) for pk, title, content in rows}
+
+
+class Index:
+    """Truncated, L2-normalised TF-IDF vectors of the published posts"""
+
+    def __init__(self, vocabulary, idf, ids, terms, weights):
+        self.vocabulary = list(vocabulary)
+        self.lookup = {term: column for column, term in enumerate(self.vocabulary)}
+        self.idf = idf
+        self.ids = ids          # (n,) post ids, ascending
+        self.terms = terms      # (n, TERMS_PER_POST) vocabulary columns
+        self.weights = weights  # (n, TERMS_PER_POST) weights, 0 for padding
+
+    @classmethod
+    def build(cls, documents):
+        """Derive the vocabulary and IDF from ``documents`` and vectorize them"""
+        df = Counter()
+        for words in documents.values():
+            df.update(set(words))
+        total = len(documents)
+        # Words in over half of a sizeable corpus don't tell posts apart
+        limit = total // 2 if total >= 10 else total
+        candidates = sorted(
+            ((count, term) for term, count in df.items() if count <= limit),
+            key=lambda item: (-item[0], item[1]),
+        )
+        vocabulary = [term for _, term in candidates[:getattr(settings, 'RELATED_MAX_FEATURES', 4096)]]
+        idf = np.array([math.log((1 + total) / (1 + df[term])) + 1 for term in vocabulary], dtype=np.float32)
+        index = cls(vocabulary, idf, *cls._empty())
+        index.replace(documents)
+        return index
+
+    @staticmethod
+    def _empty():
+        return (
+            np.zeros(0, dtype=np.int64),
+            np.zeros((0, TERMS_PER_POST), dtype=np.int32),
+            np.zeros((0, TERMS_PER_POST), dtype=np.float32),
+        )
+
+    def vectorize(self, documents):
+        terms = np.zeros((len(documents), TERMS_PER_POST), dtype=np.int32)
+        weights = np.zeros((len(documents), TERMS_PER_POST), dtype=np.float32)
+        for row, words in enumerate(documents):
+            counts = Counter(self.lookup[word] for word in words if word in self.lookup)
+            if not counts:
+                continue
+            columns = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+            frequencies = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            values = (1 + np.log(frequencies)) * self.idf[columns]
+            top = np.argsort(-values, kind='stable')[:TERMS_PER_POST]
+            terms[row, :len(top)] = columns[top]
+            weights[row, :len(top)] = values[top] / np.linalg.norm(values[top])
+        return terms, weights
+
+    def replace(self, documents):
+        """Add or re-vectorize the posts in ``documents`` ({post id: tokens})"""
+        if not documents:
+            return
+        ids = np.array(sorted(documents), dtype=np.int64)
+        terms, weights = self.vectorize([documents[pk] for pk in ids.tolist()])
+        keep = ~np.isin(self.ids, ids)
+        self.ids = np.concatenate([self.ids[keep], ids])
+        self.terms = np.concatenate([self.terms[keep], terms])
+        self.weights = np.concatenate([self.weights[keep], weights])
+        order = np.argsort(self.ids, kind='stable')
+        self.ids, self.terms, self.weights = self.ids[order], self.terms[order], self.weights[order]
+
+    def retain(self, post_ids):
+        """Drop every post not in ``post_ids``"""
+        keep = np.isin(self.ids, np.fromiter(post_ids, dtype=np.int64))
+        self.ids, self.terms, self.weights = self.ids[keep], self.terms[keep], self.weights[keep]
+
+    def rows(self, post_ids):
+        """Row numbers of the given posts; posts not in the index are skipped"""
+        wanted = np.fromiter(post_ids, dtype=np.int64)
+        return np.flatnonzero(np.isin(self.ids, wanted))
+
+    def cosine(self, rows):
+        """Cosine similarity of the given rows with every post, shape (len(rows), n)"""
+        if not self.vocabulary:
+            return np.zeros((len(rows), len(self.ids)), dtype=np.float32)
+        dense = np.zeros((len(rows), len(self.vocabulary)), dtype=np.float32)
+        # add.at, because padding repeats column 0
+        np.add.at(dense, (np.arange(len(rows))[:, None], self.terms[rows]), self.weights[rows])
+        # Each post's vector is sparse: gather the query weights at its terms
+        return np.einsum('bnk,nk->bn', dense[:, self.terms], self.weights)
+
+    def save_vocabulary(self, state):
+        state.vocabulary = '\n'.join(self.vocabulary)
+        state.idf = self.idf.astype(np.float32).tobytes()
+        state.built_at = timezone.now()
+        state.save()
+
+    def save_vectors(self, rows):
+        """Store the vectors of the given rows, dropping their padding"""
+        vectors = []
+        for row in rows:
+            used = int(np.count_nonzero(self.weights[row]))
+            vectors.append(RelatedVector(
+                post_id=int(self.ids[row]),
+                terms=self.terms[row, :used].tobytes(),
+                weights=self.weights[row, :used].tobytes(),
+            ))
+        RelatedVector.objects.bulk_create(
+            vectors, batch_size=1000, update_conflicts=True,
+            unique_fields=['post'], update_fields=['terms', 'weights'],
+        )
+
+    @classmethod
+    def load(cls, state):
+        """The stored index of the published posts, or None before the first ``rebuild()``"""
+        if state.built_at is None:
+            return None
+        vocabulary = state.vocabulary.split('\n') if state.vocabulary else []
+        rows = RelatedVector.objects.filter(post__status='published').order_by('post_id').values_list(
+            'post_id', 'terms', 'weights'
+        )
+        ids, terms, weights = [], [], []
+        for post_id, post_terms, post_weights in rows.iterator(chunk_size=2000):
+            ids.append(post_id)
+            terms.append(np.frombuffer(post_terms, dtype=np.int32))
+            weights.append(np.frombuffer(post_weights, dtype=np.float32))
+        index = cls(vocabulary, np.frombuffer(state.idf, dtype=np.float32), *cls._empty())
+        index.ids = np.array(ids, dtype=np.int64)
+        index.terms = np.zeros((len(ids), TERMS_PER_POST), dtype=np.int32)
+        index.weights = np.zeros((len(ids), TERMS_PER_POST), dtype=np.float32)
+        for row, (post_terms, post_weights) in enumerate(zip(terms, weights)):
+            index.terms[row, :len(post_terms)] = post_terms
+            index.weights[row, :len(post_weights)] = post_weights
+        return index
+
+
+def label_matrix(ids):
+    """Binary matrix of the posts' tags and categories, one row per id in ``ids``"""
+    position = {pk: row for row, pk in enumerate(ids.tolist())}
+    columns, rows, cols = {}, [], []
+    published_tags = Post.tags.through.objects.filter(post__status='published').values_list('post_id', 'tag_id')
+    categories = Post.objects.filter(status='published', category__isnull=False).values_list('pk', 'category_id')
+    for kind, pairs in (('tag', published_tags), ('category', categories)):
+        for post_id, label_id in pairs.iterator(chunk_size=2000):
+            if post_id in position:
+                rows.append(position[post_id])
+                cols.append(columns.setdefault((kind, label_id), len(columns)))
+    labels = np.zeros((len(ids), len(columns)), dtype=np.float32)
+    labels[rows, cols] = 1
+    return labels
+
+
+class Similarity:
+    """Combined similarity over an index and the current taxonomy"""
+
+    def __init__(self, index):
+        self.index = index
+        self.labels = label_matrix(index.ids)
+        self.label_counts = self.labels.sum(axis=1)
+        self.text_weight = getattr(settings, 'RELATED_TEXT_WEIGHT', 0.6)
+
+    def scores(self, rows):
+        """Similarity of the given rows with every post; a post scores -1 with itself"""
+        text = self.index.cosine(rows)
+        shared = self.labels[rows] @ self.labels.T
+        union = self.label_counts[rows][:, None] + self.label_counts[None, :] - shared
+        jaccard = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+        scores = self.text_weight * text + (1 - self.text_weight) * jaccard
+        scores[np.arange(len(rows)), rows] = -1
+        return scores
+
+    def blocks(self, rows):
+        """Split ``rows`` into blocks whose scratch arrays stay within BLOCK_BUDGET"""
+        size = max(1, BLOCK_BUDGET // max(1, len(self.index.ids) * TERMS_PER_POST))
+        for start in range(0, len(rows), size):
+            yield rows[start:start + size]
+
+    def top(self, rows):
+        """Yield (post id, [(related id, score), ...]) for the given rows"""
+        ids = self.index.ids
+        k = min(post_count(), len(ids) - 1)
+        for block in self.blocks(rows):
+            if k <= 0:
+                for row in block:
+                    yield int(ids[row]), []
+                continue
+            scores = self.scores(block)
+            best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, best, axis=1)
+            order = np.argsort(-best_scores, axis=1, kind='stable')
+            best = np.take_along_axis(best, order, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            for row, columns, values in zip(block, best, best_scores):
+                yield int(ids[row]), [
+                    (int(ids[column]), float(value)) for column, value in zip(columns, values) if value > 0
+                ]
+
+
+def _store(lists, clear=()):
+    """Replace the stored lists of the posts in ``lists`` and remove those in ``clear``"""
+    entries = [
+        RelatedPost(post_id=post_id, related_id=related_id, rank=rank, score=score)
+        for post_id, related in lists
+        for rank, (related_id, score) in enumerate(related)
+    ]
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=[post_id for post_id, _ in lists] + list(clear)).delete()
+        RelatedPost.objects.bulk_create(entries, batch_size=1000)
+
+
+def _lock():
+    """The index row, locked until the transaction ends"""
+    RelatedIndex.objects.get_or_create(pk=1)
+    return RelatedIndex.objects.select_for_update().get(pk=1)
+
+
+def _rebuild(state, progress=None):
+    index = Index.build(_documents(Post.objects.filter(status='published')))
+    similarity = Similarity(index)
+    RelatedPost.objects.exclude(post__status='published').delete()
+    lists, done = [], 0
+    for entry in similarity.top(np.arange(len(index.ids))):
+        lists.append(entry)
+        if len(lists) == 500 or done + len(lists) == len(index.ids):
+            _store(lists)
+            done += len(lists)
+            lists = []
+            if progress:
+                progress(done, len(index.ids))
+    RelatedVector.objects.all().delete()
+    index.save_vectors(range(len(index.ids)))
+    index.save_vocabulary(state)
+    transaction.on_commit(caching.bump_related_generation)
+    return len(index.ids)
+
+
+def rebuild(progress=None):
+    """Re-derive the index from every published post and recompute every list"""
+    with transaction.atomic():
+        state = _lock()
+        # Everything queued so far is covered by the rebuild
+        queued = list(RelatedUpdate.objects.values_list('pk', flat=True))
+        total = _rebuild(state, progress)
+        RelatedUpdate.objects.filter(pk__in=queued).delete()
+    return total
+
+
+def _thresholds(index):
+    """Per indexed post, the score a post must beat to enter its list"""
+    thresholds = np.zeros(len(index.ids), dtype=np.float32)
+    full = RelatedPost.objects.values('post_id').annotate(
+        low=Min('score'), total=Count('pk')
+    ).filter(total__gte=post_count()).values_list('post_id', 'low')
+    position = {pk: row for row, pk in enumerate(index.ids.tolist())}
+    for post_id, low in full.iterator(chunk_size=2000):
+        if post_id in position:
+            thresholds[position[post_id]] = low
+    return thresholds
+
+
+def _update(state, post_ids):
+    index = Index.load(state)
+    if index is None:
+        _rebuild(state)
+        return set()
+    post_ids = set(post_ids)
+    published = set(Post.objects.filter(status='published').values_list('pk', flat=True))
+    changed = _documents(Post.objects.filter(pk__in=post_ids, status='published'))
+    index.replace(changed)
+    index.save_vectors(index.rows(changed))
+    RelatedVector.objects.filter(post_id__in=post_ids - set(changed)).delete()
+    index.retain(published)
+
+    similarity = Similarity(index)
+    changed_rows = index.rows(changed)
+    # Posts that listed a changed post, and posts a changed post now beats a list entry of
+    revisit = set(RelatedPost.objects.filter(related_id__in=post_ids).values_list('post_id', flat=True))
+    if len(changed_rows):
+        thresholds = _thresholds(index)
+        for block in similarity.blocks(changed_rows):
+            beats = (similarity.scores(block) > thresholds[None, :]).any(axis=0)
+            revisit.update(index.ids[beats].tolist())
+    revisit = (revisit & published) - set(changed)
+    rows = np.union1d(changed_rows, index.rows(revisit))
+    _store(list(similarity.top(rows)), clear=post_ids - set(changed))
+    transaction.on_commit(caching.bump_related_generation)
+    return revisit
+
+
+def update_posts(post_ids):
+    """
+    Recompute the lists affected by changes to the given posts (which may
+    have been unpublished or deleted since). Builds the whole index instead
+    if it was never built.
+
+    Returns the ids of the other posts whose lists were recomputed.
+    """
+    with transaction.atomic():
+        return _update(_lock(), post_ids)
+
+
+def process_pending():
+    """
+    Apply the queued post changes in one update, or build the index if it
+    was never built. Queues the pre-rendered pages whose related lists
+    changed. Returns the number of changed posts processed.
+    """
+    with transaction.atomic():
+        state = _lock()
+        # Read after taking the lock: a concurrent run has removed what it did
+        queued = list(RelatedUpdate.objects.values_list('pk', 'post_id'))
+        post_ids = {post_id for _, post_id in queued}
+        if state.built_at is None:
+            _rebuild(state)
+            revisited = set()
+        elif post_ids:
+            revisited = _update(state, post_ids)
+        else:
+            return 0
+        # Only the rows read: changes queued meanwhile wait for the next run
+        RelatedUpdate.objects.filter(pk__in=[pk for pk, _ in queued]).delete()
+    if settings.STATIC_PAGES_ENABLED:
+        StaticPageUpdate.objects.bulk_create([
+            StaticPageUpdate(kind='related', object_id=pk) for pk in revisited | post_ids
+        ])
+    return len(post_ids)
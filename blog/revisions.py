@@ -0,0 +1,163 @@
+"""
+Post revision history.
+
+Every save that changes a post's title or content adds a ``PostRevision``.
+Full copies of a long post on every save would make a post edited 200 times
+cost 200 times its size. So most revisions store only a delta against the
+previous revision. The first revision and every
+``REVISION_SNAPSHOT_INTERVAL``-th one after it store the full content, as
+does any revision whose delta would be no smaller. All of it is
+zlib-compressed.
+
+A delta is computed with difflib over the content split into words and HTML
+tags. It is stored as a JSON list in which a ``[start, end]`` pair copies
+that slice of the previous version and a string is new text.
+
+Any version is rebuilt from the nearest snapshot at or before it, plus the
+deltas after that snapshot. That is one query reading at most
+``REVISION_SNAPSHOT_INTERVAL`` rows.
+"""
+import difflib
+import hashlib
+import json
+import re
+import zlib
+from itertools import accumulate
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Subquery
+
+from .models import Post, PostRevision
+
+# Words with their trailing whitespace, and tags, so an edit inside a long
+# paragraph only stores the words that changed
+TOKEN_RE = re.compile(r'[^\s>]*[\s>]|[^\s>]+')
+
+# Unchanged text kept around each change in a diff
+CONTEXT = 120
+
+
+def _tokens(text):
+    return TOKEN_RE.findall(text)
+
+
+def digest(content):
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+def compress(content):
+    """Snapshot data for the given content"""
+    return zlib.compress(content.encode(), 9)
+
+
+def make_delta(old, new):
+    """Compressed delta turning ``old`` into ``new``"""
+    a, b = _tokens(old), _tokens(new)
+    offsets = list(accumulate(map(len, a), initial=0))
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b).get_opcodes():
+        if tag == 'equal':
+            ops.append([offsets[i1], offsets[i2]])
+        elif j2 > j1:
+            ops.append(''.join(b[j1:j2]))
+    return zlib.compress(json.dumps(ops, separators=(',', ':')).encode(), 9)
+
+
+def apply_delta(old, data):
+    ops = json.loads(zlib.decompress(data))
+    return ''.join(old[op[0]:op[1]] if isinstance(op, list) else op for op in ops)
+
+
+def _snapshot_interval():
+    return getattr(settings, 'REVISION_SNAPSHOT_INTERVAL', 50)
+
+
+def contents(post, numbers):
+    """
+    Content of the post at each of the given revision numbers, as a dict.
+    Raises PostRevision.DoesNotExist when one of them doesn't exist.
+    """
+    numbers = set(numbers)
+    snapshot = PostRevision.objects.filter(
+        post=post, number__lte=min(numbers), is_snapshot=True
+    ).order_by('-number').values('number')[:1]
+    rows = PostRevision.objects.filter(
+        post=post, number__gte=Subquery(snapshot), number__lte=max(numbers)
+    ).order_by('number').values_list('number', 'is_snapshot', 'data')
+    found, content = {}, None
+    for number, is_snapshot, data in rows:
+        content = zlib.decompress(data).decode() if is_snapshot else apply_delta(content, data)
+        if number in numbers:
+            found[number] = content
+    if len(found) != len(numbers):
+        missing = sorted(numbers - set(found))
+        raise PostRevision.DoesNotExist(f'Post #{getattr(post, "pk", post)} has no revision {missing}')
+    return found
+
+
+def content_at(post, number):
+    """Content of the post at the given revision number"""
+    return contents(post, [number])[number]
+
+
+def record(post, editor=None):
+    """
+    Add a revision for the post's current title and content unless they
+    match its latest revision. Returns the new revision or None.
+    """
+    content = post.content or ''
+    content_hash = digest(content)
+    with transaction.atomic():
+        # Concurrent saves of one post take turns, so numbers stay sequential
+        Post.objects.select_for_update().filter(pk=post.pk).values_list('pk').first()
+        latest = PostRevision.objects.filter(post=post).only('number', 'title', 'content_hash').first()
+        if latest and latest.content_hash == content_hash and latest.title == post.title:
+            return None
+        number = latest.number + 1 if latest else 1
+        is_snapshot, data = True, compress(content)
+        if latest and (number - 1) % _snapshot_interval():
+            delta = make_delta(content_at(post, latest.number), content)
+            if len(delta) < len(data):
+                is_snapshot, data = False, delta
+        return PostRevision.objects.create(
+            post=post,
+            number=number,
+            editor=editor,
+            title=post.title,
+            is_snapshot=is_snapshot,
+            data=data,
+            content_hash=content_hash,
+            content_length=len(content),
+        )
+
+
+def diff(old, new):
+    """
+    The changes from ``old`` to ``new`` as a list of (operation, text), where
+    operation is 'equal', 'delete', 'insert' or 'skip'. Long unchanged
+    stretches are shortened to CONTEXT characters on each side of a change;
+    the text of a 'skip' is the number of characters left out.
+    """
+    a, b = _tokens(old), _tokens(new)
+    opcodes = difflib.SequenceMatcher(None, a, b).get_opcodes()
+    segments = []
+    for index, (tag, i1, i2, j1, j2) in enumerate(opcodes):
+        if tag == 'equal':
+            text = ''.join(a[i1:i2])
+            head = CONTEXT if index else 0
+            tail = CONTEXT if index < len(opcodes) - 1 else 0
+            if len(text) > head + tail + CONTEXT:
+                if head:
+                    segments.append(('equal', text[:head]))
+                segments.append(('skip', len(text) - head - tail))
+                if tail:
+                    segments.append(('equal', text[-tail:]))
+            else:
+                segments.append(('equal', text))
+            continue
+        if i2 > i1:
+            segments.append(('delete', ''.join(a[i1:i2])))
+        if j2 > j1:
+            segments.append(('insert', ''.join(b[j1:j2])))
+    return segments
@@ -0,0 +1,62 @@
+"""
+Scheduled publishing.
+
+A post saved with status ``scheduled`` goes live at its ``publish_at`` time,
+published by ``manage.py run_scheduler``. The scheduler does not poll: after
+each run it reads the earliest ``publish_at`` of the scheduled posts, a
+lookup on the partial ``blog_post_scheduled_idx`` index that holds scheduled
+posts only, and sleeps until then. The sleep is capped at
+``SCHEDULER_MAX_SLEEP`` seconds so that a post scheduled meanwhile for an
+earlier time is still published on time, give or take the cap.
+
+``publish_due()`` publishes every due post in one transaction with
+``blog.bulk.set_post_status``: set-based UPDATEs and taxonomy recounts, then
+one ``posts_published`` and one ``posts_changed`` event covering each post
+once. The due rows are locked and rows locked by another scheduler skipped,
+so two schedulers never publish the same post twice.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from . import bulk
+from .models import Post
+
+# Due posts are left over only when another scheduler holds their rows
+RETRY_DELAY = 1.0
+
+
+def due(now=None):
+    """Scheduled posts whose time has come"""
+    return Post.objects.filter(status='scheduled', publish_at__lte=now or timezone.now())
+
+
+def publish_due(now=None):
+    """Publish every due scheduled post and return how many were published"""
+    with transaction.atomic():
+        pks = list(due(now).select_for_update(skip_locked=True).values_list('pk', flat=True))
+        if not pks:
+            return 0
+        # Published at the scheduled time, not whenever the scheduler woke up
+        return bulk.set_post_status(
+            Post.objects.filter(pk__in=pks), 'published', published_at=F('publish_at')
+        )
+
+
+def next_due():
+    """The earliest ``publish_at`` of the scheduled posts, or None"""
+    return Post.objects.filter(status='scheduled').aggregate(next=Min('publish_at'))['next']
+
+
+def sleep_seconds(now=None, max_sleep=None):
+    """How long the scheduler may sleep before the next post is due"""
+    if max_sleep is None:
+        max_sleep = getattr(settings, 'SCHEDULER_MAX_SLEEP', 60)
+    upcoming = next_due()
+    if upcoming is None:
+        return max_sleep
+    seconds = (upcoming - (now or timezone.now())).total_seconds()
+    if seconds <= 0:
+        return min(RETRY_DELAY, max_sleep)
+    return min(seconds, max_sleep)
@@ -1,67 +1,46 @@
-from django.db.models.signals import post_save, pre_save
-from django.dispatch import receiver
-from django.core.mail import send_mail
 from django.conf import settings
-from django.contrib.auth import get_user_model
-from .models import Post, Comment
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from . import authors, caching, events, feeds, revisions, sitemaps, taxonomy
+from .models import Post, Comment, Category, RelatedPost, RelatedUpdate, StaticPageUpdate, Tag
 
-User = get_user_model()
+
+@receiver(post_save, sender=Post)
+def emit_post_events(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Translate a single post save into blog domain events.
+    View count updates are not a content change and emit nothing.
+    """
+    if update_fields is not None and set(update_fields) <= {'views_count'}:
+        return
+    # Only an actual draft -> published transition counts as publication
+    if instance.status == 'published' and getattr(instance, '_old_status', None) != 'published':
+        events.emit(events.posts_published, Post, [instance.pk])
+    events.emit(events.posts_changed, Post, [instance.pk])
 
 
 @receiver(post_save, sender=Post)
-def post_published_notification(sender, instance, created, **kwargs):
-    """
-    Send notification when a post is published.
-    This signal is triggered after a post is saved.
-    """
-    # Check if the post status is 'published' and it's not a new creation
-    # We check for status change by comparing with the previous state
-    if instance.status == 'published' and instance.published_at:
-        # Get all admin users and authors (excluding the post author)
-        admin_users = User.objects.filter(role='Admin').exclude(id=instance.author.id)
-        
-        # Prepare notification message
-        subject = f'New Post Published: {instance.title}'
-        message = f"""
-Hello,
-
-A new blog post has been published:
-
-Title: {instance.title}
-Author: {instance.author.get_full_name() or instance.author.username}
-Category: {instance.category.name if instance.category else 'Uncategorized'}
-Published At: {instance.published_at.strftime('%Y-%m-%d %H:%M:%S')}
-
-Excerpt:
-{instance.excerpt or 'No excerpt available'}
-
-You can view the post at: {instance.get_absolute_url()}
-
-Best regards,
-Blog System
-"""
-        
-        # Collect recipient emails
-        recipient_emails = [user.email for user in admin_users if user.email]
-        
-        # Send email notification (only if there are recipients and email is configured)
-        if recipient_emails:
-            try:
-                # In production, configure EMAIL_BACKEND, EMAIL_HOST, etc. in settings.py
-                # For development, this will use console backend if configured
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@blog.com',
-                    recipient_list=recipient_emails,
-                    fail_silently=True,  # Don't raise exception if email fails
-                )
-                print(f"✅ Notification sent for published post: {instance.title}")
-            except Exception as e:
-                print(f"⚠️ Failed to send email notification: {str(e)}")
-        
-        # Log to console for development
-        print(f"📧 Post Published: '{instance.title}' by {instance.author.username}")
+def record_post_revision(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Add a revision when a save changes the title or content of a post.
+    Views set ``_edited_by`` on the post; a new post's first revision is its author's.
+    """
+    if update_fields is not None and not {'title', 'content'} & set(update_fields):
+        return
+    editor = instance.author if created else getattr(instance, '_edited_by', None)
+    revisions.record(instance, editor=editor)
+
+
+@receiver(events.posts_published)
+def post_published_notification(sender, post_ids, **kwargs):
+    """
+    Send notification when posts are published.
+    Bulk publication sends a single digest instead of one email per post.
+    """
+    # Imported lazily so the mail stack isn't loaded at startup
+    from . import notifications
+    notifications.enqueue(notifications.notify_posts_published, post_ids)
 
 
 @receiver(post_save, sender=Comment)
@@ -70,89 +49,327 @@ def comment_notification(sender, instance, created, **kwargs):
     Send notification to post author when a new comment is added.
     """
     if created and instance.is_approved:
-        # Notify the post author about new comment
-        post_author = instance.post.author
-        
-        # Don't notify if author is commenting on their own post
-        if post_author.id == instance.author.id:
-            return
-        
-        subject = f'New Comment on Your Post: {instance.post.title}'
-        message = f"""
-Hello {post_author.get_full_name() or post_author.username},
-
-A new comment has been added to your post "{instance.post.title}":
-
-Commented by: {instance.author.get_full_name() or instance.author.username}
-Comment: {instance.content[:200]}{'...' if len(instance.content) > 200 else ''}
-
-You can view the comment at: {instance.post.get_absolute_url()}
-
-Best regards,
-Blog System
-"""
-        
-        # Send email notification
-        if post_author.email:
-            try:
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@blog.com',
-                    recipient_list=[post_author.email],
-                    fail_silently=True,
-                )
-                print(f"✅ Comment notification sent to {post_author.username}")
-            except Exception as e:
-                print(f"⚠️ Failed to send comment notification: {str(e)}")
-        
-        # If it's a reply, notify the parent comment author
-        if instance.parent and instance.parent.author.id != instance.author.id:
-            parent_author = instance.parent.author
-            
-            subject = f'New Reply to Your Comment on: {instance.post.title}'
-            message = f"""
-Hello {parent_author.get_full_name() or parent_author.username},
-
-Someone replied to your comment on "{instance.post.title}":
-
-Reply by: {instance.author.get_full_name() or instance.author.username}
-Reply: {instance.content[:200]}{'...' if len(instance.content) > 200 else ''}
-
-Original comment: {instance.parent.content[:100]}{'...' if len(instance.parent.content) > 100 else ''}
-
-You can view the reply at: {instance.post.get_absolute_url()}
-
-Best regards,
-Blog System
-"""
-            
-            if parent_author.email:
-                try:
-                    send_mail(
-                        subject=subject,
-                        message=message,
-                        from_email=settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@blog.com',
-                        recipient_list=[parent_author.email],
-                        fail_silently=True,
-                    )
-                    print(f"✅ Reply notification sent to {parent_author.username}")
-                except Exception as e:
-                    print(f"⚠️ Failed to send reply notification: {str(e)}")
+        from . import notifications
+        # Sent once the comment is committed, off the request thread
+        transaction.on_commit(
+            lambda: notifications.enqueue(notifications.notify_new_comment, instance)
+        )
+
+
+@receiver(post_save, sender=Comment)
+def record_comment_analytics(sender, instance, created, **kwargs):
+    """
+    Count new comments in the author analytics.
+    """
+    if created:
+        from . import analytics
+        analytics.record_comment(instance.post_id)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def emit_comment_events(sender, instance, **kwargs):
+    """
+    Any saved or deleted comment may change what a post page displays.
+    """
+    events.emit(events.comments_changed, Comment, [instance.post_id])
 
 
 @receiver(pre_save, sender=Post)
 def track_post_status_change(sender, instance, **kwargs):
     """
     Track when a post status changes from draft to published.
-    This helps ensure we only send notifications on actual publication.
+    This helps ensure we only send notifications on actual publication,
+    and lets the taxonomy counters and author stats see the previous status,
+    category, author and views.
     """
+    previous = None
     if instance.pk:  # Only for existing posts
-        try:
-            old_instance = Post.objects.get(pk=instance.pk)
-            # Store the old status for comparison
-            instance._old_status = old_instance.status
-        except Post.DoesNotExist:
-            instance._old_status = None
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'status', 'category_id', 'author_id', 'views_count'
+        ).first()
+    # Store the old status, category, author and views for comparison
+    (
+        instance._old_status, instance._old_category_id, instance._old_author_id, instance._old_views_count
+    ) = previous or (None, None, None, 0)
+
+
+@receiver(post_save, sender=Post)
+def update_taxonomy_counts_on_post_save(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Keep Category.post_count and Tag.post_count in step with publication.
+    """
+    if update_fields is not None and not {'status', 'category'} & set(update_fields):
+        return
+    was_published = getattr(instance, '_old_status', None) == 'published'
+    is_published = instance.status == 'published'
+    
+    category_deltas = {}
+    if was_published:
+        category_deltas[instance._old_category_id] = -1
+    if is_published:
+        category_deltas[instance.category_id] = category_deltas.get(instance.category_id, 0) + 1
+    taxonomy.adjust_category_counts(category_deltas)
+    
+    # A brand-new post has no tags yet; they arrive through m2m_changed
+    if was_published != is_published and not created:
+        delta = 1 if is_published else -1
+        tag_ids = instance.tags.values_list('pk', flat=True)
+        taxonomy.adjust_tag_counts({tag_id: delta for tag_id in tag_ids})
+
+
+@receiver(pre_delete, sender=Post)
+def remember_tags_before_delete(sender, instance, **kwargs):
+    """
+    The tag links are gone by post_delete, so capture them beforehand.
+    """
+    if instance.status == 'published':
+        instance._tag_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Post)
+def queue_related_lists_before_delete(sender, instance, **kwargs):
+    """
+    The lists holding a deleted post lose that entry with it, so queue their
+    posts for recomputing while they can still be found.
+    """
+    listing = RelatedPost.objects.filter(related=instance).values_list('post_id', flat=True)
+    RelatedUpdate.objects.bulk_create([RelatedUpdate(post_id=post_id) for post_id in listing])
+
+
+@receiver(post_delete, sender=Post)
+def emit_post_events_on_delete(sender, instance, **kwargs):
+    """
+    A deleted post leaves feeds, sitemaps, related lists and cached pages.
+    """
+    events.emit(events.posts_changed, Post, [instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def update_taxonomy_counts_on_post_delete(sender, instance, **kwargs):
+    """
+    Deleting a published post removes it from its category and tag counts.
+    """
+    if instance.status == 'published':
+        taxonomy.adjust_category_counts({instance.category_id: -1})
+        taxonomy.adjust_tag_counts({tag_id: -1 for tag_id in getattr(instance, '_tag_ids', [])})
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_tag_counts_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Adjust tag counts when tags are added to or removed from published posts.
+    Handles both post.tags.add(...) and tag.posts.add(...).
+    """
+    if action == 'pre_clear':
+        # Remember what is about to be cleared; post_clear has no pk_set
+        if reverse:
+            instance._cleared_pks = list(instance.posts.filter(status='published').values_list('pk', flat=True))
+        elif instance.status == 'published':
+            instance._cleared_pks = list(instance.tags.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    
+    delta = 1 if action == 'post_add' else -1
+    if action == 'post_clear':
+        pks = getattr(instance, '_cleared_pks', [])
     else:
-        instance._old_status = None
+        pks = pk_set or []
+    
+    if reverse:
+        # instance is a Tag and pks are posts
+        published = Post.objects.filter(pk__in=pks, status='published').count() if action != 'post_clear' else len(pks)
+        taxonomy.adjust_tag_counts({instance.pk: delta * published})
+    elif instance.status == 'published':
+        taxonomy.adjust_tag_counts({tag_id: delta for tag_id in pks})
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def emit_post_events_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    A post's tags are part of its public content. Forms save them after the
+    post itself, so the post's own posts_changed event has already gone out.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        post_ids = getattr(instance, '_cleared_pks', []) if action == 'post_clear' else pk_set or []
+    else:
+        post_ids = [instance.pk]
+    events.emit(events.posts_changed, Post, post_ids)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Post)
+def invalidate_taxonomy(sender, **kwargs):
+    """
+    Refresh the shared category/tag snapshot once the change is committed.
+    """
+    transaction.on_commit(taxonomy.invalidate)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_taxonomy_on_post_save(sender, instance, update_fields=None, **kwargs):
+    """
+    Post saves can change published counts; view count updates cannot.
+    """
+    if update_fields is not None and set(update_fields) <= {'views_count'}:
+        return
+    transaction.on_commit(taxonomy.invalidate)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_taxonomy_on_tags_change(sender, action, **kwargs):
+    """
+    Adding or removing tags changes the published count of those tags.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(taxonomy.invalidate)
+
+
+@receiver(events.posts_changed)
+@receiver(events.comments_changed)
+def invalidate_cached_pages(sender, **kwargs):
+    """
+    Start a new content generation so listing pages get fresh validators.
+    """
+    caching.bump_content_generation()
+
+
+@receiver(events.posts_changed)
+def queue_related_posts_update(sender, post_ids, **kwargs):
+    """
+    Queue changed posts for related.process_pending (rebuild_related --pending),
+    which recomputes their lists and the lists of the posts listing them.
+    """
+    RelatedUpdate.objects.bulk_create([RelatedUpdate(post_id=post_id) for post_id in set(post_ids)])
+
+
+@receiver(events.posts_changed)
+def queue_static_pages_for_posts(sender, post_ids, **kwargs):
+    """
+    Queue the pre-rendered pages showing changed posts for
+    static_pages.process_pending (build_static --pending).
+    """
+    if settings.STATIC_PAGES_ENABLED:
+        StaticPageUpdate.objects.bulk_create([StaticPageUpdate(kind='post', object_id=pk) for pk in set(post_ids)])
+
+
+@receiver(events.comments_changed)
+def queue_static_pages_for_comments(sender, post_ids, **kwargs):
+    """
+    Queue the pre-rendered pages of posts whose comments changed.
+    """
+    if settings.STATIC_PAGES_ENABLED:
+        StaticPageUpdate.objects.bulk_create([
+            StaticPageUpdate(kind='comments', object_id=pk) for pk in set(post_ids)
+        ])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def queue_static_pages_for_taxonomy(sender, instance, **kwargs):
+    """
+    Queue the pages of a saved or deleted category or tag, the posts showing
+    it and the category and tag indexes.
+    """
+    if settings.STATIC_PAGES_ENABLED:
+        StaticPageUpdate.objects.create(kind=sender._meta.model_name, object_id=instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def update_author_stats_on_post_save(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Move the post's share of the author stats from its previous author and
+    status to its current ones.
+    """
+    if update_fields is not None and not {'status', 'author', 'views_count'} & set(update_fields):
+        return
+    previous = None
+    if not created and instance._old_author_id is not None:
+        previous = (instance._old_author_id, instance._old_status, instance._old_views_count)
+    authors.post_saved(instance, previous)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_author_stats_before_delete(sender, instance, **kwargs):
+    """
+    The instance being deleted may be stale (e.g. after a bulk status
+    change), so read the stored author, status and views.
+    """
+    instance._stored_stats = Post.objects.filter(pk=instance.pk).values_list(
+        'author_id', 'status', 'views_count'
+    ).first()
+
+
+@receiver(post_delete, sender=Post)
+def update_author_stats_on_post_delete(sender, instance, **kwargs):
+    """
+    A deleted post no longer counts for its author.
+    """
+    if getattr(instance, '_stored_stats', None):
+        authors.post_deleted(instance._stored_stats)
+
+
+@receiver(pre_save, sender=Comment)
+def track_comment_approval(sender, instance, **kwargs):
+    """
+    Remember whether the comment was approved before this save.
+    """
+    instance._was_approved = bool(
+        instance.pk and Comment.objects.filter(pk=instance.pk, is_approved=True).exists()
+    )
+
+
+@receiver(post_save, sender=Comment)
+def update_author_stats_on_comment_save(sender, instance, **kwargs):
+    """
+    Approving or unapproving a comment changes its post author's total.
+    """
+    was_approved = getattr(instance, '_was_approved', False)
+    if instance.is_approved != was_approved:
+        authors.comment_approval_changed(instance.post_id, 1 if instance.is_approved else -1)
+
+
+@receiver(post_delete, sender=Comment)
+def update_author_stats_on_comment_delete(sender, instance, **kwargs):
+    """
+    Deleted approved comments leave their post author's total, also when they
+    go with their post (comments are deleted first).
+    """
+    if instance.is_approved:
+        authors.comment_approval_changed(instance.post_id, -1)
+
+
+@receiver(events.posts_changed)
+def invalidate_feeds(sender, **kwargs):
+    """
+    Published posts changed, so cached feed bodies are stale.
+    """
+    feeds.invalidate()
+
+
+@receiver(events.posts_changed)
+def update_sitemaps_for_posts(sender, post_ids, **kwargs):
+    """
+    Mark the sitemap shards holding the changed posts as stale; they are
+    regenerated by build_sitemaps --pending.
+    """
+    sitemaps.update_posts(post_ids)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def update_sitemaps_for_taxonomy(sender, **kwargs):
+    """
+    Mark the category and tag sitemap shards as stale once the change is committed.
+    """
+    transaction.on_commit(sitemaps.update_taxonomy)
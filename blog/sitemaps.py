@@ -0,0 +1,344 @@
+"""
+Sharded, precompressed sitemaps.
+
+Published posts, and categories and tags that have published posts, are
+listed in gzip-compressed sitemap files under ``SITEMAP_ROOT``. Each section
+is split into shards by primary key range: shard ``n`` of a section holds the
+rows with ``n * SITEMAP_SHARD_SIZE <= pk < (n + 1) * SITEMAP_SHARD_SIZE``, so
+it never exceeds the protocol's 50,000 URL limit, and a changed post always
+maps to the same single shard.
+
+    sitemap.xml.gz             index of every shard
+    posts-<n>.xml.gz           one shard
+    posts-<n>.lastmod          newest lastmod in that shard, for the index
+
+Shards are written row by row from a server-side iterator through a gzip
+stream, in constant memory, and swapped into place atomically. They are
+served as stored to clients that accept gzip and decompressed on the fly for
+the rest.
+
+``build()`` regenerates everything. Saving or deleting posts, categories
+and tags doesn't write sitemap files. ``update_posts()`` and
+``update_taxonomy()`` (driven by blog events) only leave a ``<shard>.dirty``
+marker for the shards holding the changed posts. Taxonomy shards get one
+marker between them, since their membership depends on published counts.
+``refresh()`` regenerates the marked shards and the index. It also builds
+the whole sitemap if it was never built. It runs from cron or a worker with
+``manage.py build_sitemaps --pending``, never in a request: the views only
+serve the files on disk. However many edits happen between two runs, each
+shard is written once. Runs hold an exclusive lock on ``SITEMAP_ROOT/.lock``,
+so overlapping runs on the same disk don't write the same shards.
+"""
+import fcntl
+import gzip
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .models import Category, Post, Tag
+from .streaming import file_chunks, is_asgi, streaming_response
+
+INDEX = 'sitemap.xml.gz'
+SHARD_SUFFIX = '.xml.gz'
+LASTMOD_SUFFIX = '.lastmod'
+DIRTY_SUFFIX = '.dirty'
+TAXONOMY = 'taxonomy'
+LOCK = '.lock'
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+class Section:
+    """One kind of URL in the sitemap"""
+
+    def __init__(self, name, model, url_name, filters, lastmod_field=None):
+        self.name = name
+        self.model = model
+        self.url_name = url_name
+        self.filters = filters
+        self.lastmod_field = lastmod_field
+
+    def queryset(self):
+        return self.model.objects.filter(**self.filters)
+
+    def rows(self, shard):
+        """Yield (path, lastmod) for every row of a shard, streamed from the database"""
+        size = shard_size()
+        fields = ['slug'] + ([self.lastmod_field] if self.lastmod_field else [])
+        rows = self.queryset().filter(
+            pk__gte=shard * size, pk__lt=(shard + 1) * size
+        ).order_by('pk').values_list(*fields).iterator(chunk_size=2000)
+        for row in rows:
+            yield reverse(self.url_name, kwargs={'slug': row[0]}), row[1] if self.lastmod_field else None
+
+    def shards(self):
+        """Every shard number that may hold rows of this section"""
+        bounds = self.queryset().aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            return range(0)
+        return range(bounds['low'] // shard_size(), bounds['high'] // shard_size() + 1)
+
+
+SECTIONS = {
+    'posts': Section('posts', Post, 'blog:post_detail', {'status': 'published'}, 'updated_at'),
+    'categories': Section('categories', Category, 'blog:category_detail', {'post_count__gt': 0}, 'updated_at'),
+    'tags': Section('tags', Tag, 'blog:tag_detail', {'post_count__gt': 0}),
+}
+
+
+def root():
+    return Path(settings.SITEMAP_ROOT)
+
+
+def shard_size():
+    return getattr(settings, 'SITEMAP_SHARD_SIZE', 50000)
+
+
+def base_url():
+    return settings.SITEMAP_BASE_URL.rstrip('/')
+
+
+def _atomic_gzip(target):
+    """Open a temporary gzip file next to ``target``; returns (file, temp path)"""
+    fd, tmp = tempfile.mkstemp(dir=target.parent, suffix='.tmp')
+    # mtime=0 keeps the output byte-identical for identical content
+    return gzip.GzipFile(fileobj=os.fdopen(fd, 'wb'), mode='wb', mtime=0), tmp
+
+
+def _close(handle):
+    fileobj = handle.fileobj
+    handle.close()
+    fileobj.close()
+
+
+def write_shard(section, shard):
+    """Regenerate one shard; returns the number of URLs written (0 removes it)"""
+    target = root() / f'{section.name}-{shard}{SHARD_SUFFIX}'
+    lastmod_file = target.with_name(f'{section.name}-{shard}{LASTMOD_SUFFIX}')
+    handle, tmp = _atomic_gzip(target)
+    count, newest = 0, None
+    prefix = base_url()
+    try:
+        handle.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{XMLNS}">\n'.encode())
+        for path, lastmod in section.rows(shard):
+            entry = f'<url><loc>{escape(prefix + path)}</loc>'
+            if lastmod is not None:
+                entry += f'<lastmod>{lastmod.isoformat()}</lastmod>'
+                newest = lastmod if newest is None else max(newest, lastmod)
+            handle.write((entry + '</url>\n').encode())
+            count += 1
+        handle.write(b'</urlset>\n')
+    finally:
+        _close(handle)
+
+    if not count:
+        os.unlink(tmp)
+        target.unlink(missing_ok=True)
+        lastmod_file.unlink(missing_ok=True)
+        return 0
+    os.replace(tmp, target)
+    lastmod_file.write_text(newest.isoformat() if newest else '')
+    return count
+
+
+def write_index():
+    """Rebuild the sitemap index from the shard files on disk"""
+    target = root() / INDEX
+    handle, tmp = _atomic_gzip(target)
+    prefix = base_url()
+    try:
+        handle.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{XMLNS}">\n'.encode())
+        for shard in sorted(root().glob(f'*{SHARD_SUFFIX}')):
+            if shard.name == INDEX:
+                continue
+            name = shard.name[:-len(SHARD_SUFFIX)]
+            loc = prefix + reverse('blog:sitemap_shard', kwargs={'name': name})
+            entry = f'<sitemap><loc>{escape(loc)}</loc>'
+            lastmod_file = shard.with_name(name + LASTMOD_SUFFIX)
+            lastmod = lastmod_file.read_text() if lastmod_file.exists() else ''
+            if lastmod:
+                entry += f'<lastmod>{lastmod}</lastmod>'
+            handle.write((entry + '</sitemap>\n').encode())
+        handle.write(b'</sitemapindex>\n')
+    finally:
+        _close(handle)
+    os.replace(tmp, target)
+
+
+def build(progress=None):
+    """Regenerate every shard and the index; returns the number of URLs"""
+    root().mkdir(parents=True, exist_ok=True)
+    # Everything is rewritten, including whatever was marked meanwhile
+    for marker in root().glob(f'*{DIRTY_SUFFIX}'):
+        marker.unlink(missing_ok=True)
+    total, written = 0, set()
+    for section in SECTIONS.values():
+        for shard in section.shards():
+            count = write_shard(section, shard)
+            total += count
+            if count:
+                written.add(f'{section.name}-{shard}')
+                if progress:
+                    progress(section.name, shard, count)
+    # Drop shards whose rows have all gone
+    for stale in root().glob(f'*{SHARD_SUFFIX}'):
+        name = stale.name[:-len(SHARD_SUFFIX)]
+        if stale.name != INDEX and name not in written:
+            stale.unlink(missing_ok=True)
+            stale.with_name(name + LASTMOD_SUFFIX).unlink(missing_ok=True)
+    write_index()
+    return total
+
+
+def _mark(name):
+    # Before the first build there is nothing to update: refresh() builds it all
+    if root().exists():
+        (root() / (name + DIRTY_SUFFIX)).touch()
+
+
+def update_posts(post_ids):
+    """Mark the shards holding the given posts, and the taxonomy shards, as stale"""
+    size = shard_size()
+    for shard in {post_id // size for post_id in post_ids}:
+        _mark(f'posts-{shard}')
+    _mark(TAXONOMY)
+
+
+def update_taxonomy():
+    """Mark the category and tag shards as stale"""
+    _mark(TAXONOMY)
+
+
+def _write_taxonomy():
+    for name in ('categories', 'tags'):
+        section = SECTIONS[name]
+        shards = set(section.shards())
+        # Also revisit shards on disk that may now be empty
+        for existing in root().glob(f'{name}-*{SHARD_SUFFIX}'):
+            shards.add(int(existing.name[len(name) + 1:-len(SHARD_SUFFIX)]))
+        for shard in sorted(shards):
+            write_shard(section, shard)
+
+
+def pending():
+    """Names of the shards marked as stale"""
+    return sorted(marker.name[:-len(DIRTY_SUFFIX)] for marker in root().glob(f'*{DIRTY_SUFFIX}'))
+
+
+@contextmanager
+def lock():
+    """Yield True with SITEMAP_ROOT locked, or False when another process holds the lock"""
+    root().mkdir(parents=True, exist_ok=True)
+    with open(root() / LOCK, 'w') as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def refresh():
+    """
+    Build the sitemap if it was never built, otherwise regenerate the shards
+    marked as stale. Returns the names regenerated ('*' for a full build), or
+    None when another process is already at it.
+    """
+    with lock() as locked:
+        if not locked:
+            return None
+        # Read under the lock: a run that just finished has cleared its markers
+        if not (root() / INDEX).exists():
+            build()
+            return ['*']
+        names = pending()
+        for name in names:
+            # Dropped first, so a change made while writing marks it again
+            (root() / (name + DIRTY_SUFFIX)).unlink(missing_ok=True)
+            if name == TAXONOMY:
+                _write_taxonomy()
+            else:
+                section, shard = name.rsplit('-', 1)
+                write_shard(SECTIONS[section], int(shard))
+        if names:
+            write_index()
+        return names
+
+
+def _decompressed(path, chunk_size=64 * 1024):
+    with gzip.open(path, 'rb') as handle:
+        while chunk := handle.read(chunk_size):
+            yield chunk
+
+
+def accepts_gzip(request):
+    """Whether Accept-Encoding allows gzip, honouring q-values (``gzip;q=0`` refuses it)"""
+    qualities = {}
+    for coding in request.headers.get('Accept-Encoding', '').split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.lower()] = quality
+    for name in ('gzip', 'x-gzip', '*'):
+        if name in qualities:
+            return qualities[name] > 0
+    return False
+
+
+def sitemap_view(request, name=None):
+    """Serve the sitemap index or one shard as stored in SITEMAP_ROOT"""
+    path = root() / (INDEX if name is None else name + SHARD_SUFFIX)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        if name is None:
+            # build_sitemaps hasn't run yet, e.g. on a fresh deployment volume
+            response = HttpResponse('The sitemap is being generated.', status=503, content_type='text/plain')
+            response.headers['Retry-After'] = '600'
+            return response
+        raise Http404('No such sitemap')
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        if not accepts_gzip(request):
+            response = streaming_response(request, _decompressed(path), content_type='application/xml')
+        else:
+            if is_asgi(request):
+                response = streaming_response(request, file_chunks(path), content_type='application/xml')
+                response.headers['Content-Length'] = str(stat.st_size)
+            else:
+                response = FileResponse(path.open('rb'), content_type='application/xml')
+                # Served inline as XML: the .gz file name is only how it's stored
+                response.headers.pop('Content-Disposition', None)
+            response.headers['Content-Encoding'] = 'gzip'
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'HTTP_CACHE_SHARED_MAX_AGE', 60))
+    return response
+
+
+def robots_txt(request):
+    """Point crawlers at the sitemap index"""
+    return HttpResponse(
+        f"User-agent: *\nDisallow: /admin/\n\nSitemap: {base_url()}{reverse('blog:sitemap')}\n",
+        content_type='text/plain',
+    )
@@ -0,0 +1,418 @@
+"""
+Static pre-rendering of public pages.
+
+Anonymous visitors all see the same published content, so their pages can be
+rendered once to HTML files under ``STATIC_PAGES_ROOT``. The files are then
+served by ``StaticPageMiddleware`` (or directly by a web server) without
+touching the ORM or the template engine.
+
+Layout (``<path>`` is the URL path without its leading slash):
+
+    <path>/index.html          first page of a URL
+    <path>/page-<n>.html       ?page=<n> of a paginated listing
+
+``build_site()`` renders everything. Later changes are not rendered in the
+request that makes them: the blog signals queue them as ``StaticPageUpdate``
+rows, and ``process_pending()`` (``build_static --pending``, run from cron or
+a worker) re-renders only the pages they affect. The manifest records, for
+every post on disk, its publication time and the listings it appears on, so
+a post that stays where it was re-renders one page per listing, and only a
+post that entered, left or moved within a listing re-renders the pages after
+it.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Max
+from django.http import FileResponse, HttpRequest, HttpResponse, QueryDict
+from django.urls import resolve, reverse
+from django.utils.cache import patch_cache_control
+
+from .models import Category, Post, StaticPageUpdate, Tag
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 10
+MANIFEST = '.manifest.json'
+PAGE_PARAM = re.compile(r'^page=(\d+)$')
+# Listing keys; categories and tags are 'category:<id>' and 'tag:<id>'
+HOME = 'home'
+POST_LIST = 'posts'
+
+
+def root():
+    return Path(settings.STATIC_PAGES_ROOT)
+
+
+def file_for(path, page=1, base=None):
+    """Return the file a URL path (and listing page) is stored in"""
+    directory = (base or root()) / path.strip('/')
+    return directory / ('index.html' if page == 1 else f'page-{page}.html')
+
+
+def render(path, page=1):
+    """Render a URL as an anonymous visitor would see it; None if not a 200"""
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.META['HTTP_HOST'] = settings.STATIC_PAGES_HOST
+    request.META['SERVER_PORT'] = '443'
+    request.GET = QueryDict(f'page={page}' if page > 1 else '')
+    request.user = AnonymousUser()
+    request.auser = _anonymous_user
+    # Tells views not to count the render as a visit
+    request.is_prerender = True
+    match = resolve(path)
+    response = match.func(request, *match.args, **match.kwargs)
+    if asyncio.iscoroutine(response):
+        # An async view (BLOG_ASYNC_VIEWS)
+        response = async_to_sync(_await)(response)
+    if response.status_code != 200:
+        return None
+    if hasattr(response, 'render'):
+        response.render()
+    return response.content
+
+
+async def _anonymous_user():
+    return AnonymousUser()
+
+
+async def _await(coroutine):
+    return await coroutine
+
+
+def write(path, page, content, base=None):
+    """Atomically write (or remove, when content is None) one page"""
+    target = file_for(path, page, base)
+    if content is None:
+        target.unlink(missing_ok=True)
+        return
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=target.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as handle:
+        handle.write(content)
+    os.replace(tmp, target)
+
+
+def _listing_keys(post):
+    """Keys of the listings a published post appears on"""
+    keys = [HOME, POST_LIST]
+    if post.category_id:
+        keys.append(f'category:{post.category_id}')
+    keys += [f'tag:{tag.pk}' for tag in post.tags.all()]
+    return keys
+
+
+def _listing_path(key):
+    """URL path of a listing, or None when its category or tag is gone"""
+    if key == HOME:
+        return reverse('blog:home')
+    if key == POST_LIST:
+        return reverse('blog:post_list')
+    kind, pk = key.split(':')
+    model = Category if kind == 'category' else Tag
+    instance = model.objects.filter(pk=pk).only('slug').first()
+    return instance.get_absolute_url() if instance else None
+
+
+def _listing_queryset(key):
+    published = Post.objects.filter(status='published')
+    if key in (HOME, POST_LIST):
+        return published
+    kind, pk = key.split(':')
+    return published.filter(category_id=pk) if kind == 'category' else published.filter(tags=pk)
+
+
+def _all_listings():
+    """Yield (listing key, URL path) for every listing"""
+    yield HOME, reverse('blog:home')
+    yield POST_LIST, reverse('blog:post_list')
+    for category in Category.objects.only('pk', 'slug'):
+        yield f'category:{category.pk}', category.get_absolute_url()
+    for tag in Tag.objects.only('pk', 'slug'):
+        yield f'tag:{tag.pk}', tag.get_absolute_url()
+
+
+def _page_of(queryset, published_at):
+    """The listing page a post published at ``published_at`` is (or was) on"""
+    if published_at is None:
+        return 1
+    return queryset.filter(published_at__gt=published_at).count() // PAGE_SIZE + 1
+
+
+def _entry(post, path):
+    """The manifest entry of a published post"""
+    return {
+        'path': path,
+        'published_at': post.published_at.isoformat() if post.published_at else None,
+        'listings': _listing_keys(post),
+    }
+
+
+def render_listing(path, queryset, first_page=1, last_page=None, base=None):
+    """Render pages first_page..last_page of a listing and drop pages past its end"""
+    num_pages = Paginator(queryset.order_by('-published_at'), PAGE_SIZE).num_pages
+    last_page = min(last_page or num_pages, num_pages)
+    for page in range(first_page, last_page + 1):
+        write(path, page, render(path, page), base)
+    # Remove pages that no longer exist after posts were unpublished
+    directory = file_for(path, base=base).parent
+    if directory.exists():
+        for stale in directory.glob('page-*.html'):
+            if int(stale.stem.split('-')[1]) > num_pages:
+                stale.unlink(missing_ok=True)
+
+
+def remove_listing(path):
+    """Remove every page of a listing"""
+    directory = file_for(path).parent
+    for page in [directory / 'index.html', *directory.glob('page-*.html')]:
+        page.unlink(missing_ok=True)
+
+
+def _load_manifest():
+    """
+    Return what is on disk: {'posts': {post id: entry}, 'listings': {listing
+    key: URL path}}, where a post's entry is its URL path, publication time
+    and listing keys
+    """
+    try:
+        manifest = json.loads((root() / MANIFEST).read_text())
+    except (OSError, ValueError):
+        manifest = {}
+    manifest.setdefault('posts', {})
+    manifest.setdefault('listings', {})
+    return manifest
+
+
+def _save_manifest(manifest, base=None):
+    base = base or root()
+    base.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=base, suffix='.tmp')
+    with os.fdopen(fd, 'w') as handle:
+        json.dump(manifest, handle)
+    os.replace(tmp, base / MANIFEST)
+
+
+def build_site(progress=None):
+    """Render every public page from scratch into a fresh STATIC_PAGES_ROOT"""
+    target = root()
+    staging = target.with_name(target.name + '.building')
+    shutil.rmtree(staging, ignore_errors=True)
+    # Changes queued so far are part of this build
+    queued = StaticPageUpdate.objects.aggregate(last=Max('pk'))['last']
+    manifest, count = {'posts': {}, 'listings': {}}, 0
+    posts = Post.objects.filter(status='published').only('pk', 'slug', 'category_id', 'published_at')
+    for post in posts.prefetch_related('tags').iterator(chunk_size=500):
+        path = post.get_absolute_url()
+        write(path, 1, render(path), staging)
+        manifest['posts'][str(post.pk)] = _entry(post, path)
+        count += 1
+        if progress:
+            progress(path)
+    for key, path in _all_listings():
+        render_listing(path, _listing_queryset(key), base=staging)
+        manifest['listings'][key] = path
+        count += 1
+        if progress:
+            progress(path)
+    for path in (reverse('blog:category_list'), reverse('blog:tag_list')):
+        write(path, 1, render(path), staging)
+        count += 1
+    _save_manifest(manifest, staging)
+    # Swap the finished tree into place
+    old = target.with_name(target.name + '.old')
+    shutil.rmtree(old, ignore_errors=True)
+    if target.exists():
+        target.rename(old)
+    staging.rename(target)
+    shutil.rmtree(old, ignore_errors=True)
+    if queued is not None:
+        StaticPageUpdate.objects.filter(pk__lte=queued).delete()
+    return count
+
+
+def process_pending():
+    """
+    Re-render the pages affected by the queued changes. Returns the number of
+    queued changes processed.
+    """
+    if not root().exists():
+        # Nothing to update: build_site() renders the current state anyway
+        StaticPageUpdate.objects.all().delete()
+        return 0
+    with transaction.atomic():
+        # Locked, so concurrent runs take turns instead of both rewriting the manifest
+        queued = list(StaticPageUpdate.objects.select_for_update().values_list('pk', 'kind', 'object_id'))
+        if not queued:
+            return 0
+        ids = defaultdict(set)
+        for _, kind, object_id in queued:
+            ids[kind].add(object_id)
+        _update(ids)
+        # Only the rows read: changes queued meanwhile wait for the next run
+        StaticPageUpdate.objects.filter(pk__in=[pk for pk, _, _ in queued]).delete()
+    return len(queued)
+
+
+def _update(ids):
+    """Apply queued changes, given as {StaticPageUpdate kind: object ids}"""
+    manifest = _load_manifest()
+    pages = defaultdict(set)    # listing key -> pages showing changed content
+    from_page = {}              # listing key -> first page whose posts shifted
+    lists = False               # whether the category and tag indexes changed
+
+    for kind in ('category', 'tag'):
+        for pk in ids[kind]:
+            key = f'{kind}:{pk}'
+            old_path = manifest['listings'].pop(key, None)
+            path = _listing_path(key)
+            if old_path and old_path != path:
+                remove_listing(old_path)
+            if path:
+                from_page[key] = 1
+            # Its posts show its name and link to it
+            ids['post'].update(
+                int(post_id) for post_id, entry in manifest['posts'].items() if key in entry['listings']
+            )
+            lists = True
+
+    posts = Post.objects.filter(
+        pk__in=ids['post'] | ids['comments'] | ids['related'], status='published'
+    ).prefetch_related('tags').in_bulk()
+
+    for post_id in ids['post']:
+        old = manifest['posts'].pop(str(post_id), None)
+        post = posts.get(post_id)
+        path = post.get_absolute_url() if post else None
+        if old and old['path'] != path:
+            write(old['path'], 1, None)
+        new = None
+        if post:
+            write(path, 1, render(path))
+            new = manifest['posts'][str(post_id)] = _entry(post, path)
+        old_keys = set(old['listings']) if old else set()
+        new_keys = set(new['listings']) if new else set()
+        for key in old_keys | new_keys:
+            queryset = _listing_queryset(key)
+            if key in old_keys and key in new_keys and old['published_at'] == new['published_at']:
+                # Still in the same place: only its own page changed
+                pages[key].add(_page_of(queryset, post.published_at))
+                continue
+            # Entered, left or moved: every later post shifts
+            first = min(
+                _page_of(queryset, entry['published_at'] and datetime.fromisoformat(entry['published_at']))
+                for entry in (old, new) if entry and key in entry['listings']
+            )
+            from_page[key] = min(first, from_page.get(key, first))
+            if key not in (HOME, POST_LIST):
+                lists = True
+
+    for post_id in (ids['comments'] | ids['related']) - ids['post']:
+        post = posts.get(post_id)
+        entry = manifest['posts'].get(str(post_id))
+        if not post or not entry:
+            continue
+        write(entry['path'], 1, render(entry['path']))
+        if post_id in ids['comments']:
+            # Comment counts; the home page shows none
+            for key in set(entry['listings']) - {HOME}:
+                pages[key].add(_page_of(_listing_queryset(key), post.published_at))
+
+    for key in set(pages) | set(from_page):
+        path = _listing_path(key)
+        if path is None:
+            # Deleted; its pages were removed above
+            continue
+        manifest['listings'][key] = path
+        queryset = _listing_queryset(key)
+        first = from_page.get(key)
+        if first is not None:
+            render_listing(path, queryset, first)
+        for page in sorted(pages[key]):
+            if first is None or page < first:
+                render_listing(path, queryset, page, page)
+
+    if lists:
+        for path in (reverse('blog:category_list'), reverse('blog:tag_list')):
+            write(path, 1, render(path))
+    _save_manifest(manifest)
+
+
+class StaticPageMiddleware:
+    """
+    Serve pre-rendered pages to anonymous visitors.
+
+    Only plain GET/HEAD requests without a session or flash-message cookie
+    (and with no query string other than ``page=<n>``) are answered from
+    STATIC_PAGES_ROOT; everything else, and any page without a file, falls
+    through to the regular views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'STATIC_PAGES_ENABLED', False)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.enabled and request.method in ('GET', 'HEAD'):
+            response = self.serve(request)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.enabled and request.method in ('GET', 'HEAD'):
+            # Pages are small: read them whole rather than streaming a file
+            # through a sync iterator
+            response = self.serve(request, streaming=False)
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    def serve(self, request, streaming=True):
+        if settings.SESSION_COOKIE_NAME in request.COOKIES or 'messages' in request.COOKIES:
+            return None
+        query = request.META.get('QUERY_STRING', '')
+        page = 1
+        if query:
+            match = PAGE_PARAM.match(query)
+            if not match:
+                return None
+            page = int(match.group(1))
+        if '..' in request.path_info:
+            return None
+        target = file_for(request.path_info, page)
+        if not target.is_file():
+            return None
+        if streaming:
+            response = FileResponse(target.open('rb'), content_type='text/html; charset=utf-8')
+        else:
+            response = HttpResponse(target.read_bytes(), content_type='text/html; charset=utf-8')
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=getattr(settings, 'HTTP_CACHE_MAX_AGE', 0),
+            s_maxage=getattr(settings, 'HTTP_CACHE_SHARED_MAX_AGE', 60),
+        )
+        return response
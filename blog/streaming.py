@@ -0,0 +1,51 @@
+"""
+Responses that stream under both WSGI and ASGI.
+
+Django only streams the kind of iterator that matches the server. Under ASGI,
+a sync iterator (a generator, a queryset ``iterator()``, a file) is first read
+to the end with ``sync_to_async(list)``, so the whole body sits in memory.
+Under WSGI, an async iterator is buffered the same way.
+``streaming_response()`` gives Django whichever kind the current server can
+stream. Under ASGI, the sync iterator is advanced ``BATCH`` chunks per hop to
+the sync thread, the same thread the view's database connection lives on.
+"""
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+# Chunks produced per hop to the sync thread
+BATCH = 32
+FILE_CHUNK = 64 * 1024
+
+
+def is_asgi(request):
+    return isinstance(request, ASGIRequest)
+
+
+async def aiterate(iterator, batch=BATCH):
+    """Drive a sync iterator from async code, ``batch`` chunks at a time"""
+    iterator = iter(iterator)
+    next_batch = sync_to_async(lambda: list(islice(iterator, batch)))
+    try:
+        while chunks := await next_batch():
+            for chunk in chunks:
+                yield chunk
+    finally:
+        # A client that disconnects early must not leave a cursor or file open
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close)()
+
+
+def file_chunks(path, chunk_size=FILE_CHUNK):
+    with open(path, 'rb') as handle:
+        while chunk := handle.read(chunk_size):
+            yield chunk
+
+
+def streaming_response(request, chunks, **kwargs):
+    """A StreamingHttpResponse for ``chunks`` that streams under the current server"""
+    if is_asgi(request):
+        chunks = aiterate(chunks)
+    return StreamingHttpResponse(chunks, **kwargs)
@@ -0,0 +1,122 @@
+"""
+Shared taxonomy cache.
+
+Categories and tags (with their published post counts) are identical for every
+visitor and change rarely, so each process keeps one in-memory snapshot of
+them instead of querying on every page. The snapshot is tagged with a
+generation number stored in the configured cache; signal handlers bump the
+generation whenever a category, tag or post changes, which makes every
+process rebuild its snapshot on next use. The generation expires after
+``TAXONOMY_CACHE_TTL`` seconds, which bounds how long a snapshot can be reused
+when the cache is process-local.
+
+The published post counts themselves are materialized on ``Category.post_count``
+and ``Tag.post_count``. Signal handlers keep them current incrementally with
+``adjust_category_counts``/``adjust_tag_counts``; ``recount`` rebuilds them from
+scratch in a single UPDATE per model.
+"""
+import threading
+
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from . import caching
+from .models import Category, Post, Tag
+
+GENERATION_KEY = 'blog:taxonomy:generation'
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+class TaxonomySnapshot:
+    """Immutable view of all categories and tags at a given generation"""
+
+    def __init__(self, generation, categories, tags):
+        self.generation = generation
+        self.categories = categories
+        self.tags = tags
+
+    def category_choices(self):
+        return [(category.pk, category.name) for category in self.categories]
+
+    def tag_choices(self):
+        return [(tag.pk, tag.name) for tag in self.tags]
+
+
+def current_generation():
+    """Return the current taxonomy generation, initialising it if needed"""
+    return caching.current_generation(GENERATION_KEY, getattr(settings, 'TAXONOMY_CACHE_TTL', 300))
+
+
+def invalidate():
+    """Discard every process's snapshot by moving to a new generation"""
+    global _snapshot
+    caching.bump_generation(GENERATION_KEY, getattr(settings, 'TAXONOMY_CACHE_TTL', 300))
+    _snapshot = None
+
+
+def _build(generation):
+    categories = list(Category.objects.order_by('name'))
+    tags = list(Tag.objects.order_by('name'))
+    return TaxonomySnapshot(generation, categories, tags)
+
+
+def get_snapshot():
+    """Return an up-to-date TaxonomySnapshot, rebuilding it only when stale"""
+    global _snapshot
+    generation = current_generation()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.generation != generation:
+        with _lock:
+            snapshot = _snapshot
+            if snapshot is None or snapshot.generation != generation:
+                snapshot = _snapshot = _build(generation)
+    return snapshot
+
+
+def _adjust(model, deltas):
+    """Apply {pk: delta} to model.post_count with one UPDATE per distinct delta"""
+    by_delta = {}
+    for pk, delta in deltas.items():
+        if pk is not None and delta:
+            by_delta.setdefault(delta, []).append(pk)
+    for delta, pks in by_delta.items():
+        model.objects.filter(pk__in=pks).update(
+            post_count=Greatest(F('post_count') + delta, Value(0))
+        )
+
+
+def adjust_category_counts(deltas):
+    """Apply published post count changes, given as {category_id: delta}"""
+    _adjust(Category, deltas)
+
+
+def adjust_tag_counts(deltas):
+    """Apply published post count changes, given as {tag_id: delta}"""
+    _adjust(Tag, deltas)
+
+
+def recount(category_ids=None, tag_ids=None):
+    """
+    Recompute published post counts from the posts table.
+
+    With no arguments every category and tag is recounted; otherwise only the
+    given ids are (pass an empty list to skip a model entirely).
+    """
+    category_counts = Post.objects.filter(
+        category=OuterRef('pk'), status='published'
+    ).values('category').annotate(total=Count('pk')).values('total')
+    categories = Category.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(pk__in=category_ids)
+    categories.update(post_count=Coalesce(Subquery(category_counts), 0))
+
+    tag_counts = Post.tags.through.objects.filter(
+        tag=OuterRef('pk'), post__status='published'
+    ).values('tag').annotate(total=Count('pk')).values('total')
+    tags = Tag.objects.all()
+    if tag_ids is not None:
+        tags = tags.filter(pk__in=tag_ids)
+    tags.update(post_count=Coalesce(Subquery(tag_counts), 0))
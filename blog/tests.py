@@ -1,3 +1,1414 @@
-from django.test import TestCase
+import gzip
+import importlib
+import io
+import os
+import runpy
+import shutil
+import sqlite3
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.paginator import InvalidPage
+from django.db import connections
+from django.db.models.signals import post_delete, pre_save
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve
+from django.utils import timezone
+from django.utils.http import urlsafe_base64_encode
+
+from advanced_blog import db_routers, ratelimit, templating, warmup
+from advanced_blog import urls as project_urls
+
+from . import (
+    analytics, async_views, authors, buffers, bulk, duplicates, events, moderation, popularity, related, revisions,
+    scheduler, sitemaps, static_pages, taxonomy, views,
+)
+from . import urls as blog_urls
+from .management.commands import bench_sqlite
+from .models import (
+    AnalyticsEvent, AuthorStats, Category, Comment, Post, PostDailyStats, PostPopularity, PostRevision,
+    PostViewBucket, RelatedPost, RelatedUpdate, RelatedVector, StaticPageUpdate, Tag,
+)
+from .paginators import EstimatedCountPaginator, KeysetPaginator
+
+User = get_user_model()
+
+
+# Notifications run inline, so no worker thread touches the test database
+@override_settings(NOTIFICATION_WORKERS=0)
+class BlogTestCase(TestCase):
+    """An admin, an author, a reader and one published, categorized and tagged post"""
+
+    password = 'pw12345!'
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            'admin', 'admin@example.com', self.password, role='Admin', is_staff=True, is_superuser=True
+        )
+        self.author = User.objects.create_user('author', 'author@example.com', self.password, role='Author')
+        self.reader = User.objects.create_user('reader', 'reader@example.com', self.password, role='Reader')
+        self.category = Category.objects.create(name='Tech')
+        self.tag = Tag.objects.create(name='Python')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post = Post.objects.create(
+                title='Hello', content='<p>World</p>', author=self.author, category=self.category, status='published'
+            )
+            self.post.tags.add(self.tag)
+
+    def login(self, user):
+        self.client.login(username=user.username, password=self.password)
+
+
+class StaticPagesTests(BlogTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.root = Path(self.directory) / 'site'
+        self.settings_override = override_settings(
+            STATIC_PAGES_ENABLED=True, STATIC_PAGES_ROOT=self.root, STATIC_PAGES_HOST='testserver'
+        )
+        self.settings_override.enable()
+        super().setUp()
+        call_command('build_static', stdout=io.StringIO())
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory)
+
+    def test_pages_are_served_from_disk(self):
+        response = self.client.get('/posts/hello/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn(b'World', b''.join(response.streaming_content))
+
+    def test_deleting_a_post_removes_its_page_and_listing_entries(self):
+        page = self.root / 'posts' / 'hello' / 'index.html'
+        self.assertTrue(page.exists())
+        for listing in ('index.html', 'category/tech/index.html', 'tag/python/index.html'):
+            self.assertIn(b'/posts/hello/', (self.root / listing).read_bytes(), listing)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.delete()
+        self.process_pending()
+
+        self.assertFalse(page.exists())
+        self.assertEqual(self.client.get('/posts/hello/').status_code, 404)
+        for listing in ('index.html', 'category/tech/index.html', 'tag/python/index.html'):
+            self.assertNotIn(b'/posts/hello/', (self.root / listing).read_bytes(), listing)
+
+    def process_pending(self):
+        """Run build_static --pending and return the (path, page) of every render"""
+        with mock.patch('blog.static_pages.render', wraps=static_pages.render) as render:
+            call_command('build_static', '--pending', stdout=io.StringIO())
+        return [(call.args[0], call.args[1] if len(call.args) > 1 else 1) for call in render.call_args_list]
+
+    def test_changes_are_rendered_from_the_queue(self):
+        page = self.root / 'posts' / 'hello' / 'index.html'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Hello again'
+            self.post.save()
+        self.assertNotIn(b'Hello again', page.read_bytes())
+        self.assertTrue(StaticPageUpdate.objects.exists())
+        self.process_pending()
+        self.assertIn(b'Hello again', page.read_bytes())
+        self.assertFalse(StaticPageUpdate.objects.exists())
+
+    def test_edits_render_only_the_pages_showing_the_post(self):
+        # self.post becomes the oldest of 25, on page 3 of the full listings
+        Post.objects.bulk_create([
+            Post(
+                title=f'Post {n}', slug=f'post-{n}', content='<p>x</p>', author=self.author, status='published',
+                published_at=self.post.published_at + timedelta(minutes=n),
+            )
+            for n in range(1, 25)
+        ])
+        call_command('build_static', stdout=io.StringIO())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Hello again'
+            self.post.save()
+        self.assertCountEqual(self.process_pending(), [
+            ('/posts/hello/', 1), ('/', 3), ('/posts/', 3), ('/category/tech/', 1), ('/tag/python/', 1),
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.reader, content='Nice', is_approved=True)
+        self.assertCountEqual(self.process_pending(), [
+            ('/posts/hello/', 1), ('/posts/', 3), ('/category/tech/', 1), ('/tag/python/', 1),
+        ])
+
+        # Unpublishing the newest post shifts every page of the full listings
+        with self.captureOnCommitCallbacks(execute=True):
+            newest = Post.objects.get(slug='post-24')
+            newest.status = 'draft'
+            newest.save()
+        rendered = self.process_pending()
+        self.assertIn(('/posts/', 3), rendered)
+        self.assertNotIn(('/category/tech/', 1), rendered)
+        self.assertFalse((self.root / 'posts' / 'post-24' / 'index.html').exists())
+
+    def test_deleted_tags_leave_the_site(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.delete()
+        self.process_pending()
+        self.assertFalse((self.root / 'tag' / 'python' / 'index.html').exists())
+        self.assertEqual(self.client.get('/tag/python/').status_code, 404)
+        self.assertNotIn(b'/tag/python/', (self.root / 'posts' / 'hello' / 'index.html').read_bytes())
+        self.assertNotIn(b'Python', (self.root / 'tags' / 'index.html').read_bytes())
+
+    def test_renamed_categories_are_re_rendered(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Technology'
+            self.category.save()
+        self.process_pending()
+        self.assertIn(b'Technology', b''.join(self.client.get('/categories/').streaming_content))
+        for page in ('category/tech/index.html', 'posts/hello/index.html', 'index.html'):
+            self.assertIn(b'Technology', (self.root / page).read_bytes(), page)
+
+
+class SitemapTests(BlogTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.root = Path(self.directory) / 'sitemaps'
+        self.settings_override = override_settings(SITEMAP_ROOT=self.root, SITEMAP_BASE_URL='https://blog.example.com')
+        self.settings_override.enable()
+        super().setUp()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory)
+
+    def read(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return b''.join(response.streaming_content).decode()
+
+    def test_requests_never_build_the_sitemap(self):
+        response = self.client.get('/sitemap.xml')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertFalse((self.root / 'sitemap.xml.gz').exists())
+        call_command('build_sitemaps', '--pending', stdout=io.StringIO())
+        self.assertIn('/sitemaps/posts-0.xml', self.read('/sitemap.xml'))
+        self.assertIn('https://blog.example.com/posts/hello/', self.read('/sitemaps/posts-0.xml'))
+
+    def test_changes_are_written_by_the_pending_run_only(self):
+        sitemaps.build()
+        shard = self.root / 'posts-0.xml.gz'
+        before = shard.read_bytes()
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(title='Second', content='<p>x</p>', author=self.author, status='published')
+        self.assertEqual(shard.read_bytes(), before)
+        self.assertEqual(sitemaps.pending(), ['posts-0', 'taxonomy'])
+        self.assertNotIn('/posts/second/', self.read('/sitemaps/posts-0.xml'))
+        self.assertEqual(shard.read_bytes(), before)
+        call_command('build_sitemaps', '--pending', stdout=io.StringIO())
+        self.assertIn('/posts/second/', self.read('/sitemaps/posts-0.xml'))
+        self.assertEqual(sitemaps.pending(), [])
+
+    def test_overlapping_runs_skip(self):
+        sitemaps.build()
+        with sitemaps.lock() as locked:
+            self.assertTrue(locked)
+            self.assertIsNone(sitemaps.refresh())
+        self.assertEqual(sitemaps.refresh(), [])
+
+    def test_accept_encoding(self):
+        sitemaps.build()
+        for header, gzipped in (
+            ('gzip', True), ('deflate, gzip;q=0.5', True), ('*', True), ('gzip;q=0', False),
+            ('gzip; q=0.0, identity', False), ('identity', False), ('', False), ('*;q=0', False),
+        ):
+            response = self.client.get('/sitemaps/posts-0.xml', headers={'Accept-Encoding': header})
+            self.assertEqual(response.get('Content-Encoding') == 'gzip', gzipped, header)
+            self.assertNotIn('Content-Disposition', response)
+            body = b''.join(response.streaming_content)
+            self.assertIn(b'/posts/hello/', gzip.decompress(body) if gzipped else body, header)
+
+    def test_deleted_posts_leave_the_sitemap(self):
+        sitemaps.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.delete()
+        call_command('build_sitemaps', '--pending', stdout=io.StringIO())
+        self.assertFalse((self.root / 'posts-0.xml.gz').exists())
+        self.assertNotIn('posts-0', self.read('/sitemap.xml'))
+        self.assertEqual(self.client.get('/sitemaps/posts-0.xml').status_code, 404)
+
+    async def test_shards_stream_under_asgi(self):
+        await sync_to_async(sitemaps.build)()
+        for encoding in ('gzip', ''):
+            response = await self.async_client.get('/sitemaps/posts-0.xml', headers={'Accept-Encoding': encoding})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+            body = b''.join([chunk async for chunk in response])
+            if encoding:
+                self.assertEqual(int(response['Content-Length']), len(body))
+                body = gzip.decompress(body)
+            self.assertIn(b'/posts/hello/', body)
+
+
+class FeedTests(BlogTestCase):
+
+    def test_feeds(self):
+        for url in ('/feeds/rss/', '/feeds/atom/', '/feeds/json/', '/feeds/rss/category/tech/', '/feeds/atom/tag/python/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn(b'/posts/hello/', response.content, url)
+        response = self.client.get('/feeds/rss/')
+        self.assertEqual(self.client.get('/feeds/rss/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_unknown_scope_is_not_found_even_when_revalidating(self):
+        response = self.client.get('/feeds/rss/category/tech/')
+        for url in ('/feeds/rss/category/nope/', '/feeds/rss/tag/nope/', '/feeds/rss/author/nobody/'):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 404, url)
+
+    def test_archive_streams_under_wsgi(self):
+        response = self.client.get('/feeds/json/archive/')
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)
+        self.assertIn(b'/posts/hello/', b''.join(response.streaming_content))
+
+    async def test_archive_streams_under_asgi(self):
+        response = await self.async_client.get('/feeds/rss/archive/')
+        # An async iterator: Django would otherwise read the whole feed into memory first
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response])
+        self.assertIn(b'/posts/hello/', body)
+        self.assertTrue(body.rstrip().endswith(b'</rss>'))
+
+
+@override_settings(RELATED_POSTS_COUNT=2)
+class RelatedPostsTests(BlogTestCase):
+
+    def publish(self, title, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(
+                title=title, content=f'<p>{content}</p>', author=self.author, category=self.category, status='published'
+            )
+            post.tags.add(self.tag)
+        return post
+
+    def setUp(self):
+        super().setUp()
+        self.orm = self.publish('Django ORM', 'django orm queries indexes')
+        self.tips = self.publish('Django tips', 'django orm queries views')
+
+    def test_first_run_builds_the_index_in_the_database(self):
+        self.assertFalse(RelatedPost.objects.exists())
+        call_command('rebuild_related', '--pending', stdout=io.StringIO())
+        self.assertEqual(RelatedVector.objects.count(), 3)
+        self.assertFalse(RelatedUpdate.objects.exists())
+        self.assertEqual(list(self.orm.related_posts())[0], self.tips)
+
+    def test_changes_are_queued_and_applied_in_the_background(self):
+        related.rebuild()
+        queries = self.publish('Django queries', 'django orm queries indexes views')
+        self.assertNotIn(queries, list(self.orm.related_posts()))
+        self.assertEqual(related.process_pending(), 1)
+        self.assertEqual(list(self.orm.related_posts())[0], queries)
+        self.assertEqual(list(queries.related_posts())[0], self.orm)
+        self.assertEqual(related.process_pending(), 0)
+
+    @override_settings(RELATED_POSTS_COUNT=1)
+    def test_deleted_posts_leave_the_index_and_the_lists_holding_them_are_recomputed(self):
+        related.rebuild()
+        self.assertEqual(list(self.orm.related_posts()), [self.tips])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tips.delete()
+        related.process_pending()
+        self.assertFalse(RelatedVector.objects.filter(post_id=self.tips.pk).exists())
+        # The list was refilled rather than left empty
+        self.assertEqual(list(self.orm.related_posts()), [self.post])
+
+
+@override_settings(TRENDING_HALF_LIFE_HOURS=24, POPULARITY_RETENTION_DAYS=30, POPULARITY_TOP_N=10)
+class PopularityTests(BlogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.now = timezone.now()
+        self.other = Post.objects.create(
+            title='Other', content='x', author=self.author, category=Category.objects.create(name='Life'),
+            status='published',
+        )
+
+    def views(self, post, hours_ago, views):
+        popularity.add_views({(post.pk, popularity.hour_of(self.now - timedelta(hours=hours_ago))): views})
+
+    def top(self, *args):
+        return [post['title'] for post in popularity.top_posts(*args)]
+
+    def test_compute_weights_views_by_age(self):
+        self.views(self.post, 0, 8)
+        self.views(self.post, 24, 8)
+        self.views(self.post, 72, 8)
+        self.views(self.post, 24 * 40, 8)
+        self.assertEqual(popularity.compute(self.now), 1)
+        ranked = PostPopularity.objects.get(post=self.post)
+        # Each view's weight halves every 24 hours
+        self.assertAlmostEqual(ranked.trending_score, 8 + 4 + 1)
+        self.assertEqual((ranked.views_day, ranked.views_week, ranked.views_month), (8, 24, 24))
+        # Buckets past the retention are pruned
+        self.assertEqual(PostViewBucket.objects.count(), 3)
+
+    def test_top_posts(self):
+        self.views(self.post, 0, 5)
+        self.views(self.other, 0, 2)
+        self.views(self.other, 48, 10)
+        popularity.compute(self.now)
+        self.assertEqual(self.top('day'), ['Hello', 'Other'])
+        self.assertEqual(self.top('week'), ['Other', 'Hello'])
+        self.assertEqual(self.top('day', 'category', 'life'), ['Other'])
+        self.assertEqual(self.top('day', 'tag', 'python'), ['Hello'])
+
+        # Served from the cache until the next compute
+        self.post.status = 'draft'
+        self.post.save()
+        self.assertEqual(self.top('day'), ['Hello', 'Other'])
+        popularity.compute(self.now)
+        self.assertEqual(self.top('day'), ['Other'])
+
+    def test_popular_view(self):
+        self.views(self.post, 0, 5)
+        self.views(self.other, 0, 2)
+        popularity.compute(self.now)
+        response = self.client.get('/popular/day/', {'limit': 1})
+        self.assertEqual(response.json()['posts'], [{
+            'title': 'Hello', 'slug': 'hello', 'url': '/posts/hello/', 'score': 5, 'views_week': 5,
+            'published_at': response.json()['posts'][0]['published_at'],
+        }])
+        self.assertEqual(
+            self.client.get('/popular/day/', {'limit': 1}, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304
+        )
+        self.assertEqual(self.client.get('/popular/hourly/').status_code, 404)
+
+    def test_access_log_ingestion(self):
+        hour = self.now.strftime('%d/%b/%Y:%H:%M:%S +0000')
+        lines = [
+            f'1.2.3.4 - - [{hour}] "GET /posts/hello/ HTTP/1.1" 200 5120 "-" "-"',
+            f'1.2.3.4 - - [{hour}] "GET /posts/hello/?ref=feed HTTP/1.1" 304 0 "-" "-"',
+            f'1.2.3.4 - - [{hour}] "GET /posts/other/ HTTP/1.1" 404 0 "-" "-"',
+            f'1.2.3.4 - - [{hour}] "POST /posts/hello/comment/ HTTP/1.1" 302 0 "-" "-"',
+            f'1.2.3.4 - - [{hour}] "GET /posts/ HTTP/1.1" 200 0 "-" "-"',
+        ]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        log, state = Path(directory) / 'access.log', Path(directory) / 'state.json'
+        log.write_text('\n'.join(lines) + '\n')
+        with override_settings(POPULARITY_SOURCE='access_log'):
+            call_command('ingest_access_log', str(log), '--state-file', str(state), stdout=io.StringIO())
+            # Already read lines are skipped on the next run
+            call_command('ingest_access_log', str(log), '--state-file', str(state), stdout=io.StringIO())
+        self.assertEqual(list(PostViewBucket.objects.values_list('post_id', 'views')), [(self.post.pk, 2)])
+
+
+@override_settings(ANALYTICS_RAW_RETENTION_DAYS=7)
+class AnalyticsTests(BlogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Noon, so a day either way stays on its own date
+        self.now = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    def events(self, days_ago, views=0, comments=0):
+        moment = self.now - timedelta(days=days_ago)
+        AnalyticsEvent.objects.bulk_create(
+            [AnalyticsEvent(kind='view', post=self.post, occurred_at=moment) for _ in range(views)]
+            + [AnalyticsEvent(kind='comment', post=self.post, occurred_at=moment) for _ in range(comments)]
+        )
+
+    def daily(self):
+        return {
+            (self.now.date() - row.date).days: (row.views, row.comments)
+            for row in PostDailyStats.objects.filter(post=self.post)
+        }
+
+    def test_rollup_aggregates_per_day_and_prunes_old_events(self):
+        self.events(10, views=3)
+        self.events(1, views=2, comments=1)
+        self.events(0, views=1)
+        self.assertEqual(analytics.rollup(self.now), (3, 3))
+        self.assertEqual(self.daily(), {10: (3, 0), 1: (2, 1), 0: (1, 0)})
+        self.assertEqual(AnalyticsEvent.objects.count(), 4)
+
+    def test_late_events_are_counted_once(self):
+        self.events(1, views=2)
+        self.events(0, views=1)
+        analytics.rollup(self.now)
+        # Flushed late into days already rolled up
+        self.events(1, views=1)
+        self.events(0, comments=1)
+        self.assertEqual(analytics.rollup(self.now), (2, 0))
+        self.assertEqual(self.daily(), {1: (3, 0), 0: (1, 1)})
+
+    def test_events_not_rolled_up_yet_are_kept(self):
+        self.events(20, views=1)
+        analytics.rollup(self.now - timedelta(days=19))
+        self.events(15, views=4)
+        # Both are past the retention, but this run re-reads from the day
+        # before the last one rolled up (21 days ago), so none may go yet
+        self.assertEqual(analytics.rollup(self.now), (2, 0))
+        self.assertEqual(self.daily(), {20: (1, 0), 15: (4, 0)})
+        # The next run starts 16 days ago: the day-20 event goes
+        self.assertEqual(analytics.rollup(self.now), (1, 1))
+        self.assertEqual(self.daily(), {20: (1, 0), 15: (4, 0)})
+
+    def test_comments_and_dashboard_totals(self):
+        Comment.objects.create(post=self.post, author=self.reader, content='Nice')
+        self.assertEqual(AnalyticsEvent.objects.filter(kind='comment').count(), 1)
+        self.events(1, views=2)
+        call_command('rollup_analytics', stdout=io.StringIO())
+        totals = analytics.daily_totals(Post.objects.all(), 3)
+        self.assertEqual([(day['views'], day['comments']) for day in totals], [(0, 0), (2, 0), (0, 1)])
+        self.login(self.author)
+        self.assertEqual(self.client.get('/posts/stats/').status_code, 200)
+
+
+class WriteBufferTests(BlogTestCase):
+
+    def view(self):
+        self.assertEqual(self.client.get('/posts/hello/').status_code, 200)
+
+    def test_views_are_written_straight_away_outside_servers(self):
+        self.view()
+        self.assertEqual(PostViewBucket.objects.get(post=self.post).views, 1)
+        self.assertEqual(AnalyticsEvent.objects.filter(post=self.post, kind='view').count(), 1)
+        self.assertEqual(AuthorStats.objects.get(author=self.author).total_views, 1)
+
+    @override_settings(VIEW_BUFFER_SIZE=3)
+    def test_serving_processes_leave_the_writes_to_the_flush_thread(self):
+        with mock.patch.object(buffers, '_serving', True), mock.patch.object(buffers, '_start_flusher') as start:
+            self.view()
+            self.view()
+            self.assertFalse(PostViewBucket.objects.exists())
+            self.assertFalse(buffers._wake.is_set())
+            self.view()
+            self.assertTrue(start.called)
+            # Full: the flush thread is woken, the request wrote nothing
+            self.assertTrue(buffers._wake.is_set())
+            self.assertFalse(PostViewBucket.objects.exists())
+            buffers._wake.clear()
+            buffers.flush_all()
+        self.assertEqual(PostViewBucket.objects.get(post=self.post).views, 3)
+        self.assertEqual(AnalyticsEvent.objects.filter(post=self.post, kind='view').count(), 3)
+
+
+class StartupBudgetTests(TestCase):
+
+    def test_cold_start_is_within_budget(self):
+        # Raises CommandError when STARTUP_BUDGET_MS or STARTUP_BUDGET_RSS_MB is exceeded
+        call_command('profile_startup', '--check', '--runs', '1', stdout=io.StringIO())
+
+
+class WarmupTests(TestCase):
+
+    def test_warm_up_fills_the_process_caches(self):
+        ContentType.objects.clear_cache()
+        # Forked workers must not inherit connections; here the test's is kept
+        with mock.patch.object(connections, 'close_all') as close_all:
+            timings = warmup.warm_up()
+        close_all.assert_called_once()
+        self.assertEqual(set(timings), {'warm_url_resolver', 'warm_templates', 'warm_content_types'})
+        with self.assertNumQueries(0):
+            ContentType.objects.get_for_model(Post)
+
+    def gunicorn_config(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+
+    def test_gunicorn_warms_up_and_freezes_before_forking(self):
+        config = self.gunicorn_config(GUNICORN_PRELOAD='True')
+        self.assertTrue(config['preload_app'])
+        with mock.patch('advanced_blog.warmup.warm_up', return_value={}) as warm_up, \
+                mock.patch('gc.freeze') as freeze:
+            config['when_ready'](mock.Mock())
+        warm_up.assert_called_once()
+        freeze.assert_called_once()
+
+    def test_baseline_profile_skips_preload_warmup_and_freeze(self):
+        config = self.gunicorn_config(GUNICORN_PRELOAD='False')
+        self.assertFalse(config['preload_app'])
+        with mock.patch('advanced_blog.warmup.warm_up') as warm_up, mock.patch('gc.freeze') as freeze:
+            config['when_ready'](mock.Mock())
+        warm_up.assert_not_called()
+        freeze.assert_not_called()
+
+
+class TemplatePrecompileTests(TestCase):
+
+    def test_every_project_template_is_compiled(self):
+        names = set(templating.iter_template_names())
+        self.assertIn('blog/post_detail.html', names)
+        self.assertEqual(set(templating.precompile_templates()), names)
+
+    def test_broken_templates_refuse_to_boot(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory)
+        (directory / 'fine.html').write_text('{{ value }}')
+        (directory / 'broken.html').write_text('{% if %}')
+        with override_settings(TEMPLATES=[{**settings.TEMPLATES[0], 'DIRS': [directory]}]):
+            with self.assertRaises(ImproperlyConfigured) as raised:
+                templating.precompile_templates()
+        self.assertIn('broken.html', str(raised.exception))
+        self.assertNotIn('fine.html', str(raised.exception))
+
+    def test_production_mode_uses_the_cached_loader(self):
+        with mock.patch.dict(os.environ, {'TEMPLATE_MODE': 'production'}):
+            config = runpy.run_path(str(settings.BASE_DIR / 'advanced_blog' / 'settings.py'))
+        self.assertTrue(config['TEMPLATE_PRECOMPILE'])
+        self.assertFalse(config['TEMPLATES'][0]['APP_DIRS'])
+        [(loader, _)] = config['TEMPLATES'][0]['OPTIONS']['loaders']
+        self.assertEqual(loader, 'django.template.loaders.cached.Loader')
+
+
+class SQLiteProfileTests(BlogTestCase):
+
+    def test_views_are_counted_in_the_database(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        saves = mock.Mock()
+        pre_save.connect(saves, sender=Post)
+        self.addCleanup(pre_save.disconnect, saves, sender=Post)
+        self.post.increment_views()
+        stale.increment_views()
+        saves.assert_not_called()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 2)
+
+    def test_performance_profile_tunes_every_connection(self):
+        alias = 'sqlite_profile_test'
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        bench_sqlite.Command().add_database(
+            alias, str(Path(directory) / 'db.sqlite3'), settings.SQLITE_PROFILES['performance']
+        )
+        # Unregistered, so the test case lets it connect
+        connection = connections.create_connection(alias)
+        del connections.settings[alias]
+        self.addCleanup(connection.close)
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        # synchronous=NORMAL is 1, temp_store=MEMORY is 2
+        self.assertEqual(pragmas, {
+            'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': settings.SQLITE_BUSY_TIMEOUT_MS, 'temp_store': 2,
+        })
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_profile_is_chosen_with_sqlite_profile(self):
+        self.assertEqual(settings.SQLITE_PROFILES['default'], {})
+        with mock.patch.dict(os.environ, {'SQLITE_PROFILE': 'performance'}):
+            config = runpy.run_path(str(settings.BASE_DIR / 'advanced_blog' / 'settings.py'))
+        self.assertEqual(config['DATABASES']['default']['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+
+
+class DatabaseSettingsTests(TestCase):
+
+    def settings_with(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(str(settings.BASE_DIR / 'advanced_blog' / 'settings.py'))
+
+    def test_postgresql_connections_are_pooled(self):
+        config = self.settings_with(
+            DATABASE_URL='postgres://app@primary/blog', DATABASE_POOL_MAX_SIZE='4',
+            DATABASE_REPLICA_URLS='postgres://app@replica/blog, sqlite:////tmp/replica.sqlite3',
+        )
+        databases = config['DATABASES']
+        for alias in ('default', 'replica_1'):
+            self.assertEqual(databases[alias]['CONN_MAX_AGE'], 0)
+            self.assertTrue(databases[alias]['CONN_HEALTH_CHECKS'])
+            self.assertEqual(databases[alias]['OPTIONS']['pool'], {**config['DATABASE_POOL_OPTIONS'], 'max_size': 4})
+        # Only PostgreSQL has a pool
+        self.assertNotIn('pool', databases['replica_2'].get('OPTIONS', {}))
+        self.assertEqual(databases['replica_2']['TEST'], {'MIRROR': 'default'})
+
+    def test_pool_can_be_turned_off(self):
+        databases = self.settings_with(DATABASE_URL='postgres://app@primary/blog', DATABASE_POOL='False')['DATABASES']
+        self.assertEqual(databases['default']['CONN_MAX_AGE'], 600)
+        self.assertNotIn('pool', databases['default'].get('OPTIONS', {}))
+
+
+class TaxonomyCountTests(BlogTestCase):
+
+    def counts(self):
+        return (
+            {category.name: category.post_count for category in Category.objects.all()},
+            {tag.name: tag.post_count for tag in Tag.objects.all()},
+        )
+
+    def test_counts_follow_published_posts(self):
+        other_category, other_tag = Category.objects.create(name='Life'), Tag.objects.create(name='Go')
+        self.assertEqual(self.counts(), ({'Tech': 1, 'Life': 0}, {'Python': 1, 'Go': 0}))
+
+        draft = Post.objects.create(title='Draft', content='x', author=self.author, category=self.category)
+        draft.tags.set([self.tag, other_tag])
+        self.assertEqual(self.counts(), ({'Tech': 1, 'Life': 0}, {'Python': 1, 'Go': 0}))
+
+        draft.status = 'published'
+        draft.save()
+        self.assertEqual(self.counts(), ({'Tech': 2, 'Life': 0}, {'Python': 2, 'Go': 1}))
+
+        draft.category = other_category
+        draft.save()
+        draft.tags.remove(self.tag)
+        self.assertEqual(self.counts(), ({'Tech': 1, 'Life': 1}, {'Python': 1, 'Go': 1}))
+
+        draft.tags.clear()
+        self.post.delete()
+        self.assertEqual(self.counts(), ({'Tech': 0, 'Life': 1}, {'Python': 0, 'Go': 0}))
+
+    def test_snapshot_is_refreshed_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(title='More', content='x', author=self.author, category=self.category, status='published')
+        self.assertEqual([(c.name, c.post_count) for c in taxonomy.get_snapshot().categories], [('Tech', 2)])
+
+    def test_recount_repairs_drift(self):
+        Category.objects.update(post_count=9)
+        Tag.objects.update(post_count=9)
+        taxonomy.recount()
+        self.assertEqual(self.counts(), ({'Tech': 1}, {'Python': 1}))
+
+
+class AuthorStatsTests(BlogTestCase):
+
+    def stats(self):
+        return {
+            row.author.username: (row.post_count, row.published_count, row.total_views, row.total_comments)
+            for row in AuthorStats.objects.select_related('author')
+        }
+
+    def assertMatchesRecount(self, expected):
+        self.assertEqual(self.stats(), expected)
+        authors.refresh()
+        self.assertEqual(self.stats(), expected)
+
+    def test_deltas_follow_every_change(self):
+        self.assertMatchesRecount({'author': (1, 1, 0, 0)})
+        self.post.increment_views()
+        self.post.increment_views()
+        comment = Comment.objects.create(post=self.post, author=self.reader, content='Nice')
+        hidden = Comment.objects.create(post=self.post, author=self.reader, content='Spam', is_approved=False)
+        self.assertMatchesRecount({'author': (1, 1, 2, 1)})
+
+        hidden.is_approved = True
+        hidden.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            draft = Post.objects.create(title='Draft', content='x', author=self.admin)
+        Comment.objects.create(post=draft, author=self.reader, content='Early')
+        self.assertMatchesRecount({'author': (1, 1, 2, 2), 'admin': (1, 0, 0, 0)})
+
+        bulk.set_post_status(Post.objects.filter(pk=draft.pk), 'published')
+        self.assertMatchesRecount({'author': (1, 1, 2, 2), 'admin': (1, 1, 0, 1)})
+
+        bulk.set_comment_approval(Comment.objects.filter(pk=comment.pk), False)
+        self.post.author = self.admin
+        self.post.save()
+        self.assertMatchesRecount({'author': (0, 0, 0, 0), 'admin': (2, 2, 2, 2)})
+
+        bulk.set_post_status(Post.objects.all(), 'archived')
+        self.assertMatchesRecount({'author': (0, 0, 0, 0), 'admin': (2, 0, 2, 0)})
+
+        bulk.set_post_status(Post.objects.all(), 'published')
+        hidden.delete()
+        draft.delete()
+        self.assertMatchesRecount({'author': (0, 0, 0, 0), 'admin': (1, 1, 2, 0)})
+
+    def test_changes_do_not_aggregate(self):
+        with CaptureQueriesContext(connections['default']) as queries:
+            Comment.objects.create(post=self.post, author=self.reader, content='Nice')
+            self.post.status = 'draft'
+            self.post.save()
+        self.assertFalse([query['sql'] for query in queries if 'SUM(' in query['sql']])
+        self.assertEqual(self.stats(), {'author': (1, 0, 0, 0)})
+
+    def test_authors_without_stats_are_recounted_after_the_commit(self):
+        AuthorStats.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.increment_views()
+        self.assertEqual(self.stats(), {'author': (1, 1, 1, 0)})
+
+    def test_recount_repairs_drift(self):
+        AuthorStats.objects.update(post_count=9, published_count=9, total_views=9, total_comments=9)
+        out = io.StringIO()
+        call_command('recount_author_stats', stdout=out)
+        self.assertIn('Recomputed stats for 1 author(s)', out.getvalue())
+        self.assertEqual(self.stats(), {'author': (1, 1, 0, 0)})
+        # Deleted authors are skipped
+        self.assertEqual(authors.refresh([self.author.pk, 999]), 1)
+
+
+class KeysetPaginatorTests(BlogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        moment = timezone.now() - timedelta(days=1)
+        # Ties on published_at are broken by the primary key
+        for index in range(6):
+            Post.objects.create(
+                title=f'Post {index}', content='x', author=self.author, status='published',
+                published_at=moment - timedelta(hours=index // 2),
+            )
+        self.expected = list(Post.objects.order_by('-published_at', '-pk').values_list('title', flat=True))
+
+    def walk(self, paginator):
+        titles, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            titles.append([post.title for post in page])
+            if not page.has_next():
+                return titles
+            cursor = page.next_cursor
+
+    def test_pages_follow_the_ordering_without_gaps(self):
+        pages = self.walk(KeysetPaginator(Post.objects.all(), 3))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_new_rows_do_not_shift_later_pages(self):
+        paginator = KeysetPaginator(Post.objects.all(), 3)
+        first = paginator.page()
+        Post.objects.create(title='Newest', content='x', author=self.author, status='published')
+        second = paginator.page(first.next_cursor)
+        self.assertEqual([post.title for post in second], self.expected[3:6])
+
+    def test_invalid_cursors(self):
+        paginator = KeysetPaginator(Post.objects.all(), 3)
+        for cursor in ('garbage', urlsafe_base64_encode(b'[1]'), urlsafe_base64_encode(b'["x", 1]')):
+            with self.assertRaises(InvalidPage, msg=cursor):
+                paginator.page(cursor)
+
+    async def test_async_pages(self):
+        paginator = KeysetPaginator(Post.objects.all(), 3)
+        first = await paginator.apage()
+        second = await paginator.apage(first.next_cursor)
+        self.assertEqual([post.title for post in second], self.expected[3:6])
+
+    @mock.patch.object(views.AuthorProfileView, 'paginate_by', 3)
+    def test_author_page(self):
+        response = self.client.get('/authors/author/')
+        cursor = response.context['posts'].next_cursor
+        self.assertContains(response, f'?after={cursor}')
+        response = self.client.get('/authors/author/', {'after': cursor})
+        self.assertEqual([post.title for post in response.context['posts']], self.expected[3:6])
+        self.assertEqual(self.client.get('/authors/author/', {'after': 'garbage'}).status_code, 404)
+
+
+class BulkActionTests(BlogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.drafts = [
+            Post.objects.create(title=f'Draft {i}', content='x', author=self.author, category=self.category)
+            for i in range(5)
+        ]
+        for post in self.drafts:
+            post.tags.add(self.tag)
+
+    def test_publish_in_chunks_updates_counts_and_notifies_once(self):
+        sent = len(mail.outbox)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(bulk.set_post_status(Post.objects.filter(status='draft'), 'published', chunk_size=2), 5)
+        self.assertEqual(len(mail.outbox), sent + 1)
+        self.assertFalse(Post.objects.filter(published_at__isnull=True).exists())
+        self.category.refresh_from_db()
+        self.tag.refresh_from_db()
+        self.assertEqual((self.category.post_count, self.tag.post_count), (6, 6))
+
+        bulk.set_post_status(Post.objects.filter(pk=self.post.pk), 'archived')
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.post_count, 5)
+
+    def test_events_are_batched(self):
+        changed = []
+
+        def receiver(sender, post_ids, **kwargs):
+            changed.append(sorted(post_ids))
+
+        events.posts_changed.connect(receiver)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                bulk.set_post_status(Post.objects.filter(status='draft'), 'published', chunk_size=2)
+        finally:
+            events.posts_changed.disconnect(receiver)
+        self.assertEqual(changed, [sorted(post.pk for post in self.drafts)])
+
+    def test_posts_changed_meanwhile_are_not_counted(self):
+        changed = []
+
+        def receiver(sender, post_ids, **kwargs):
+            changed.extend(post_ids)
+
+        def progress(done, total):
+            # Another request publishes a post of a later chunk
+            if not published:
+                published.append(Post.objects.filter(status='draft').first().pk)
+                Post.objects.filter(pk=published[0]).update(status='published')
+
+        published = []
+
+        events.posts_changed.connect(receiver)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                count = bulk.set_post_status(
+                    Post.objects.filter(status='draft'), 'published', chunk_size=2, progress=progress
+                )
+        finally:
+            events.posts_changed.disconnect(receiver)
+        self.assertEqual(count, 4)
+        self.assertCountEqual(changed, [post.pk for post in self.drafts if post.pk != published[0]])
+
+    def test_admin_actions(self):
+        self.login(self.admin)
+        selected = [post.pk for post in self.drafts]
+        response = self.client.post('/admin/blog/post/', {'action': 'publish_posts', '_selected_action': selected})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Post.objects.filter(status='published').count(), 6)
+
+    def test_deleting_a_comment_deletes_its_replies_with_their_signals_and_one_event(self):
+        root = Comment.objects.create(post=self.post, author=self.reader, content='a')
+        reply = Comment.objects.create(post=self.post, author=self.reader, content='b', parent=root)
+        Comment.objects.create(post=self.post, author=self.reader, content='c', parent=reply)
+        other = Comment.objects.create(post=self.post, author=self.reader, content='d')
+        deleted, changed = [], []
+
+        def on_delete(sender, instance, **kwargs):
+            deleted.append(instance.pk)
+
+        def on_changed(sender, post_ids, **kwargs):
+            changed.append(post_ids)
+
+        post_delete.connect(on_delete, sender=Comment)
+        events.comments_changed.connect(on_changed)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                # Chunks of one: the replies go with their parent in the first chunk
+                self.assertEqual(bulk.delete_comments(Comment.objects.filter(pk=root.pk), chunk_size=1), 3)
+        finally:
+            post_delete.disconnect(on_delete, sender=Comment)
+            events.comments_changed.disconnect(on_changed)
+        self.assertEqual(list(Comment.objects.all()), [other])
+        self.assertEqual(len(deleted), 3)
+        self.assertEqual(changed, [[self.post.pk]])
+
+    def test_comment_approval_counts_the_rows_changed(self):
+        comments = [
+            Comment.objects.create(post=self.post, author=self.reader, content=f'comment {i}', is_approved=i % 2 == 0)
+            for i in range(5)
+        ]
+        self.assertEqual(bulk.set_comment_approval(Comment.objects.all(), True, chunk_size=2), 2)
+        self.assertEqual(bulk.set_comment_approval(Comment.objects.all(), True), 0)
+        self.assertEqual(bulk.set_comment_approval(Comment.objects.filter(pk=comments[0].pk), False), 1)
+
+
+class AdminChangelistTests(BlogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.login(self.admin)
+        Post.objects.create(title='Other', content='x', author=self.admin)
+        Comment.objects.create(post=self.post, author=self.reader, content='On hello')
+
+    def titles(self, response):
+        return sorted(post.title for post in response.context['cl'].result_list)
+
+    def test_estimated_count_for_large_unfiltered_tables(self):
+        paginator = EstimatedCountPaginator(Post.objects.all(), 25)
+        with mock.patch.object(EstimatedCountPaginator, '_estimated_count', return_value=80000) as estimate:
+            self.assertEqual(paginator.count, 80000)
+            # Filtered querysets are counted exactly
+            self.assertEqual(EstimatedCountPaginator(Post.objects.filter(status='draft'), 25).count, 1)
+        estimate.assert_called_once()
+
+    def test_exact_count_for_small_tables_and_other_databases(self):
+        with mock.patch.object(EstimatedCountPaginator, '_estimated_count', return_value=10):
+            self.assertEqual(EstimatedCountPaginator(Post.objects.all(), 25).count, 2)
+        self.assertIsNone(EstimatedCountPaginator(Post.objects.all(), 25)._estimated_count(Post.objects.all()))
+
+    def test_input_filters(self):
+        self.assertEqual(self.titles(self.client.get('/admin/blog/post/', {'author': 'AUTHOR'})), ['Hello'])
+        self.assertEqual(self.titles(self.client.get('/admin/blog/post/', {'author': 'nobody'})), [])
+        for value in (self.post.pk, 'hel'):
+            response = self.client.get('/admin/blog/comment/', {'post': value})
+            self.assertEqual([comment.content for comment in response.context['cl'].result_list], ['On hello'])
+
+    def test_input_filter_keeps_the_other_filters(self):
+        response = self.client.get('/admin/blog/post/', {'status__exact': 'published', 'author': 'author'})
+        self.assertContains(response, '<input type="hidden" name="status__exact" value="published">', html=True)
+        self.assertContains(response, 'placeholder="Username"')
+        self.assertEqual(self.titles(response), ['Hello'])
+
+    def test_comment_counts_are_annotated(self):
+        response = self.client.get('/admin/blog/post/')
+        counts = {post.title: post.comment_count for post in response.context['cl'].result_list}
+        self.assertEqual(counts, {'Hello': 1, 'Other': 0})
+
+
+class ConditionalGetTests(BlogTestCase):
+
+    def test_public_pages_revalidate(self):
+        for url in ('/', '/posts/hello/', '/categories/', '/tag/python/', '/search/?query=hel'):
+            response = self.client.get(url)
+            self.assertIn('public', response['Cache-Control'], url)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304, url)
+
+    def test_changes_invalidate_the_etag(self):
+        post_etag = self.client.get('/posts/hello/')['ETag']
+        list_etag = self.client.get('/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.reader, content='Another', is_approved=True)
+        self.assertEqual(self.client.get('/posts/hello/', HTTP_IF_NONE_MATCH=post_etag).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Changed'
+            self.post.save()
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+    def test_logged_in_pages_are_private_and_still_count_views(self):
+        self.login(self.reader)
+        response = self.client.get('/posts/hello/')
+        self.assertIn('private', response['Cache-Control'])
+        views = Post.objects.get().views_count
+        self.assertEqual(self.client.get('/posts/hello/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(Post.objects.get().views_count, views + 1)
+
+
+class AsyncViewTests(BlogTestCase):
+
+    # Each page and a text it must show
+    pages = {
+        '/': 'Hello', '/posts/': 'Hello', '/posts/hello/': 'World', '/search/?query=Hello': 'Hello',
+        '/categories/': 'Tech', '/category/tech/': 'Hello', '/tags/': 'Python', '/tag/python/': 'Hello',
+        '/authors/author/': 'Hello',
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.use_async_views(True)
+        self.addCleanup(self.use_async_views, settings.BLOG_ASYNC_VIEWS)
+
+    @staticmethod
+    def use_async_views(enabled):
+        # The URLconf picks the view classes when it is imported
+        with override_settings(BLOG_ASYNC_VIEWS=enabled):
+            importlib.reload(blog_urls)
+            importlib.reload(project_urls)
+        clear_url_caches()
+
+    def test_async_views_are_opt_in(self):
+        self.assertIs(resolve('/posts/hello/').func.view_class, async_views.PostDetailView)
+        self.use_async_views(False)
+        self.assertIs(resolve('/posts/hello/').func.view_class, views.PostDetailView)
+
+    async def test_pages_match_the_sync_views(self):
+        for path, text in self.pages.items():
+            response = await self.async_client.get(path)
+            self.assertContains(response, text, msg_prefix=path)
+            self.assertIn('ETag', response, path)
+        await sync_to_async(self.use_async_views)(False)
+        for path, text in self.pages.items():
+            self.assertContains(await self.async_client.get(path), text, msg_prefix=path)
+
+    async def test_post_page_counts_views_and_answers_304(self):
+        response = await self.async_client.get('/posts/hello/')
+        response = await self.async_client.get('/posts/hello/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        await self.post.arefresh_from_db()
+        self.assertEqual(self.post.views_count, 2)
+
+    async def test_missing_objects_and_pages_are_404(self):
+        for path in ('/posts/nowhere/', '/category/nowhere/', '/tag/nowhere/', '/authors/nobody/', '/posts/?page=9'):
+            self.assertEqual((await self.async_client.get(path)).status_code, 404, path)
+
+
+@override_settings(RATELIMIT_POLICIES={
+    'search': {'algorithm': 'token_bucket', 'rate': '2/m', 'burst': 2, 'key': 'user_or_ip'},
+    'comment': {'algorithm': 'sliding_window', 'rate': '2/m', 'key': 'user_or_ip'},
+})
+class RateLimitTests(BlogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        ratelimit._limiter = None
+
+    def tearDown(self):
+        ratelimit._limiter = None
+
+    def test_search(self):
+        self.assertEqual(self.client.get('/search/?query=a').status_code, 200)
+        self.assertEqual(self.client.get('/search/?query=b').status_code, 200)
+        response = self.client.get('/search/?query=c')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response['Retry-After']) <= 30)
+        # The empty search form isn't limited
+        self.assertEqual(self.client.get('/search/').status_code, 200)
+
+    def test_comments(self):
+        self.login(self.reader)
+        for text in ('First comment here', 'Second, quite different remark'):
+            self.assertEqual(self.client.post('/posts/hello/comment/', {'content': text}).status_code, 302)
+        response = self.client.post('/posts/hello/comment/', {'content': 'A third thing to say'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_algorithms(self):
+        store = ratelimit.LocalStore()
+        window = ratelimit.SlidingWindow('10/m')
+        self.assertEqual(sum(window.hit(store, 'k', 60.0 + i * 0.1) == 0 for i in range(15)), 10)
+        # 40s into the next window, the previous one's 10 still weigh a third
+        self.assertAlmostEqual(window.hit(store, 'k', 100.0), 20.0)
+        self.assertEqual(window.hit(store, 'k', 150.0), 0)
+        bucket = ratelimit.TokenBucket('60/m', burst=3)
+        self.assertEqual([bucket.hit(store, 't', 0.0) == 0 for _ in range(4)], [True, True, True, False])
+        self.assertAlmostEqual(bucket.hit(store, 't', 0.5), 0.5)
+        self.assertEqual(bucket.hit(store, 't', 1.5), 0)
+
+    def test_counts_locally_while_the_cache_is_down(self):
+        store = ratelimit.CacheStore('default')
+
+        class Unreachable:
+            def __getattr__(self, name):
+                def fail(*args, **kwargs):
+                    raise ConnectionError('down')
+                return fail
+
+        store.cache = Unreachable()
+        self.assertEqual(store.incr('k', 10), 1)
+        self.assertEqual(store.incr('k', 10), 2)
+
+
+class DuplicateCommentTests(BlogTestCase):
+
+    text = 'I really enjoyed this article about Python and its ecosystem'
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_simhash(self):
+        a = duplicates.simhash('The quick brown fox jumps over the lazy dog near the river bank today')
+        b = duplicates.simhash('The quick brown fox jumps over the lazy dog near the river bank today!!')
+        c = duplicates.simhash('Completely different words about databases and indexes and such')
+        self.assertEqual(a, b)
+        self.assertGreater(duplicates.distance(a, c), 10)
+        # Fits a signed 64-bit column
+        self.assertTrue(-(1 << 63) <= a < (1 << 63))
+
+    def test_near_duplicate_is_refused(self):
+        self.login(self.reader)
+        self.client.post('/posts/hello/comment/', {'content': self.text})
+        response = self.client.post('/posts/hello/comment/', {'content': self.text + ' a lot'}, follow=True)
+        self.assertContains(response, 'already posted')
+        self.assertEqual(Comment.objects.filter(content__startswith='I really').count(), 1)
+        self.assertIsNotNone(Comment.objects.get().simhash)
+
+    def test_backfill_and_clusters(self):
+        old = timezone.now() - timedelta(days=3)
+        repeats = [
+            Comment.objects.create(post=self.post, author=self.reader, content=f'{self.text} {suffix}')
+            for suffix in ('x', 'x!', 'y', '')
+        ]
+        Comment.objects.create(post=self.post, author=self.admin, content=self.text)
+        Comment.objects.filter(pk__in=[c.pk for c in repeats]).update(simhash=None, created_at=old)
+        Comment.objects.filter(pk=repeats[3].pk).update(created_at=old + timedelta(hours=2))
+        out = io.StringIO()
+        call_command('find_duplicate_comments', '--chunk-size', '2', stdout=out)
+        self.assertIn('found 1 cluster(s) with 2 repeat(s)', out.getvalue())
+        self.assertFalse(Comment.objects.filter(simhash__isnull=True).exists())
+        call_command('find_duplicate_comments', '--delete', stdout=out)
+        self.assertEqual(Comment.objects.filter(pk__in=[c.pk for c in repeats]).count(), 2)
+
+
+@override_settings(MODERATION_SPAM_THRESHOLD=1.0, MODERATION_TRUSTED_COMMENTS=3, MODERATION_DUPLICATE_DAYS=7)
+class ModerationTests(BlogTestCase):
+
+    def screened(self, content, author=None):
+        comment = Comment(post=self.post, author=author or self.reader, content=content)
+        moderation.screen(comment)
+        return comment
+
+    def test_new_commenters_are_scored_on_their_history(self):
+        comment = self.screened('Thanks for writing this up')
+        self.assertTrue(comment.is_approved)
+        self.assertAlmostEqual(comment.spam_score, 0.6)
+        self.assertEqual(comment.spam_reasons, 'no approved comments, new account')
+
+    def test_links_and_repeated_text_are_queued(self):
+        comment = self.screened('Cheap pills at https://example.com and www.example.org')
+        self.assertFalse(comment.is_approved)
+        self.assertIn('2 links', comment.spam_reasons)
+
+        text = 'Great post, visit my profile for more!'
+        for _ in range(2):
+            Comment.objects.create(
+                post=self.post, author=self.author, content=text.upper(), content_hash=moderation.content_hash(text)
+            )
+        comment = self.screened(text)
+        self.assertFalse(comment.is_approved)
+        self.assertIn('repeated text (2)', comment.spam_reasons)
+
+    def test_trusted_commenters_and_post_authors(self):
+        User.objects.filter(pk=self.reader.pk).update(date_joined=timezone.now() - timedelta(days=30))
+        self.reader.refresh_from_db()
+        for index in range(3):
+            Comment.objects.create(post=self.post, author=self.reader, content=f'Comment {index}')
+        comment = self.screened('One link: https://example.com')
+        self.assertTrue(comment.is_approved)
+        self.assertEqual(comment.spam_score, 0.0)
+        self.assertIn('trusted commenter', comment.spam_reasons)
+        # The post's author and admins are never scored
+        for user in (self.author, self.admin):
+            comment = self.screened('https://a.example https://b.example https://c.example', author=user)
+            self.assertTrue(comment.is_approved)
+            self.assertEqual(comment.spam_reasons, '')
+
+    def test_queued_comments_wait_for_a_moderator(self):
+        self.login(self.reader)
+        self.client.post('/posts/hello/comment/', {'content': 'Buy now at https://a.example https://b.example'})
+        comment = Comment.objects.get()
+        self.assertFalse(comment.is_approved)
+        self.assertNotContains(self.client.get('/posts/hello/'), 'Buy now')
+        self.login(self.admin)
+        self.assertEqual(list(self.client.get('/comments/unapproved/').context['comments']), [comment])
+
+    def test_batch_moderation(self):
+        queued = [
+            Comment.objects.create(post=self.post, author=self.reader, content=f'Queued {index}', is_approved=False)
+            for index in range(3)
+        ]
+        reply = Comment.objects.create(post=self.post, author=self.author, content='Reply', parent=queued[2])
+        approved = Comment.objects.create(post=self.post, author=self.author, content='Already approved')
+        self.login(self.admin)
+
+        response = self.client.post(
+            '/comments/moderate/', {'action': 'approve', 'ids': [queued[0].pk, queued[1].pk, approved.pk]},
+            HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(response.json(), {'action': 'approve', 'count': 2})
+
+        response = self.client.post('/comments/moderate/', {'action': 'reject', 'ids': [queued[2].pk]})
+        self.assertRedirects(response, '/comments/unapproved/')
+        # Rejected comments go with their replies
+        self.assertFalse(Comment.objects.filter(pk__in=[queued[2].pk, reply.pk]).exists())
+        self.assertEqual(Comment.objects.filter(is_approved=True).count(), 3)
+
+    def test_batch_moderation_validation_and_access(self):
+        comment = Comment.objects.create(post=self.post, author=self.reader, content='Queued', is_approved=False)
+        self.login(self.admin)
+        for data in ({'action': 'delete', 'ids': [comment.pk]}, {'action': 'approve'}, {'action': 'approve', 'ids': ['x']}):
+            response = self.client.post('/comments/moderate/', data, HTTP_ACCEPT='application/json')
+            self.assertEqual(response.status_code, 400, data)
+        self.login(self.author)
+        self.client.post('/comments/moderate/', {'action': 'approve', 'ids': [comment.pk]})
+        comment.refresh_from_db()
+        self.assertFalse(comment.is_approved)
+
+
+class SchedulerTests(BlogTestCase):
+
+    def schedule(self, title, minutes):
+        return Post.objects.create(
+            title=title, content='<p>x</p>', author=self.author, category=self.category,
+            status='scheduled', publish_at=timezone.now() + timedelta(minutes=minutes),
+        )
+
+    def test_form_requires_a_future_time(self):
+        self.login(self.author)
+        data = {'title': 'Later', 'content': '<p>x</p>', 'status': 'scheduled'}
+        self.assertIn('publish_at', self.client.post('/posts/new/', data).context['form'].errors)
+        past = (timezone.localtime() - timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M')
+        self.assertIn('publish_at', self.client.post('/posts/new/', {**data, 'publish_at': past}).context['form'].errors)
+        soon = (timezone.localtime() + timedelta(minutes=5)).strftime('%Y-%m-%dT%H:%M')
+        self.assertEqual(self.client.post('/posts/new/', {**data, 'publish_at': soon}).status_code, 302)
+        post = Post.objects.get(title='Later')
+        self.assertEqual(post.status, 'scheduled')
+        self.assertIsNone(post.published_at)
+
+    def test_sleeps_until_the_next_post_is_due(self):
+        self.schedule('Soon', 1)
+        self.assertTrue(50 < scheduler.sleep_seconds(max_sleep=600) <= 60)
+        self.assertEqual(scheduler.sleep_seconds(max_sleep=10), 10)
+
+    def test_due_posts_are_published_once_at_their_time(self):
+        posts = [self.schedule(f'Scheduled {i}', i + 1) for i in range(3)]
+        self.assertEqual(scheduler.publish_due(), 0)
+        published = []
+
+        def receiver(sender, post_ids, **kwargs):
+            published.append(sorted(post_ids))
+
+        events.posts_published.connect(receiver)
+        try:
+            later = timezone.now() + timedelta(minutes=10)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(scheduler.publish_due(later), 3)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(scheduler.publish_due(later), 0)
+        finally:
+            events.posts_published.disconnect(receiver)
+        self.assertEqual(published, [[post.pk for post in posts]])
+        for post in posts:
+            post.refresh_from_db()
+            self.assertEqual((post.status, post.published_at), ('published', post.publish_at))
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.post_count, 4)
+        self.assertIsNone(scheduler.next_due())
+
+
+class RevisionTests(BlogTestCase):
+
+    def edit(self, content):
+        self.login(self.author)
+        return self.client.post('/posts/hello/edit/', {
+            'title': 'Hello', 'content': content, 'status': 'published',
+            'category': self.category.pk, 'tags': [self.tag.pk],
+        })
+
+    def test_edits_are_recorded_with_their_editor(self):
+        self.assertEqual(list(self.post.revisions.values_list('number', 'editor_id')), [(1, self.author.pk)])
+        self.assertEqual(self.edit('<p>World, again</p>').status_code, 302)
+        self.assertEqual(list(self.post.revisions.values_list('number', 'editor_id')), [(2, self.author.pk), (1, self.author.pk)])
+        # Saves that leave the title and content alone add nothing
+        self.post.refresh_from_db()
+        self.post.views_count += 1
+        self.post.save()
+        bulk.set_post_status(Post.objects.filter(pk=self.post.pk), 'draft')
+        self.assertEqual(self.post.revisions.count(), 2)
+        self.assertEqual(revisions.content_at(self.post, 1), '<p>World</p>')
+        self.assertEqual(revisions.content_at(self.post, 2), '<p>World, again</p>')
+
+    def test_history_pages(self):
+        self.edit('<p>World, again</p>')
+        for url in ('/posts/hello/revisions/', '/posts/hello/revisions/1/', '/posts/hello/revisions/2/?against=1'):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+        self.assertContains(self.client.get('/posts/hello/revisions/2/'), '<ins')
+        self.assertEqual(self.client.get('/posts/hello/revisions/9/').status_code, 404)
+        self.login(self.reader)
+        self.assertIn(self.client.get('/posts/hello/revisions/').status_code, (302, 403))
+
+    @override_settings(REVISION_SNAPSHOT_INTERVAL=5)
+    def test_versions_rebuild_from_snapshots_and_deltas(self):
+        words = [f'word{i} ' for i in range(400)]
+        versions = []
+        for i in range(12):
+            words[i * 7] = f'edit{i} '
+            versions.append(''.join(words))
+            self.post.content = versions[-1]
+            self.post.save()
+        rows = list(PostRevision.objects.filter(post=self.post).order_by('number').values_list('is_snapshot', flat=True))
+        # Revision 2 replaces all of the content, so its delta is no smaller than a snapshot
+        self.assertEqual([n for n, is_snapshot in enumerate(rows, 1) if is_snapshot], [1, 2, 6, 11])
+        found = revisions.contents(self.post, range(2, 14))
+        self.assertEqual([found[n] for n in range(2, 14)], versions)
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    A second SQLite database serves as the replica. It is a copy of the
+    primary whose post has another title, so pages show where they read from.
+    """
+
+    replica = 'replica_test'
+    password = BlogTestCase.password
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the test databases are set up, so the runner doesn't create one for it
+        cls.directory = tempfile.mkdtemp()
+        connections.settings[cls.replica] = {
+            **connections['default'].settings_dict, 'NAME': str(Path(cls.directory) / 'replica.sqlite3')
+        }
+        cls.databases = cls.databases | {cls.replica}
+        # Routers are rebuilt when the setting changes, and then see the replica
+        cls.enterClassContext(override_settings(DATABASE_ROUTERS=['advanced_blog.db_routers.ReplicaRouter']))
+        cls.addClassCleanup(cls.remove_replica)
+
+    @classmethod
+    def remove_replica(cls):
+        connections[cls.replica].close()
+        del connections[cls.replica]
+        del connections.settings[cls.replica]
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', 'author@example.com', self.password, role='Author')
+        self.reader = User.objects.create_user('reader', 'reader@example.com', self.password, role='Reader')
+        Post.objects.create(title='Hello', content='<p>World</p>', author=self.author, status='published')
+        connections[self.replica].close()
+        connections['default'].ensure_connection()
+        with sqlite3.connect(connections[self.replica].settings_dict['NAME']) as replica:
+            connections['default'].connection.backup(replica)
+            replica.execute("UPDATE blog_post SET title = 'Hello from the replica'")
+
+    def log_in(self, username='reader'):
+        response = self.client.post('/accounts/login/', {'username': username, 'password': self.password})
+        self.assertEqual(response.status_code, 302)
+
+    def expire_pin(self):
+        del self.client.cookies[settings.REPLICA_PIN_COOKIE]
+
+    def test_safe_requests_read_from_the_replica(self):
+        self.assertContains(self.client.get('/posts/hello/'), 'Hello from the replica')
+
+    def test_writes_pin_the_next_reads_to_the_primary_until_the_pin_expires(self):
+        self.log_in()
+        pin = self.client.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(pin['max-age'], settings.REPLICA_PIN_SECONDS)
+        response = self.client.get('/posts/hello/')
+        self.assertContains(response, 'Hello')
+        self.assertNotContains(response, 'from the replica')
+
+        response = self.client.post('/posts/hello/comment/', {'content': 'Written to the primary'})
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        self.assertTrue(Comment.objects.using('default').filter(content='Written to the primary').exists())
+        self.assertFalse(Comment.objects.using(self.replica).exists())
+
+        self.expire_pin()
+        self.assertContains(self.client.get('/posts/hello/'), 'Hello from the replica')
+
+    async def test_safe_requests_read_from_the_replica_under_asgi(self):
+        response = await self.async_client.get('/posts/hello/')
+        self.assertContains(response, 'Hello from the replica')
+
+    def test_other_views_read_from_the_primary(self):
+        self.log_in('author')
+        self.expire_pin()
+        response = self.client.get('/posts/hello/edit/')
+        self.assertContains(response, 'value="Hello"')
+        self.assertNotContains(response, 'from the replica')
+        self.assertNotContains(self.client.get('/posts/my-posts/'), 'from the replica')
+
+    def test_sessions_and_users_are_read_from_the_primary(self):
+        self.log_in('author')
+        self.expire_pin()
+        # The session only exists on the primary
+        response = self.client.get('/posts/hello/')
+        self.assertContains(response, 'Hello from the replica')
+        self.assertEqual(response.wsgi_request.user.username, 'author')
+
+        router = db_routers.ReplicaRouter()
+        token = db_routers._use_replicas.set(True)
+        try:
+            self.assertEqual(router.db_for_read(Post), self.replica)
+            for model in (User, Session, Permission):
+                self.assertEqual(router.db_for_read(model), 'default')
+            with db_routers.use_primary():
+                self.assertEqual(router.db_for_read(Post), 'default')
+        finally:
+            db_routers._use_replicas.reset(token)
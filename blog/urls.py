@@ -1,18 +1,32 @@
-from django.urls import path
-from . import views
+from django.conf import settings
+from django.urls import path, register_converter
+
+from advanced_blog.db_routers import replica_reads
+from . import async_views, feeds, popularity, sitemaps, views
 
 app_name = 'blog'
 
+register_converter(feeds.FeedFormatConverter, 'feed_format')
+register_converter(popularity.RankingConverter, 'ranking')
+
+# With BLOG_ASYNC_VIEWS the read-heavy public pages are served by their async
+# versions; replica_reads lets the public lists, details, search and taxonomy
+# pages read from a replica (see advanced_blog/db_routers.py)
+read_views = async_views if settings.BLOG_ASYNC_VIEWS else views
+
 urlpatterns = [
     # Post CRUD URLs
-    path('', views.PostListView.as_view(), name='home'),
-    path('posts/', views.PostListView.as_view(), name='post_list'),
+    path('', replica_reads(read_views.PostListView.as_view()), name='home'),
+    path('posts/', replica_reads(read_views.PostListView.as_view()), name='post_list'),
     path('posts/new/', views.PostCreateView.as_view(), name='post_create'),
     path('posts/my-posts/', views.MyPostsListView.as_view(), name='my_posts'),
     path('posts/drafts/', views.DraftPostsListView.as_view(), name='draft_posts'),
-    path('posts/<slug:slug>/', views.PostDetailView.as_view(), name='post_detail'),
+    path('posts/stats/', views.AuthorDashboardView.as_view(), name='author_dashboard'),
+    path('posts/<slug:slug>/', replica_reads(read_views.PostDetailView.as_view()), name='post_detail'),
     path('posts/<slug:slug>/edit/', views.PostUpdateView.as_view(), name='post_update'),
     path('posts/<slug:slug>/delete/', views.PostDeleteView.as_view(), name='post_delete'),
+    path('posts/<slug:slug>/revisions/', views.PostRevisionListView.as_view(), name='post_revisions'),
+    path('posts/<slug:slug>/revisions/<int:number>/', views.PostRevisionDiffView.as_view(), name='post_revision_diff'),
     
     # Draft/Published workflow URLs
     path('posts/<slug:slug>/publish/', views.PublishPostView.as_view(), name='post_publish'),
@@ -23,15 +37,36 @@ urlpatterns = [
     path('comments/<int:pk>/delete/', views.CommentDeleteView.as_view(), name='comment_delete'),
     path('comments/<int:pk>/moderate/', views.CommentModerateView.as_view(), name='comment_moderate'),
     path('comments/unapproved/', views.UnapprovedCommentsListView.as_view(), name='unapproved_comments'),
+    path('comments/moderate/', views.CommentBatchModerateView.as_view(), name='comment_batch_moderate'),
     
     # Search URL
-    path('search/', views.PostSearchView.as_view(), name='post_search'),
+    path('search/', replica_reads(read_views.PostSearchView.as_view()), name='post_search'),
     
     # Category URLs
-    path('categories/', views.CategoryListView.as_view(), name='category_list'),
-    path('category/<slug:slug>/', views.CategoryDetailView.as_view(), name='category_detail'),
+    path('categories/', replica_reads(read_views.CategoryListView.as_view()), name='category_list'),
+    path('category/<slug:slug>/', replica_reads(read_views.CategoryDetailView.as_view()), name='category_detail'),
     
     # Tag URLs
-    path('tags/', views.TagListView.as_view(), name='tag_list'),
-    path('tag/<slug:slug>/', views.TagDetailView.as_view(), name='tag_detail'),
+    path('tags/', replica_reads(read_views.TagListView.as_view()), name='tag_list'),
+    path('tag/<slug:slug>/', replica_reads(read_views.TagDetailView.as_view()), name='tag_detail'),
+    
+    # Author URLs
+    path('authors/<str:username>/', read_views.AuthorProfileView.as_view(), name='author_profile'),
+    
+    # Feed URLs
+    path('feeds/<feed_format:fmt>/', feeds.feed_view, name='feed'),
+    path('feeds/<feed_format:fmt>/archive/', feeds.archive_feed_view, name='feed_archive'),
+    path('feeds/<feed_format:fmt>/category/<slug:slug>/', feeds.feed_view, {'scope': 'category'}, name='category_feed'),
+    path('feeds/<feed_format:fmt>/tag/<slug:slug>/', feeds.feed_view, {'scope': 'tag'}, name='tag_feed'),
+    path('feeds/<feed_format:fmt>/author/<str:slug>/', feeds.feed_view, {'scope': 'author'}, name='author_feed'),
+    
+    # Popular post lists (JSON, for sidebar widgets)
+    path('popular/<ranking:ranking>/', popularity.popular_view, name='popular'),
+    path('popular/<ranking:ranking>/category/<slug:slug>/', popularity.popular_view, {'scope': 'category'}, name='category_popular'),
+    path('popular/<ranking:ranking>/tag/<slug:slug>/', popularity.popular_view, {'scope': 'tag'}, name='tag_popular'),
+    
+    # Sitemap URLs
+    path('robots.txt', sitemaps.robots_txt, name='robots_txt'),
+    path('sitemap.xml', sitemaps.sitemap_view, name='sitemap'),
+    path('sitemaps/<slug:name>.xml', sitemaps.sitemap_view, name='sitemap_shard'),
 ]
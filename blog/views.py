@@ -1,14 +1,20 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.conf import settings
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView, View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.urls import reverse_lazy, reverse
 from django.db.models import Q, Count
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponseForbidden
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-
-from .models import Post, Comment, Category, Tag
+from django.http import Http404, JsonResponse, HttpResponseForbidden
+from django.core.paginator import Paginator, EmptyPage, InvalidPage, PageNotAnInteger
+from django.contrib.auth import get_user_model
+
+from advanced_blog.ratelimit import RateLimitMixin
+from . import analytics, authors, caching, duplicates, moderation, revisions, taxonomy
+from .caching import ConditionalGetMixin
+from .models import Post, PostRevision, Comment, Category, Tag
+from .paginators import KeysetPaginator
 from .forms import PostForm, CommentForm, PostSearchForm, CommentModerationForm
 from accounts.permissions import (
     AuthorRequiredMixin, 
@@ -18,12 +24,21 @@ from accounts.permissions import (
     CommentOwnerRequiredMixin
 )
 
+User = get_user_model()
+
 
 # ============================================================================
 # POST VIEWS - CRUD Operations
 # ============================================================================
 
-class PostListView(ListView):
+class ListingConditionalGetMixin(ConditionalGetMixin):
+    """Pages listing posts or taxonomy, validated by the content generations"""
+    
+    def get_validators(self):
+        return caching.listing_validators(taxonomy.current_generation())
+
+
+class PostListView(ListingConditionalGetMixin, ListView):
     """List all published posts with pagination"""
     model = Post
     template_name = 'blog/post_list.html'
@@ -42,12 +57,13 @@ class PostListView(ListView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
-        context['tags'] = Tag.objects.all()
+        snapshot = taxonomy.get_snapshot()
+        context['categories'] = snapshot.categories
+        context['tags'] = snapshot.tags
         return context
 
 
-class PostDetailView(DetailView):
+class PostDetailView(ConditionalGetMixin, DetailView):
     """Display a single post with comments"""
     model = Post
     template_name = 'blog/post_detail.html'
@@ -70,10 +86,16 @@ class PostDetailView(DetailView):
         return queryset
     
     def get_object(self, queryset=None):
-        obj = super().get_object(queryset)
-        # Increment view count
-        obj.increment_views()
-        return obj
+        # Fetched once per request: the validators and the page both need it
+        if getattr(self, '_post', None) is None:
+            self._post = super().get_object(queryset)
+            # Increment view count (also for 304 responses, but not when pre-rendering)
+            if not getattr(self.request, 'is_prerender', False):
+                self._post.increment_views()
+        return self._post
+    
+    def get_validators(self):
+        return caching.post_validators(self.get_object(), taxonomy.current_generation())
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -87,6 +109,7 @@ class PostDetailView(DetailView):
         
         context['comments'] = comments
         context['comment_form'] = CommentForm()
+        context['related_posts'] = post.related_posts()
         
         # Check if user can edit this post
         if self.request.user.is_authenticated:
@@ -139,6 +162,7 @@ class PostUpdateView(AuthorOwnerRequiredMixin, UpdateView):
         return kwargs
     
     def form_valid(self, form):
+        form.instance._edited_by = self.request.user
         messages.success(self.request, 'Post updated successfully!')
         return super().form_valid(form)
     
@@ -183,6 +207,88 @@ class MyPostsListView(AuthorRequiredMixin, ListView):
         return queryset.order_by('-created_at')
 
 
+class AuthorDashboardView(AuthorRequiredMixin, TemplateView):
+    """Views and comments over time for the current user's posts"""
+    template_name = 'blog/author_dashboard.html'
+    periods = [7, 30, 90]
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        try:
+            days = int(self.request.GET.get('days', 30))
+        except ValueError:
+            days = 30
+        if days not in self.periods:
+            days = 30
+        
+        # Read from the daily rollups only, never from the raw events
+        posts = Post.objects.filter(author=self.request.user)
+        daily = analytics.daily_totals(posts, days)
+        peak = max((day['views'] for day in daily), default=0) or 1
+        for day in daily:
+            day['percent'] = round(day['views'] * 100 / peak)
+        
+        context['days'] = days
+        context['periods'] = self.periods
+        context['daily'] = daily
+        context['post_totals'] = analytics.post_totals(posts, days)[:50]
+        context['total_views'] = sum(day['views'] for day in daily)
+        context['total_comments'] = sum(day['comments'] for day in daily)
+        return context
+
+
+class PostRevisionListView(AuthorOwnerRequiredMixin, DetailView):
+    """Revision history of a post, newest first"""
+    model = Post
+    template_name = 'blog/post_revisions.html'
+    slug_field = 'slug'
+    slug_url_kwarg = 'slug'
+    paginate_by = 50
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # The stored data is only read to rebuild a version
+        history = self.object.revisions.select_related('editor').defer('data')
+        page_obj = Paginator(history, self.paginate_by).get_page(self.request.GET.get('page'))
+        context['page_obj'] = page_obj
+        context['revisions'] = page_obj.object_list
+        return context
+
+
+class PostRevisionDiffView(AuthorOwnerRequiredMixin, DetailView):
+    """Changes a revision made, or the changes between two revisions with ?against="""
+    model = Post
+    template_name = 'blog/post_revision_diff.html'
+    slug_field = 'slug'
+    slug_url_kwarg = 'slug'
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        number = self.kwargs['number']
+        try:
+            against = int(self.request.GET.get('against', number - 1))
+        except ValueError:
+            raise Http404('Invalid revision')
+        
+        numbers = [number, against] if against > 0 else [number]
+        found = {
+            revision.number: revision
+            for revision in self.object.revisions.filter(number__in=numbers).select_related('editor').defer('data')
+        }
+        if len(found) != len(numbers):
+            raise Http404('No such revision')
+        try:
+            content = revisions.contents(self.object, numbers)
+        except PostRevision.DoesNotExist:
+            raise Http404('No such revision')
+        
+        context['revision'] = found[number]
+        context['against'] = found.get(against)
+        context['has_next'] = self.object.revisions.filter(number__gt=number).exists()
+        context['segments'] = revisions.diff(content.get(against, ''), content[number])
+        return context
+
+
 # ============================================================================
 # DRAFT/PUBLISHED WORKFLOW VIEWS
 # ============================================================================
@@ -248,10 +354,11 @@ class UnpublishPostView(AuthorOwnerRequiredMixin, UpdateView):
 # COMMENT VIEWS
 # ============================================================================
 
-class CommentCreateView(ReaderRequiredMixin, CreateView):
+class CommentCreateView(ReaderRequiredMixin, RateLimitMixin, CreateView):
     """Create a comment on a post - requires authentication"""
     model = Comment
     form_class = CommentForm
+    ratelimit = ('comment',)
     
     def post(self, request, *args, **kwargs):
         post = get_object_or_404(Post, slug=kwargs['slug'])
@@ -268,8 +375,17 @@ class CommentCreateView(ReaderRequiredMixin, CreateView):
                 parent_comment = get_object_or_404(Comment, id=parent_id)
                 comment.parent = parent_comment
             
+            # Double submissions and bots repeating themselves
+            if duplicates.is_duplicate(comment):
+                messages.info(request, 'You already posted this comment.')
+                return redirect('blog:post_detail', slug=post.slug)
+            
+            # Suspicious comments wait in the moderation queue
+            if moderation.screen(comment):
+                messages.success(request, 'Comment added successfully!')
+            else:
+                messages.info(request, 'Your comment was received and will appear once a moderator approves it.')
             comment.save()
-            messages.success(request, 'Comment added successfully!')
         else:
             messages.error(request, 'Error adding comment. Please try again.')
         
@@ -303,28 +419,63 @@ class CommentModerateView(AdminRequiredMixin, UpdateView):
 
 
 class UnapprovedCommentsListView(AdminRequiredMixin, ListView):
-    """List all unapproved comments - Admin only"""
+    """Moderation queue: unapproved comments, most suspicious first - Admin only"""
     model = Comment
     template_name = 'blog/unapproved_comments.html'
     context_object_name = 'comments'
-    paginate_by = 20
+    paginate_by = 50
     
     def get_queryset(self):
-        return Comment.objects.filter(is_approved=False).select_related(
-            'author', 'post'
-        ).order_by('-created_at')
+        return moderation.queue()
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['spam_threshold'] = getattr(settings, 'MODERATION_SPAM_THRESHOLD', 1.0)
+        return context
+
+
+class CommentBatchModerateView(AdminRequiredMixin, View):
+    """Approve or reject many queued comments at once - Admin only"""
+    
+    def post(self, request):
+        action = request.POST.get('action')
+        try:
+            comment_ids = [int(pk) for pk in request.POST.getlist('ids')]
+        except ValueError:
+            comment_ids = None
+        if action not in moderation.ACTIONS or not comment_ids:
+            if self.wants_json(request):
+                return JsonResponse({'error': 'Choose an action and at least one comment.'}, status=400)
+            messages.error(request, 'Choose an action and at least one comment.')
+            return redirect('blog:unapproved_comments')
+        
+        count = moderation.moderate(action, comment_ids)
+        verb = 'approved' if action == 'approve' else 'rejected'
+        if self.wants_json(request):
+            return JsonResponse({'action': action, 'count': count})
+        messages.success(request, f'{count} comment{"s" if count != 1 else ""} {verb}.')
+        return redirect('blog:unapproved_comments')
+    
+    def wants_json(self, request):
+        return request.accepts('application/json') and not request.accepts('text/html')
 
 
 # ============================================================================
 # SEARCH FUNCTIONALITY
 # ============================================================================
 
-class PostSearchView(ListView):
+class PostSearchView(RateLimitMixin, ListingConditionalGetMixin, ListView):
     """Search posts using Q objects"""
     model = Post
     template_name = 'blog/post_search.html'
     context_object_name = 'posts'
     paginate_by = 10
+    ratelimit = ('search',)
+    ratelimit_methods = ('GET', 'HEAD')
+    
+    def ratelimit_applies(self, request):
+        # The empty search form is cheap; running a query is not
+        return bool(request.GET.get('query', '').strip())
     
     def get_queryset(self):
         queryset = Post.objects.filter(status='published').select_related(
@@ -360,8 +511,8 @@ class PostSearchView(ListView):
         if status and self.request.user.is_authenticated:
             if self.request.user.is_admin() or self.request.user.is_superuser:
                 queryset = Post.objects.filter(status=status)
-            elif status == 'draft':
-                queryset = Post.objects.filter(status='draft', author=self.request.user)
+            elif status in ('draft', 'scheduled'):
+                queryset = Post.objects.filter(status=status, author=self.request.user)
         
         # Annotate with comment count
         queryset = queryset.annotate(comment_count=Count('comments'))
@@ -380,7 +531,7 @@ class PostSearchView(ListView):
 # CATEGORY AND TAG FILTERING VIEWS
 # ============================================================================
 
-class CategoryDetailView(DetailView):
+class CategoryDetailView(ListingConditionalGetMixin, DetailView):
     """Display posts filtered by category"""
     model = Category
     template_name = 'blog/category_detail.html'
@@ -417,7 +568,7 @@ class CategoryDetailView(DetailView):
         return context
 
 
-class TagDetailView(DetailView):
+class TagDetailView(ListingConditionalGetMixin, DetailView):
     """Display posts filtered by tag"""
     model = Tag
     template_name = 'blog/tag_detail.html'
@@ -454,26 +605,71 @@ class TagDetailView(DetailView):
         return context
 
 
-class CategoryListView(ListView):
+class CategoryListView(ListingConditionalGetMixin, ListView):
     """List all categories"""
     model = Category
     template_name = 'blog/category_list.html'
     context_object_name = 'categories'
     
     def get_queryset(self):
-        return Category.objects.annotate(
-            post_count=Count('posts', filter=Q(posts__status='published'))
-        ).order_by('name')
+        return taxonomy.get_snapshot().categories
 
 
-class TagListView(ListView):
+class TagListView(ListingConditionalGetMixin, ListView):
     """List all tags"""
     model = Tag
     template_name = 'blog/tag_list.html'
     context_object_name = 'tags'
     
     def get_queryset(self):
-        return Tag.objects.annotate(
-            post_count=Count('posts', filter=Q(posts__status='published'))
-        ).order_by('name')
+        return taxonomy.get_snapshot().tags
+
 
+# ============================================================================
+# AUTHOR PAGES
+# ============================================================================
+
+class AuthorProfileView(ConditionalGetMixin, DetailView):
+    """Public page of an author: their stats and published posts"""
+    model = User
+    template_name = 'blog/author_profile.html'
+    context_object_name = 'author'
+    slug_field = 'username'
+    slug_url_kwarg = 'username'
+    paginate_by = 10
+    
+    def get_queryset(self):
+        # Readers who never published have no page
+        return User.objects.filter(
+            Q(role__in=['Author', 'Admin']) | Q(author_stats__published_count__gt=0)
+        ).select_related('author_stats')
+    
+    def get_object(self, queryset=None):
+        # Fetched once per request: the validators and the page both need it
+        if getattr(self, '_author', None) is None:
+            self._author = super().get_object(queryset)
+        return self._author
+    
+    def get_validators(self):
+        author = self.get_object()
+        return caching.author_validators(author, authors.get_stats(author))
+    
+    def get_paginator(self, author):
+        posts = Post.objects.filter(author=author, status='published').select_related('category').only(
+            'title', 'slug', 'excerpt', 'content', 'featured_image', 'views_count', 'published_at',
+            'category__name', 'category__slug',
+        )
+        return KeysetPaginator(posts, self.paginate_by)
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        try:
+            page = self.get_paginator(self.object).page(self.request.GET.get('after'))
+        except InvalidPage:
+            raise Http404('Invalid page.')
+        
+        # Totals come from the maintained stats row, not from aggregates
+        context['stats'] = authors.get_stats(self.object)
+        context['posts'] = page
+        context['page_obj'] = page
+        return context
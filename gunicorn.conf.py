@@ -0,0 +1,75 @@
+"""
+Gunicorn server profile for the blog.
+
+The application is imported and warmed up once in the master process, then
+frozen with ``gc.freeze()`` before workers are forked, so the URL resolver,
+compiled templates and ContentType cache are shared copy-on-write instead of
+being rebuilt by every worker on its first request. ``GUNICORN_PRELOAD=False``
+turns all of that off, which is the baseline ``bench_servers`` compares against.
+
+Set ``GUNICORN_ASGI=True`` to serve the ASGI application with uvicorn workers
+instead (one event loop per worker; read-heavy pages use the async views).
+
+Tunable through environment variables:
+    GUNICORN_ASGI           serve advanced_blog.asgi with uvicorn workers (default: False)
+    GUNICORN_PRELOAD        preload, warm up and freeze in the master (default: True)
+    WEB_CONCURRENCY         number of worker processes (default: 2 * CPUs + 1)
+    GUNICORN_WORKER_CLASS   worker class (default: gthread, or UvicornWorker with GUNICORN_ASGI)
+    GUNICORN_THREADS        threads per gthread worker (default: 2)
+    GUNICORN_TIMEOUT        worker timeout in seconds (default: 30)
+    GUNICORN_MAX_REQUESTS   recycle workers after this many requests (default: 0, off)
+    PORT                    port to bind (default: 8000)
+"""
+import gc
+import os
+
+
+def _available_cpus():
+    """CPUs this process may run on (respects container CPU affinity)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+asgi = os.environ.get('GUNICORN_ASGI', 'False') == 'True'
+
+if asgi:
+    wsgi_app = 'advanced_blog.asgi:application'
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn_worker.UvicornWorker')
+else:
+    wsgi_app = 'advanced_blog.wsgi:application'
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', _available_cpus() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# Import the application in the master so workers inherit it on fork
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    """Warm the preloaded application and freeze the heap before forking workers"""
+    if not preload_app:
+        # The master never imported the application; each worker loads its own
+        return
+    from advanced_blog.warmup import warm_up
+
+    timings = warm_up()
+    for step, elapsed in timings.items():
+        server.log.info('Warmup %s: %.1f ms', step, elapsed)
+
+    # Move everything allocated so far into the permanent generation so the
+    # collector in each worker never touches (and un-shares) those pages
+    gc.collect()
+    gc.freeze()
+    server.log.info('Froze %d objects before forking workers', gc.get_freeze_count())